@@ -1,15 +1,34 @@
-from flask import Flask, jsonify, render_template, redirect, url_for, request, send_file
-import geopandas as gpd
+import os
+
+# Backend matplotlib ustawiony raz, zanim cokolwiek zaimportuje pyplot
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+from flask import (Flask, Response, g, has_request_context, jsonify, render_template, redirect, url_for, request,
+                   send_file, stream_with_context)
 import pandas as pd
-import matplotlib.pyplot as plt
-from shapely.geometry import Point
-import contextily as ctx
-from pykrige.ok import OrdinaryKriging
 import numpy as np
-import seaborn as sns
-import os
-from datetime import date, datetime
-from sqlalchemy import create_engine
+import glob
+import io
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from functools import partial
+from werkzeug.datastructures import MultiDict
+from interpolation import idw_grid, rbf_grid, komorki_voronoi, KrigingCache
+import dataset
+import eksport
+import kostka
+import metrics
+import obrazy
+import stacje
+import statystyki
+import szeregi
+import szablony
+from basemap import dodaj_basemape
+from jobs import KolejkaZadan, KolejkaPelnaError, _wykonaj_raport, _wykonaj_raport_zbiorczy, _wykonaj_render
+from render_cache import PREFIKS_TYMCZASOWY, RenderCache, klucz_renderu, poprawny_klucz
 
 app = Flask(__name__)
 
@@ -17,11 +36,71 @@ app = Flask(__name__)
 DATA_DIR = "data"
 PLOT_DIR = "static/exports"
 CSV_FILE = os.path.join(DATA_DIR, "dane.csv")
+# "csv" - plik CSV_FILE, "sql" - tabela measurements w bazie DATABASE_URL,
+# "arrow" - kolumnowy magazyn partycji dziennych w STORE_DIR (magazyn.py)
+DATA_BACKEND = os.environ.get("DATA_BACKEND", "csv")
+RENDER_CACHE_DIR = os.path.join(PLOT_DIR, "cache")
+ARCHIVE_DIR = os.path.join(PLOT_DIR, "archiwum")
+RENDER_CACHE_MAX_MB = int(os.environ.get("RENDER_CACHE_MAX_MB", "200"))
+ARTIFACT_TTL_HOURS = float(os.environ.get("ARTIFACT_TTL_HOURS", "24"))
+JANITOR_INTERVAL = int(os.environ.get("JANITOR_INTERVAL", "600"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_QUEUE_LIMIT = int(os.environ.get("JOB_QUEUE_LIMIT", "32"))
+# Najwięcej stron z wizualizacjami w jednym raporcie zbiorczym
+BATCH_REPORT_MAX_PAGES = int(os.environ.get("BATCH_REPORT_MAX_PAGES", "400"))
+KRIGING_CACHE_SIZE = int(os.environ.get("KRIGING_CACHE_SIZE", "64"))
+# Ten sam wariogram dla kolejnych dat - szybciej, ale bez dopasowania per dzień
+KRIGING_REUSE_VARIOGRAM = os.environ.get("KRIGING_REUSE_VARIOGRAM", "0") == "1"
+# Z jak odległych dni (w dniach) można wziąć gotowy wariogram
+KRIGING_VARIOGRAM_WINDOW_DAYS = int(os.environ.get("KRIGING_VARIOGRAM_WINDOW_DAYS", "3"))
+# Rozdzielczość siatek interpolacji (liczba węzłów na bok)
+GRID_SIZE = 150
+KRIGING_GRID_SIZE = 120
+# Kostki interpolacji (data × lat × lon) - jedna stała siatka dla zakresu dat
+CUBE_DIR = os.environ.get("CUBE_DIR", os.path.join(DATA_DIR, "kostki"))
+CUBE_GRID_SIZE = int(os.environ.get("CUBE_GRID_SIZE", str(GRID_SIZE)))
+# Najwięcej dat w kostce liczonej przez API i limit rozmiaru CUBE_DIR (LRU)
+CUBE_MAX_DATES = int(os.environ.get("CUBE_MAX_DATES", "366"))
+CUBE_DIR_MAX_MB = int(os.environ.get("CUBE_DIR_MAX_MB", "1024"))
+# Mapy z szablonów figur (szablony.py) - rysowana tylko warstwa danych
+FIGURE_TEMPLATES = os.environ.get("FIGURE_TEMPLATES", "1") == "1"
+# Ostatnio zakodowane obrazy trzymane w pamięci procesu (obrazy.py)
+IMAGE_MEMORY_MB = int(os.environ.get("IMAGE_MEMORY_MB", "32"))
+# Ważność odpowiedzi /api/obraz - obraz pod tymi parametrami zmienia się z danymi
+IMAGE_MAX_AGE = int(os.environ.get("IMAGE_MAX_AGE", "300"))
+# Obrazy pod /obraz/<klucz> są adresowane treścią i nigdy się nie zmieniają
+IMAGE_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
 
 # Upewnij się, że katalogi istnieją
 os.makedirs(PLOT_DIR, exist_ok=True)
 os.makedirs(DATA_DIR, exist_ok=True)
 
+render_cache = RenderCache(RENDER_CACHE_DIR, RENDER_CACHE_MAX_MB * 1024 * 1024,
+                           rozszerzenie=obrazy.ROZSZERZENIE)
+render_cache.uruchom_sprzatanie(ARTIFACT_TTL_HOURS * 3600, JANITOR_INTERVAL)
+# Trwałe obrazy prerenderowane przez prerender.py - bez limitu i sprzątania
+render_archive = RenderCache(ARCHIVE_DIR, None, rozszerzenie=obrazy.ROZSZERZENIE)
+pamiec_obrazow = obrazy.PamiecObrazow(IMAGE_MEMORY_MB * 1024 * 1024)
+# pyplot trzyma stan globalny (bieżąca figura, gcf) - pełne figury rysuje
+# jeden wątek workera naraz; szablony figur mają własne blokady
+_lock_pyplot = threading.Lock()
+
+# Znaczniki zadań w RENDER_CACHE_DIR - stan widoczny dla wszystkich workerów
+kolejka_zadan = KolejkaZadan(JOB_WORKERS, JOB_QUEUE_LIMIT, katalog_stanu=RENDER_CACHE_DIR)
+
+# Backend importowany tylko, gdy jest używany (SQLAlchemy nie spowalnia startu)
+if DATA_BACKEND == "sql":
+    from db import BazaPomiarow
+    baza = BazaPomiarow()
+elif DATA_BACKEND == "arrow":
+    from magazyn import MagazynKolumnowy
+    baza = MagazynKolumnowy()
+else:
+    baza = None
+
+kriging_cache = KrigingCache(KRIGING_CACHE_SIZE, reuse_variogram=KRIGING_REUSE_VARIOGRAM,
+                             okno_wariogramu=KRIGING_VARIOGRAM_WINDOW_DAYS)
+
 MAPA_ZMIENNYCH = {
     "pm25": ("PM25", "PM25"),
     "temp": ("temperatura", "temperatura"),
@@ -29,9 +108,40 @@ MAPA_ZMIENNYCH = {
 }
 
 def load_data():
-    """Wczytaj dane z pliku CSV"""
+    """Wczytaj wszystkie dane (współdzielony cache, nie modyfikuj wyniku)"""
     try:
-        df = pd.read_csv(CSV_FILE, encoding='utf-8')
+        if baza is not None:
+            return baza.pobierz()
+        return dataset.get_cache(CSV_FILE).get()
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Błąd podczas wczytywania danych: {e}")
+        return None
+
+def load_data_for_date(data_pomiaru: str, zmienne: list = None):
+    """
+    Wiersze jednej daty - widok na współdzielony zbiór (nie modyfikuj).
+    zmienne zawęża kolumny pomiarowe pobierane z bazy.
+    """
+    try:
+        if baza is not None:
+            return baza.pobierz(data=data_pomiaru, zmienne=zmienne)
+        return dataset.get_cache(CSV_FILE).dla_daty(data_pomiaru)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Błąd podczas wczytywania danych: {e}")
+        return None
+
+def load_data_range(od: str = None, do: str = None, zmienne: list = None, stacje: list = None):
+    """Wiersze z zakresu dat od..do włącznie - widok na współdzielony zbiór"""
+    try:
+        if baza is not None:
+            return baza.pobierz(od=od, do=do, zmienne=zmienne, stacje=stacje)
+        df = dataset.get_cache(CSV_FILE).zakres_dat(od, do)
+        if stacje:
+            df = df[df['nazwa'].isin(stacje)]
         return df
     except FileNotFoundError:
         return None
@@ -39,19 +149,40 @@ def load_data():
         print(f"Błąd podczas wczytywania danych: {e}")
         return None
 
+def porcje_danych(od: str = None, do: str = None, zmienne: list = None, stacje: list = None):
+    """Wiersze z zakresu dat porcjami (eksport) - bez materializowania całości"""
+    kolumny = ['nazwa', 'lat', 'lon', 'data'] + list(zmienne or dataset.KOLUMNY_POMIAROWE)
+    if baza is not None:
+        return baza.porcje(od=od, do=do, zmienne=zmienne, stacje=stacje)
+    df = dataset.get_cache(CSV_FILE).zakres_dat(od, do)
+    return eksport.porcje_ramki(df, kolumny, stacje)
+
+def get_data_version():
+    """
+    Wersja zbioru danych (do kluczy cache) albo None, gdy brak danych.
+    W żądaniu ustalana raz - bez zapytania do bazy przy każdym kluczu.
+    """
+    if has_request_context() and 'wersja_danych' in g:
+        return g.wersja_danych
+    try:
+        if baza is not None:
+            wersja = baza.wersja()
+        else:
+            wersja = dataset.get_cache(CSV_FILE).wersja
+    except Exception:
+        wersja = None
+    if has_request_context():
+        g.wersja_danych = wersja
+    return wersja
+
 def get_available_dates():
     """Pobierz dostępne daty z danych"""
-    df = load_data()
-    if df is None:
+    try:
+        if baza is not None:
+            return baza.daty()
+        return dataset.get_cache(CSV_FILE).daty()
+    except Exception:
         return []
-    
-    if 'data' in df.columns:
-        try:
-            dates = sorted(df['data'].unique())
-            return dates
-        except:
-            return []
-    return []
 
 def get_available_variables():
     """Pobierz dostępne zmienne"""
@@ -75,61 +206,265 @@ def api_variables():
     variables = get_available_variables()
     return jsonify(variables)
 
-def rysuj_mape_dla_daty(data_pomiaru: str, zmienna: str = "pm25"):
-    """Rysuj mapę punktów dla danej daty"""
-    _, kolumna = MAPA_ZMIENNYCH[zmienna]
-    
+def _porcje_statystyk():
+    """
+    Wiersze do tabeli statystyk: z bazy i magazynu porcjami (bez wczytywania
+    całej tabeli), z CSV cała ramka - i tak trzymana w pamięci procesu.
+    """
+    if baza is not None:
+        return porcje_danych(None, None, dataset.KOLUMNY_POMIAROWE)
     df = load_data()
-    if df is None:
-        return False
+    return [df] if df is not None else None
+
+def tabela_statystyk():
+    """Statystyki (data × zmienna) bieżącej wersji danych - liczone raz na wersję"""
+    return statystyki.tabela(get_data_version(), _porcje_statystyk)
+
+def statystyki_dla_daty(data_pomiaru: str, kolumna: str):
+    """Słownik miar kolumny dla daty albo None, gdy brak danych"""
+    tabela = tabela_statystyk()
+    return tabela.dla(data_pomiaru, kolumna) if tabela is not None else None
+
+@app.route('/api/stats')
+def api_stats():
+    """
+    Statystyki opisowe dla par (data, zmienna).
+    Parametry: data albo od/do, zmienna (wiele, domyślnie wszystkie).
+    """
+    zmienne = request.args.getlist('zmienna') or list(MAPA_ZMIENNYCH)
+    data = request.args.get('data') or None
+    od = request.args.get('od') or data
+    do = request.args.get('do') or data
+
+    nieznane = [z for z in zmienne if z not in MAPA_ZMIENNYCH]
+    if nieznane:
+        return jsonify({'status': 'error', 'message': f'Nieznane zmienne: {", ".join(nieznane)}'}), 400
+    try:
+        for d in (od, do):
+            if d is not None:
+                date.fromisoformat(d)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Daty muszą mieć format YYYY-MM-DD'}), 400
+
+    tabela = tabela_statystyk()
+    if tabela is None:
+        return jsonify({'status': 'error', 'message': 'Brak danych'}), 500
+
+    zmienna_kolumny = {MAPA_ZMIENNYCH[z][1]: z for z in zmienne}
+    ramka = tabela.zakres(od, do, list(zmienna_kolumny))
+    wynik = []
+    for wiersz in ramka.itertuples(index=False):
+        rekord = {'data': wiersz.data, 'zmienna': zmienna_kolumny[wiersz.kolumna]}
+        for miara in statystyki.MIARY:
+            wartosc = getattr(wiersz, miara)
+            rekord[miara] = int(wartosc) if miara == 'n' else (None if np.isnan(wartosc) else float(wartosc))
+        wynik.append(rekord)
+    return jsonify(wynik)
+
+def archiwum_szeregow():
+    """Dzienne agregaty całego archiwum - po dopisaniu dni uzupełniane, nie przeliczane"""
+    return szeregi.archiwum(get_data_version(), get_available_dates(),
+                            lambda od: porcje_danych(od, None, dataset.KOLUMNY_POMIAROWE))
+
+def _parametry_szeregu(args):
+    """
+    (parametry, None) zapytania o szereg czasowy albo (None, komunikat błędu).
+    Parametry: zmienna, stacja (brak - cała sieć), od, do, okres, okno, prog.
+    """
+    zmienna = args.get('zmienna', 'pm25').strip()
+    if zmienna not in MAPA_ZMIENNYCH:
+        return None, 'Nieprawidłowa zmienna'
+    kolumna = MAPA_ZMIENNYCH[zmienna][1]
+    od = args.get('od') or None
+    do = args.get('do') or None
+    try:
+        for d in (od, do):
+            if d is not None:
+                date.fromisoformat(d)
+    except ValueError:
+        return None, 'Daty muszą mieć format YYYY-MM-DD'
+    okres = args.get('okres', 'dzien')
+    if okres not in szeregi.OKRESY:
+        return None, f'Nieznany okres (dostępne: {", ".join(szeregi.OKRESY)})'
+    try:
+        okno = int(args['okno']) if args.get('okno') else None
+        prog = float(args['prog']) if args.get('prog') else szeregi.PROGI_WHO.get(kolumna)
+    except ValueError:
+        return None, 'Parametry okno i prog muszą być liczbami'
+    if okno is not None and (okno < 1 or okres != 'dzien'):
+        return None, 'Średnia krocząca (okno >= 1 dni) jest dostępna dla okresu dzien'
+    return {'zmienna': zmienna, 'kolumna': kolumna, 'stacja': args.get('stacja') or None,
+            'od': od, 'do': do, 'okres': okres, 'okno': okno, 'prog': prog}, None
+
+def szereg_czasowy(p):
+    """Ramka okresów szeregu (z kolumną srednia_kroczaca dla okna) albo None, gdy brak danych"""
+    archiwum = archiwum_szeregow()
+    if archiwum is None:
+        return None
+    ramka = archiwum.szereg(p['kolumna'], p['stacja'], p['od'], p['do'], p['okres'], p['prog'])
+    if p['okno'] is not None:
+        ramka['srednia_kroczaca'] = archiwum.srednia_kroczaca(p['kolumna'], p['okno'], p['stacja'], p['od'], p['do'])
+    return ramka
+
+def _sprawdz_stacje(stacja: str):
+    """Komunikat błędu dla nieznanej stacji albo None"""
+    archiwum = archiwum_szeregow()
+    if archiwum is None:
+        return 'Brak danych'
+    if stacja is not None and archiwum.numer_stacji(stacja) is None:
+        return f'Nieznana stacja: {stacja}'
+    return None
+
+@app.route('/api/szeregi')
+def api_szeregi():
+    """
+    Szereg czasowy zmiennej dla stacji albo całej sieci: średnie i liczby
+    pomiarów w okresach (dzien, tydzien, miesiac), dni z przekroczeniem
+    progu (domyślnie WHO dla PM2.5) i opcjonalnie średnia krocząca z `okno` dni.
+    """
+    p, blad = _parametry_szeregu(request.args)
+    if blad is not None:
+        return jsonify({'status': 'error', 'message': blad}), 400
+    blad = _sprawdz_stacje(p['stacja'])
+    if blad is not None:
+        return jsonify({'status': 'error', 'message': blad}), 404
+
+    ramka = szereg_czasowy(p)
+    dane = []
+    for wiersz in ramka.to_dict('records'):
+        rekord = {'okres': wiersz['okres'], 'n': int(wiersz['n'])}
+        for pole in ('srednia', 'srednia_kroczaca'):
+            if pole in wiersz:
+                rekord[pole] = None if np.isnan(wiersz[pole]) else float(wiersz[pole])
+        if 'przekroczenia' in wiersz:
+            rekord['przekroczenia'] = int(wiersz['przekroczenia'])
+        dane.append(rekord)
+    return jsonify({'zmienna': p['zmienna'], 'stacja': p['stacja'], 'okres': p['okres'],
+                    'okno': p['okno'], 'prog': p['prog'], 'dane': dane})
+
+@app.route('/api/przekroczenia')
+def api_przekroczenia():
+    """
+    Liczba dni ze średnią dobową powyżej progu dla każdej stacji w zakresie
+    dat, malejąco. Parametry: zmienna, prog (domyślnie WHO dla PM2.5), od, do, limit.
+    """
+    p, blad = _parametry_szeregu(request.args)
+    if blad is None and p['prog'] is None:
+        blad = 'Próg jest wymagany dla tej zmiennej'
+    limit = request.args.get('limit', type=int)
+    if blad is not None:
+        return jsonify({'status': 'error', 'message': blad}), 400
+
+    archiwum = archiwum_szeregow()
+    if archiwum is None:
+        return jsonify({'status': 'error', 'message': 'Brak danych'}), 500
+    ramka = archiwum.przekroczenia_stacji(p['kolumna'], p['prog'], p['od'], p['do'])
+    if limit is not None:
+        ramka = ramka.head(max(limit, 0))
+    return jsonify({'zmienna': p['zmienna'], 'prog': p['prog'], 'od': p['od'], 'do': p['do'],
+                    'stacje': [{'stacja': str(w.stacja), 'dni_przekroczen': int(w.dni_przekroczen),
+                                'dni_z_pomiarami': int(w.dni_z_pomiarami)}
+                               for w in ramka.itertuples(index=False)]})
+
+def _dane_mapy(data_pomiaru: str, zmienna: str):
+    """(ramka daty, układ stacji, wartości zmiennej) dla rendererów map albo None"""
+    _, kolumna = MAPA_ZMIENNYCH[zmienna]
     
-    # Filtruj dane dla danej daty
-    df_filtered = df[df['data'] == data_pomiaru].copy()
+    df_filtered = load_data_for_date(data_pomiaru, [kolumna])
+    metrics.etap('dane')
+    if df_filtered is None:
+        return None
     
     if df_filtered.empty:
         print(f"Brak danych dla daty {data_pomiaru}")
-        return False
+        return None
     
-    # Sprawdź czy kolumna istnieje
     if kolumna not in df_filtered.columns:
         print(f"Kolumna {kolumna} nie istnieje w danych")
-        return False
+        return None
     
-    # Upewnij się, że mamy kolumny 'nazwa', 'lat', 'lon'
     if not all(col in df_filtered.columns for col in ['nazwa', 'lat', 'lon']):
         print("Brakuje wymaganych kolumn: nazwa, lat, lon")
-        return False
+        return None
     
-    df_filtered["geometry"] = df_filtered.apply(lambda r: Point(r["lon"], r["lat"]), axis=1)
-    gdf = gpd.GeoDataFrame(df_filtered, geometry="geometry", crs="EPSG:4326")
+    uklad = stacje.uklad_stacji(df_filtered)
+    metrics.etap('geometria')
+    return df_filtered, uklad, df_filtered[kolumna].to_numpy(dtype=float)
+
+def zasieg_mapy(uklad):
+    """Zasięg mapy (lon_min, lon_max, lat_min, lat_max) - stacje z buforem ~11 km"""
+    buffer = 0.1
+    return (uklad.x.min() - buffer, uklad.x.max() + buffer,
+            uklad.y.min() - buffer, uklad.y.max() + buffer)
+
+def siatka_idw(uklad, z, power: float = 2, radius: float = None, max_neighbors: int = None):
+    """Osie i wartości siatki IDW (GRID_SIZE × GRID_SIZE) w zasięgu mapy"""
+    x0, x1, y0, y1 = zasieg_mapy(uklad)
+    grid_x = np.linspace(x0, x1, GRID_SIZE)
+    grid_y = np.linspace(y0, y1, GRID_SIZE)
+    zgrid = idw_grid(uklad.x, uklad.y, z, grid_x, grid_y, power=power, radius=radius,
+                     max_neighbors=max_neighbors)
+    return grid_x, grid_y, zgrid
+
+def siatka_kriging(data_pomiaru: str, zmienna: str, uklad, z):
+    """Osie i wartości siatki Kriging (z zapasowym IDW przy błędzie modelu)"""
+    x0, x1, y0, y1 = zasieg_mapy(uklad)
+    xi = np.linspace(x0, x1, KRIGING_GRID_SIZE)
+    yi = np.linspace(y0, y1, KRIGING_GRID_SIZE)
+    wersja = get_data_version()
+    try:
+        zi, ss = kriging_cache.siatka(
+            (data_pomiaru, zmienna, wersja), uklad.x, uklad.y, z, xi, yi,
+            variogram_model='spherical', nlags=6, grupa_wariogramu=zmienna,
+            dzien=date.fromisoformat(data_pomiaru[:10]).toordinal(), wersja_danych=wersja
+        )
+    except Exception as e:
+        print(f"Błąd Kringinga: {e}, używam IDW")
+        # Fallback do IDW
+        zi = idw_grid(uklad.x, uklad.y, z, xi, yi)
+    return xi, yi, zi
+
+def siatka_rbf(uklad, z, kernel: str = "thin_plate_spline"):
+    """Osie i wartości siatki RBF (GRID_SIZE × GRID_SIZE) w zasięgu mapy"""
+    x0, x1, y0, y1 = zasieg_mapy(uklad)
+    grid_x = np.linspace(x0, x1, GRID_SIZE)
+    grid_y = np.linspace(y0, y1, GRID_SIZE)
+    return grid_x, grid_y, rbf_grid(uklad.x, uklad.y, z, grid_x, grid_y, kernel=kernel)
+
+def rysuj_mape_dla_daty(data_pomiaru: str, zmienna: str = "pm25"):
+    """Rysuj mapę punktów dla danej daty"""
+    import matplotlib.pyplot as plt
+
+    _, kolumna = MAPA_ZMIENNYCH[zmienna]
+    dane = _dane_mapy(data_pomiaru, zmienna)
+    if dane is None:
+        return False
+    df_filtered, uklad, z = dane
+    gdf = uklad.z_wartosciami(df_filtered, kolumna)
 
     fig, ax = plt.subplots(figsize=(14, 10), dpi=100, facecolor='white')
     ax.set_facecolor('#e8f4f8')
     
     # Set axis limits BEFORE adding basemap
-    buffer = 0.1
-    ax.set_xlim(gdf.geometry.x.min() - buffer, gdf.geometry.x.max() + buffer)
-    ax.set_ylim(gdf.geometry.y.min() - buffer, gdf.geometry.y.max() + buffer)
+    extent = zasieg_mapy(uklad)
+    ax.set_xlim(extent[0], extent[1])
+    ax.set_ylim(extent[2], extent[3])
     
     # Basemap OSM w EPSG:4326
-    try:
-        ctx.add_basemap(ax, source=ctx.providers.OpenStreetMap.Mapnik, zoom=11, alpha=0.4, crs='EPSG:4326')
-    except Exception as e:
-        print(f"Błąd basemapy: {e}")
+    metrics.etap('rysowanie')
+    dodaj_basemape(ax, alpha=0.4)
+    metrics.etap('basemapa')
     
     # Reset axis limits AFTER basemap
-    ax.set_xlim(gdf.geometry.x.min() - buffer, gdf.geometry.x.max() + buffer)
-    ax.set_ylim(gdf.geometry.y.min() - buffer, gdf.geometry.y.max() + buffer)
+    ax.set_xlim(extent[0], extent[1])
+    ax.set_ylim(extent[2], extent[3])
     
     # Punkty z skalą kolorów
     gdf.plot(ax=ax, column=kolumna, cmap="RdYlBu_r", legend=True, markersize=200, 
              alpha=0.95, edgecolor='white', linewidth=3, zorder=15)
     
     # Etykiety miast
-    for _, row in gdf.iterrows():
-        ax.text(row.geometry.x + 0.015, row.geometry.y + 0.008, row["nazwa"], 
-                fontsize=11, fontweight='bold', color='darkblue',
-                bbox=dict(boxstyle='round,pad=0.4', facecolor='white', alpha=0.9, edgecolor='gray', linewidth=1.5))
+    uklad.etykiety(ax, fontsize=11, zorder=3, ramka=dict(boxstyle='round,pad=0.4', alpha=0.9))
     
     # Legenda
     leg = ax.get_legend()
@@ -147,55 +482,23 @@ def rysuj_mape_dla_daty(data_pomiaru: str, zmienna: str = "pm25"):
     ax.set_title(f"Mapa punktów pomiarowych – {zmienna.upper()} ({data_pomiaru})", 
                  fontsize=15, fontweight='bold', pad=15)
     
+    metrics.etap('rysowanie')
     plt.tight_layout()
+    metrics.etap('tight_layout')
     return True
 
-def rysuj_mape_idw(data_pomiaru: str, zmienna: str = "pm25"):
+def rysuj_mape_idw(data_pomiaru: str, zmienna: str = "pm25", power: float = 2,
+                   radius: float = None, max_neighbors: int = None):
     """Rysuj mapę interpolacji IDW dla danej daty"""
-    _, kolumna = MAPA_ZMIENNYCH[zmienna]
-    
-    df = load_data()
-    if df is None:
-        return False
-    
-    df_filtered = df[df['data'] == data_pomiaru].copy()
-    
-    if df_filtered.empty:
-        print(f"Brak danych dla daty {data_pomiaru}")
-        return False
-    
-    if kolumna not in df_filtered.columns:
-        print(f"Kolumna {kolumna} nie istnieje w danych")
-        return False
-    
-    if not all(col in df_filtered.columns for col in ['nazwa', 'lat', 'lon']):
-        print("Brakuje wymaganych kolumn")
-        return False
-    
-    df_filtered["geometry"] = df_filtered.apply(lambda row: Point(row["lon"], row["lat"]), axis=1)
-    gdf = gpd.GeoDataFrame(df_filtered, geometry="geometry", crs="EPSG:4326")
-    
-    # Użyj współrzędnych geograficznych (lat/lon) do interpolacji
-    x = gdf.geometry.x.values  # longitude
-    y = gdf.geometry.y.values  # latitude
-    z = gdf[kolumna].values
+    import matplotlib.pyplot as plt
 
-    # Buffer w stopniach geograficznych (~1 stopień ≈ 111 km)
-    buffer = 0.1  # ~11 km
-    grid_x = np.linspace(x.min() - buffer, x.max() + buffer, 150)
-    grid_y = np.linspace(y.min() - buffer, y.max() + buffer, 150)
-    grid_x, grid_y = np.meshgrid(grid_x, grid_y)
-
-    def idw(xi, yi, x, y, z, power=2):
-        dist = np.sqrt((x - xi) ** 2 + (y - yi) ** 2)
-        dist[dist == 0] = 1e-10
-        weights = 1 / dist ** power
-        return np.sum(weights * z) / np.sum(weights)
-
-    zgrid = np.zeros_like(grid_x)
-    for i in range(grid_x.shape[0]):
-        for j in range(grid_x.shape[1]):
-            zgrid[i, j] = idw(grid_x[i, j], grid_y[i, j], x, y, z)
+    dane = _dane_mapy(data_pomiaru, zmienna)
+    if dane is None:
+        return False
+    _, uklad, z = dane
+    x, y = uklad.x, uklad.y  # longitude, latitude
+    grid_x, grid_y, zgrid = siatka_idw(uklad, z, power=power, radius=radius, max_neighbors=max_neighbors)
+    metrics.etap('interpolacja')
 
     fig, ax = plt.subplots(figsize=(14, 10), dpi=100, facecolor='white')
     ax.set_facecolor('white')
@@ -205,10 +508,9 @@ def rysuj_mape_idw(data_pomiaru: str, zmienna: str = "pm25"):
     ax.set_ylim(grid_y.min(), grid_y.max())
     
     # Basemap OSM w EPSG:4326
-    try:
-        ctx.add_basemap(ax, source=ctx.providers.OpenStreetMap.Mapnik, zoom=11, alpha=0.35, crs='EPSG:4326')
-    except Exception as e:
-        print(f"Błąd basemapy: {e}")
+    metrics.etap('rysowanie')
+    dodaj_basemape(ax, alpha=0.35)
+    metrics.etap('basemapa')
     
     # Reset axis limits AFTER basemap
     ax.set_xlim(grid_x.min(), grid_x.max())
@@ -230,10 +532,7 @@ def rysuj_mape_idw(data_pomiaru: str, zmienna: str = "pm25"):
     ax.scatter(x, y, c='darkblue', s=120, edgecolors='white', linewidth=2.5, zorder=15, marker='o')
     
     # Etykiety miast
-    for _, row in gdf.iterrows():
-        ax.text(row.geometry.x + 0.015, row.geometry.y + 0.008, row["nazwa"], 
-                fontsize=9, color='darkblue', fontweight='bold', zorder=20,
-                bbox=dict(boxstyle='round,pad=0.35', facecolor='white', alpha=0.95, edgecolor='gray', linewidth=1.5))
+    uklad.etykiety(ax)
     
     # Mapa kolorów
     cbar = plt.colorbar(im, ax=ax, label=f"{zmienna.upper()} (IDW)", pad=0.02, shrink=0.9)
@@ -244,67 +543,23 @@ def rysuj_mape_idw(data_pomiaru: str, zmienna: str = "pm25"):
                  fontsize=14, fontweight='bold', pad=15)
     ax.set_xlabel('Długość geograficzna (°)', fontsize=10)
     ax.set_ylabel('Szerokość geograficzna (°)', fontsize=10)
+    metrics.etap('rysowanie')
     plt.tight_layout()
+    metrics.etap('tight_layout')
     return True
 
 def rysuj_mape_kriging(data_pomiaru: str, zmienna: str = "pm25"):
     """Rysuj mapę interpolacji Kriging dla danej daty"""
-    _, kolumna = MAPA_ZMIENNYCH[zmienna]
-    
-    df = load_data()
-    if df is None:
-        return False
-    
-    df_filtered = df[df['data'] == data_pomiaru].copy()
-    
-    if df_filtered.empty:
-        print(f"Brak danych dla daty {data_pomiaru}")
-        return False
-    
-    if kolumna not in df_filtered.columns:
-        print(f"Kolumna {kolumna} nie istnieje w danych")
-        return False
-    
-    if not all(col in df_filtered.columns for col in ['nazwa', 'lat', 'lon']):
-        print("Brakuje wymaganych kolumn")
+    import matplotlib.pyplot as plt
+
+    dane = _dane_mapy(data_pomiaru, zmienna)
+    if dane is None:
         return False
-    
-    # Przygotuj dane
-    df_filtered["geometry"] = df_filtered.apply(lambda row: Point(row["lon"], row["lat"]), axis=1)
-    gdf = gpd.GeoDataFrame(df_filtered, geometry="geometry", crs="EPSG:4326")
-    
-    # Użyj współrzędnych geograficznych (lat/lon) do interpolacji
-    x = gdf.geometry.x.values.astype(float)  # longitude
-    y = gdf.geometry.y.values.astype(float)  # latitude
-    z = gdf[kolumna].values.astype(float)
-    
-    # Utwórz grid w współrzędnych geograficznych
-    buffer = 0.1  # ~11 km
-    xi = np.linspace(x.min() - buffer, x.max() + buffer, 120)
-    yi = np.linspace(y.min() - buffer, y.max() + buffer, 120)
+    _, uklad, z = dane
+    x, y = uklad.x, uklad.y  # longitude, latitude
+    xi, yi, zi = siatka_kriging(data_pomiaru, zmienna, uklad, z)
     XI, YI = np.meshgrid(xi, yi)
-    
-    # Kriging - prosta implementacja
-    try:
-        ok = OrdinaryKriging(
-            x, y, z,
-            variogram_model='spherical',
-            verbose=False,
-            enable_plotting=False,
-            nlags=6
-        )
-        zi, ss = ok.execute('grid', xi, yi)
-    except Exception as e:
-        print(f"Błąd Kringinga: {e}, używam IDW")
-        # Fallback do IDW
-        zi = np.zeros_like(XI)
-        for i in range(XI.shape[0]):
-            for j in range(XI.shape[1]):
-                # IDW
-                distances = np.sqrt((x - XI[i, j])**2 + (y - YI[i, j])**2)
-                distances = np.where(distances < 1e-6, 1e-6, distances)
-                weights = 1.0 / distances**2
-                zi[i, j] = np.sum(weights * z) / np.sum(weights)
+    metrics.etap('interpolacja')
     
     # Rysowanie
     fig, ax = plt.subplots(figsize=(14, 10), dpi=100, facecolor='white')
@@ -315,10 +570,9 @@ def rysuj_mape_kriging(data_pomiaru: str, zmienna: str = "pm25"):
     ax.set_ylim(YI.min(), YI.max())
     
     # Basemap OSM w EPSG:4326
-    try:
-        ctx.add_basemap(ax, source=ctx.providers.OpenStreetMap.Mapnik, zoom=11, alpha=0.35, crs='EPSG:4326')
-    except Exception as e:
-        print(f"Błąd basemapy: {e}")
+    metrics.etap('rysowanie')
+    dodaj_basemape(ax, alpha=0.35)
+    metrics.etap('basemapa')
     
     # Reset axis limits AFTER basemap
     ax.set_xlim(XI.min(), XI.max())
@@ -333,10 +587,7 @@ def rysuj_mape_kriging(data_pomiaru: str, zmienna: str = "pm25"):
                         linewidth=2.5, zorder=15, vmin=z.min(), vmax=z.max())
     
     # Etykiety miast
-    for idx, row in gdf.iterrows():
-        ax.text(row.geometry.x + 0.015, row.geometry.y + 0.008, row["nazwa"],
-                fontsize=9, color='darkblue', fontweight='bold', zorder=20,
-                bbox=dict(boxstyle='round,pad=0.35', facecolor='white', alpha=0.95, edgecolor='gray', linewidth=1.5))
+    uklad.etykiety(ax)
     
     # Kolorbar
     cbar = plt.colorbar(scatter, ax=ax, label=f"{zmienna.upper()}", pad=0.02, shrink=0.9)
@@ -349,19 +600,141 @@ def rysuj_mape_kriging(data_pomiaru: str, zmienna: str = "pm25"):
     ax.set_ylabel('Szerokość geograficzna (°)', fontsize=10)
     ax.grid(True, alpha=0.2, linestyle='--')
     
+    metrics.etap('rysowanie')
+    plt.tight_layout()
+    metrics.etap('tight_layout')
+    return True
+
+def rysuj_mape_rbf(data_pomiaru: str, zmienna: str = "pm25", kernel: str = "thin_plate_spline"):
+    """Rysuj mapę interpolacji RBF dla danej daty"""
+    import matplotlib.pyplot as plt
+
+    dane = _dane_mapy(data_pomiaru, zmienna)
+    if dane is None:
+        return False
+    _, uklad, z = dane
+    x, y = uklad.x, uklad.y  # longitude, latitude
+    grid_x, grid_y, zgrid = siatka_rbf(uklad, z, kernel=kernel)
+    metrics.etap('interpolacja')
+
+    fig, ax = plt.subplots(figsize=(14, 10), dpi=100, facecolor='white')
+    ax.set_facecolor('white')
+    
+    # Set axis limits BEFORE adding basemap
+    ax.set_xlim(grid_x.min(), grid_x.max())
+    ax.set_ylim(grid_y.min(), grid_y.max())
+    
+    # Basemap OSM w EPSG:4326
+    metrics.etap('rysowanie')
+    dodaj_basemape(ax, alpha=0.35)
+    metrics.etap('basemapa')
+    
+    # Reset axis limits AFTER basemap
+    ax.set_xlim(grid_x.min(), grid_x.max())
+    ax.set_ylim(grid_y.min(), grid_y.max())
+    
+    # Heatmap na górze z przezroczystością (RBF może wyjść poza zakres pomiarów)
+    im = ax.imshow(
+        zgrid,
+        extent=(grid_x.min(), grid_x.max(), grid_y.min(), grid_y.max()),
+        origin='lower',
+        cmap='RdYlBu_r',
+        alpha=0.6,
+        vmin=z.min(),
+        vmax=z.max(),
+        zorder=5
+    )
+    
+    # Punkty pomiarowe
+    ax.scatter(x, y, c='darkblue', s=120, edgecolors='white', linewidth=2.5, zorder=15, marker='o')
+    
+    # Etykiety miast
+    uklad.etykiety(ax)
+    
+    # Mapa kolorów
+    cbar = plt.colorbar(im, ax=ax, label=f"{zmienna.upper()} (RBF)", pad=0.02, shrink=0.9)
+    cbar.ax.tick_params(labelsize=9)
+    
+    # Tytuł
+    ax.set_title(f"Interpolacja {zmienna.upper()} metodą RBF – {data_pomiaru}", 
+                 fontsize=14, fontweight='bold', pad=15)
+    ax.set_xlabel('Długość geograficzna (°)', fontsize=10)
+    ax.set_ylabel('Szerokość geograficzna (°)', fontsize=10)
+    metrics.etap('rysowanie')
+    plt.tight_layout()
+    metrics.etap('tight_layout')
+    return True
+
+def rysuj_mape_voronoi(data_pomiaru: str, zmienna: str = "pm25"):
+    """Rysuj diagram Voronoia stacji dla danej daty"""
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import PolyCollection
+
+    dane = _dane_mapy(data_pomiaru, zmienna)
+    if dane is None:
+        return False
+    _, uklad, z = dane
+    x, y = uklad.x, uklad.y  # longitude, latitude
+    extent = zasieg_mapy(uklad)
+
+    # Komórki zależą tylko od położenia stacji - liczone raz dla układu
+    komorki = komorki_voronoi(x, y, extent)
+    metrics.etap('interpolacja')
+
+    fig, ax = plt.subplots(figsize=(14, 10), dpi=100, facecolor='white')
+    ax.set_facecolor('white')
+    
+    # Set axis limits BEFORE adding basemap
+    ax.set_xlim(extent[0], extent[1])
+    ax.set_ylim(extent[2], extent[3])
+    
+    # Basemap OSM w EPSG:4326
+    metrics.etap('rysowanie')
+    dodaj_basemape(ax, alpha=0.35)
+    metrics.etap('basemapa')
+    
+    # Reset axis limits AFTER basemap
+    ax.set_xlim(extent[0], extent[1])
+    ax.set_ylim(extent[2], extent[3])
+    
+    # Komórki kolorowane wartością stacji
+    cells = PolyCollection(komorki, array=z, cmap='RdYlBu_r', alpha=0.6,
+                           edgecolors='white', linewidths=1.5, zorder=5)
+    cells.set_clim(z.min(), z.max())
+    ax.add_collection(cells)
+    
+    # Punkty pomiarowe
+    ax.scatter(x, y, c='darkblue', s=120, edgecolors='white', linewidth=2.5, zorder=15, marker='o')
+    
+    # Etykiety miast
+    uklad.etykiety(ax)
+    
+    # Mapa kolorów
+    cbar = plt.colorbar(cells, ax=ax, label=f"{zmienna.upper()}", pad=0.02, shrink=0.9)
+    cbar.ax.tick_params(labelsize=9)
+    
+    # Tytuł
+    ax.set_title(f"Diagram Voronoia {zmienna.upper()} – {data_pomiaru}", 
+                 fontsize=14, fontweight='bold', pad=15)
+    ax.set_xlabel('Długość geograficzna (°)', fontsize=10)
+    ax.set_ylabel('Szerokość geograficzna (°)', fontsize=10)
+    metrics.etap('rysowanie')
     plt.tight_layout()
+    metrics.etap('tight_layout')
     return True
 
 def rysuj_wykresy_dla_daty(data_pomiaru: str, zmienna: str = "pm25"):
     """Rysuj wykresy statystyczne dla danej daty"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     _, kolumna = MAPA_ZMIENNYCH[zmienna]
     
-    df = load_data()
-    if df is None:
+    df_filtered = load_data_for_date(data_pomiaru, [kolumna])
+    metrics.etap('dane')
+    if df_filtered is None:
         return False
     
-    df_filtered = df[df['data'] == data_pomiaru].copy()
-    
     if df_filtered.empty:
         print(f"Brak danych dla daty {data_pomiaru}")
         return False
@@ -412,13 +785,415 @@ def rysuj_wykresy_dla_daty(data_pomiaru: str, zmienna: str = "pm25"):
     axs[2].set_facecolor('#f9f9f9')
     
     # Dodaj statystyki na ostatnim wykresie
-    stats_text = f"Min: {df_filtered[kolumna].min():.1f}\nMaks: {df_filtered[kolumna].max():.1f}\nŚr: {df_filtered[kolumna].mean():.1f}"
-    axs[2].text(1.25, df_filtered[kolumna].min(), stats_text, fontsize=9, 
-                bbox=dict(boxstyle='round,pad=0.4', facecolor='lightyellow', alpha=0.8))
+    staty = statystyki_dla_daty(data_pomiaru, kolumna)
+    if staty is not None:
+        stats_text = f"Min: {staty['min']:.1f}\nMaks: {staty['max']:.1f}\nŚr: {staty['srednia']:.1f}"
+        axs[2].text(1.25, staty['min'], stats_text, fontsize=9,
+                    bbox=dict(boxstyle='round,pad=0.4', facecolor='lightyellow', alpha=0.8))
 
+    metrics.etap('rysowanie')
     plt.tight_layout()
+    metrics.etap('tight_layout')
     return True
 
+def rysuj_szereg_czasowy(p: dict):
+    """Wykres szeregu czasowego (średnie okresów, średnia krocząca, próg, przekroczenia)"""
+    import matplotlib.pyplot as plt
+
+    ramka = szereg_czasowy(p)
+    metrics.etap('dane')
+    if ramka is None or not ramka['n'].any():
+        return False
+
+    czas = pd.to_datetime(ramka['okres'])
+    z_progiem = p['prog'] is not None
+    fig, osie = plt.subplots(2 if z_progiem else 1, 1, figsize=(12, 6 if z_progiem else 4), dpi=100,
+                             sharex=True, squeeze=False, facecolor='white',
+                             gridspec_kw={'height_ratios': [3, 1]} if z_progiem else None)
+    ax = osie[0, 0]
+    nazwa = p['stacja'] or "cała sieć"
+    ax.set_title(f"{p['zmienna'].upper()} – {nazwa} ({p['okres']})", fontsize=14, fontweight='bold', pad=12)
+    ax.plot(czas, ramka['srednia'], marker='o' if len(ramka) <= 60 else None, markersize=4,
+            linewidth=1.5, color='#2563eb', label="Średnia")
+    if 'srednia_kroczaca' in ramka:
+        ax.plot(czas, ramka['srednia_kroczaca'], linewidth=2, color='#f97316',
+                label=f"Średnia krocząca ({p['okno']} dni)")
+    if z_progiem:
+        ax.axhline(p['prog'], color='#dc2626', linestyle='--', linewidth=1.2, label=f"Próg {p['prog']:g}")
+    ax.set_ylabel(p['zmienna'].upper(), fontsize=10, fontweight='bold')
+    ax.grid(True, alpha=0.3, linestyle='--')
+    ax.set_facecolor('#f9f9f9')
+    ax.legend(loc='upper left', fontsize=9)
+
+    if z_progiem:
+        ax2 = osie[1, 0]
+        szerokosc = {'dzien': 0.8, 'tydzien': 5, 'miesiac': 20}[p['okres']]
+        ax2.bar(czas, ramka['przekroczenia'], width=szerokosc, color='#dc2626', alpha=0.7)
+        ax2.set_ylabel("Dni > próg" if p['stacja'] else "Stacjo-dni > próg", fontsize=10, fontweight='bold')
+        ax2.grid(axis='y', alpha=0.3)
+        ax2.set_facecolor('#f9f9f9')
+
+    metrics.etap('rysowanie')
+    fig.autofmt_xdate()
+    plt.tight_layout()
+    metrics.etap('tight_layout')
+    return True
+
+RENDERERY = {
+    "mapa": rysuj_mape_dla_daty,
+    "idw": rysuj_mape_idw,
+    "kriging": rysuj_mape_kriging,
+    "rbf": rysuj_mape_rbf,
+    "voronoi": rysuj_mape_voronoi,
+    "wykres": rysuj_wykresy_dla_daty,
+}
+
+def _warstwa_szablonu(data_pomiaru: str, zmienna: str, metoda: str):
+    """(układ stacji, argumenty SzablonMapy.renderuj) dla metody albo None"""
+    dane = _dane_mapy(data_pomiaru, zmienna)
+    if dane is None:
+        return None
+    _, uklad, z = dane
+    nazwa = zmienna.upper()
+    warstwa = dict(vmin=z.min(), vmax=z.max(), etykieta=nazwa)
+
+    if metoda == "mapa":
+        warstwa.update(z=z, etykieta="", tytul=f"Mapa punktów pomiarowych – {nazwa} ({data_pomiaru})")
+    elif metoda == "idw":
+        _, _, zgrid = siatka_idw(uklad, z)
+        warstwa.update(siatka=zgrid, etykieta=f"{nazwa} (IDW)",
+                       tytul=f"Interpolacja {nazwa} metodą IDW – {data_pomiaru}")
+    elif metoda == "rbf":
+        _, _, zgrid = siatka_rbf(uklad, z)
+        warstwa.update(siatka=zgrid, etykieta=f"{nazwa} (RBF)",
+                       tytul=f"Interpolacja {nazwa} metodą RBF – {data_pomiaru}")
+    elif metoda == "kriging":
+        xi, yi, zi = siatka_kriging(data_pomiaru, zmienna, uklad, z)
+        warstwa.update(xi=xi, yi=yi, siatka=zi, z=z,
+                       tytul=f"Interpolacja {nazwa} metodą Kriging – {data_pomiaru}")
+    elif metoda == "voronoi":
+        warstwa.update(z=z, tytul=f"Diagram Voronoia {nazwa} – {data_pomiaru}")
+    metrics.etap('interpolacja')
+    return uklad, warstwa
+
+def renderuj_szablon(data_pomiaru: str, zmienna: str, metoda: str):
+    """Obraz RGB mapy narysowany na szablonie figury albo None, gdy brak danych"""
+    wynik = _warstwa_szablonu(data_pomiaru, zmienna, metoda)
+    if wynik is None:
+        return None
+    uklad, warstwa = wynik
+    szablon = szablony.szablon(metoda, uklad, dodaj_basemape)
+    metrics.etap('szablon')
+    obraz = szablon.renderuj(**warstwa)
+    metrics.etap('rysowanie')
+    return obraz
+
+def klucz_obrazu(data_pomiaru: str, zmienna: str, metoda: str):
+    """Klucz renderu dla bieżącej wersji danych i formatu obrazów"""
+    return klucz_renderu(data_pomiaru, zmienna, metoda, get_data_version(),
+                         parametry=obrazy.parametry_kodowania(), rozszerzenie=obrazy.ROZSZERZENIE)
+
+def znajdz_obraz(klucz: str):
+    """Ścieżka obrazu o danym kluczu (archiwum albo cache) lub None"""
+    return render_archive.pobierz(klucz) or render_cache.pobierz(klucz)
+
+def bajty_obrazu(klucz: str):
+    """Zakodowany obraz o danym kluczu - z pamięci procesu, a w drugiej kolejności z dysku"""
+    dane = pamiec_obrazow.pobierz(klucz)
+    metrics.cache('obrazy', dane is not None)
+    if dane is not None:
+        return dane
+    sciezka = znajdz_obraz(klucz)
+    if sciezka is None:
+        return None
+    try:
+        with open(sciezka, 'rb') as f:
+            dane = f.read()
+    except FileNotFoundError:
+        # Usunięty przez sprzątanie między sprawdzeniem a odczytem
+        return None
+    pamiec_obrazow.dodaj(klucz, dane)
+    return dane
+
+def _url_obrazu(klucz: str):
+    """Adres URL obrazu o danym kluczu"""
+    return url_for('obraz', klucz=klucz)
+
+def _zapisz_bajty(sciezka: str, dane: bytes):
+    with open(sciezka, 'wb') as f:
+        f.write(dane)
+
+def renderuj_obraz(data_pomiaru: str, zmienna: str, metoda: str, magazyn: RenderCache = None):
+    """
+    Wyrenderuj obraz do magazynu (domyślnie cache) i zwróć jego klucz.
+    Gotowe obrazy nie są rysowane ponownie; None oznacza brak danych.
+    """
+    # Klucz z parametrów jest jednocześnie nazwą artefaktu tego renderu
+    klucz = klucz_obrazu(data_pomiaru, zmienna, metoda)
+    if magazyn is None:
+        magazyn = render_cache
+        gotowy = znajdz_obraz(klucz) is not None
+        if not gotowy:
+            # Plik usunięty z dysku (LRU, sprzątanie), a obraz jest w pamięci
+            # procesu - zapisujemy go z powrotem, bo wynik czytają inne procesy
+            dane = pamiec_obrazow.pobierz(klucz)
+            if dane is not None:
+                magazyn.zapisz(klucz, lambda path: _zapisz_bajty(path, dane))
+                gotowy = True
+    else:
+        gotowy = magazyn.pobierz(klucz) is not None
+    metrics.cache('render', gotowy)
+    if gotowy:
+        return klucz
+
+    if FIGURE_TEMPLATES and metoda in szablony.SZABLONY:
+        with metrics.etapy(metoda):
+            obraz = renderuj_szablon(data_pomiaru, zmienna, metoda)
+            if obraz is None:
+                return None
+            dane = obrazy.koduj(obraz)
+            metrics.etap('kodowanie')
+            _zachowaj_obraz(magazyn, klucz, dane)
+            metrics.etap('zapis')
+        return klucz
+
+    import matplotlib.pyplot as plt
+
+    with metrics.etapy(metoda):
+        with _lock_pyplot:
+            try:
+                if not RENDERERY[metoda](data_pomiaru, zmienna):
+                    return None
+                dane = obrazy.koduj_figure(plt.gcf(), dpi=100, bbox_inches='tight', pad_inches=0.2)
+                metrics.etap('savefig')
+            finally:
+                plt.close('all')
+        _zachowaj_obraz(magazyn, klucz, dane)
+        metrics.etap('zapis')
+    return klucz
+
+def _zachowaj_obraz(magazyn: RenderCache, klucz: str, dane: bytes):
+    """Zakodowany obraz do pamięci procesu i na dysk (dla innych workerów i procesów)"""
+    pamiec_obrazow.dodaj(klucz, dane)
+    magazyn.zapisz(klucz, lambda path: _zapisz_bajty(path, dane))
+
+def _odpowiedz_obrazem(klucz: str, dane: bytes, max_age: int, immutable: bool = False, mimetype: str = None):
+    """Bajty obrazu z ETagiem (klucz renderu) i nagłówkami Cache-Control"""
+    odpowiedz = Response(dane, mimetype=mimetype or obrazy.TYP_MIME)
+    odpowiedz.set_etag(klucz)
+    odpowiedz.cache_control.public = True
+    odpowiedz.cache_control.max_age = max_age
+    if immutable:
+        odpowiedz.cache_control.immutable = True
+    return odpowiedz.make_conditional(request)
+
+@app.route('/obraz/<klucz>')
+def obraz(klucz):
+    """Obraz o danym kluczu - adresowany treścią, więc cache'owalny bez końca"""
+    if not poprawny_klucz(klucz):
+        return jsonify({'status': 'error', 'message': 'Nieprawidłowy identyfikator obrazu'}), 400
+    if request.if_none_match.contains(klucz):
+        # Przeglądarka lub CDN ma już ten obraz - bez czytania bajtów
+        return _odpowiedz_obrazem(klucz, b'', IMAGE_IMMUTABLE_MAX_AGE, immutable=True)
+    dane = bajty_obrazu(klucz)
+    if dane is None:
+        return jsonify({'status': 'error', 'message': 'Obraz nie znaleziony'}), 404
+    return _odpowiedz_obrazem(klucz, dane, IMAGE_IMMUTABLE_MAX_AGE, immutable=True)
+
+@app.route('/api/obraz')
+def api_obraz():
+    """
+    Obraz dla parametrów data, zmienna, metoda zwracany bezpośrednio (bez
+    przekierowania). ETag to klucz renderu, więc zapytanie warunkowe po
+    zmianie danych dostaje nowy obraz, a bez zmian 304 bez renderowania.
+    """
+    data = request.args.get('data', '').strip()
+    zmienna = request.args.get('zmienna', 'pm25').strip()
+    metoda = request.args.get('metoda', 'mapa').strip()
+
+    if not data:
+        return jsonify({'status': 'error', 'message': 'Data pomiaru jest wymagana'}), 400
+    if zmienna not in MAPA_ZMIENNYCH:
+        return jsonify({'status': 'error', 'message': 'Nieprawidłowa zmienna'}), 400
+    if metoda not in RENDERERY:
+        return jsonify({'status': 'error', 'message': 'Nieprawidłowa metoda'}), 400
+
+    try:
+        klucz = klucz_obrazu(data, zmienna, metoda)
+        if request.if_none_match.contains(klucz):
+            return _odpowiedz_obrazem(klucz, b'', IMAGE_MAX_AGE)
+        klucz = renderuj_obraz(data, zmienna, metoda)
+        dane = bajty_obrazu(klucz) if klucz is not None else None
+        if dane is None:
+            return jsonify({'status': 'error', 'message': 'Brak danych dla wybranych parametrów'}), 404
+        return _odpowiedz_obrazem(klucz, dane, IMAGE_MAX_AGE)
+    except Exception as e:
+        app.logger.error(f"Błąd podczas generowania obrazu: {str(e)}")
+        return jsonify({'status': 'error', 'message': f'Błąd: {str(e)}'}), 500
+
+@app.route('/api/szeregi/wykres')
+def api_szeregi_wykres():
+    """Wykres szeregu czasowego (parametry jak /api/szeregi) z ETagiem zależnym od wersji danych"""
+    p, blad = _parametry_szeregu(request.args)
+    if blad is not None:
+        return jsonify({'status': 'error', 'message': blad}), 400
+    blad = _sprawdz_stacje(p['stacja'])
+    if blad is not None:
+        return jsonify({'status': 'error', 'message': blad}), 404
+
+    parametry = {k: p[k] for k in ('stacja', 'okres', 'okno', 'prog')}
+    parametry.update(obrazy.parametry_kodowania())
+    klucz = klucz_renderu(f"{p['od']}..{p['do']}", p['zmienna'], 'szereg', get_data_version(),
+                          parametry=parametry, rozszerzenie=obrazy.ROZSZERZENIE)
+    if request.if_none_match.contains(klucz):
+        return _odpowiedz_obrazem(klucz, b'', IMAGE_MAX_AGE)
+    dane = bajty_obrazu(klucz)
+    if dane is None:
+        import matplotlib.pyplot as plt
+
+        try:
+            with metrics.etapy('szereg'):
+                with _lock_pyplot:
+                    try:
+                        if not rysuj_szereg_czasowy(p):
+                            return jsonify({'status': 'error',
+                                            'message': 'Brak danych dla wybranych parametrów'}), 404
+                        dane = obrazy.koduj_figure(plt.gcf(), dpi=100, bbox_inches='tight', pad_inches=0.2)
+                        metrics.etap('savefig')
+                    finally:
+                        plt.close('all')
+                _zachowaj_obraz(render_cache, klucz, dane)
+        except Exception as e:
+            app.logger.error(f"Błąd podczas rysowania szeregu: {str(e)}")
+            return jsonify({'status': 'error', 'message': f'Błąd: {str(e)}'}), 500
+    return _odpowiedz_obrazem(klucz, dane, IMAGE_MAX_AGE)
+
+def klucz_kostki(zmienna: str, metoda: str, od: str, do: str):
+    """Klucz kostki interpolacji dla bieżącej wersji danych (nazwa pliku w CUBE_DIR)"""
+    return klucz_renderu(f"{od}..{do}", zmienna, f"kostka-{metoda}", get_data_version(),
+                         parametry={'siatka': CUBE_GRID_SIZE}, rozszerzenie='npy')
+
+def _przytnij_kostki(klucz: str):
+    """Ogranicz CUBE_DIR do CUBE_DIR_MAX_MB, zachowując kostkę o danym kluczu"""
+    kostka.przytnij(CUBE_DIR, CUBE_DIR_MAX_MB * 1024 * 1024, zachowaj=klucz)
+
+def kostka_interpolacji(zmienna: str, metoda: str, od: str, do: str):
+    """Kostka (data × lat × lon) zakresu dat - z dysku albo liczona raz; None, gdy brak danych"""
+    _, kolumna = MAPA_ZMIENNYCH[zmienna]
+    klucz = klucz_kostki(zmienna, metoda, od, do)
+    sciezka = os.path.join(CUBE_DIR, f"{klucz}.npy")
+    for proba in range(2):
+        # Trafienie odświeża pozycję kostki w LRU
+        gotowa = kostka.uzyj(sciezka)
+        metrics.cache('kostka', gotowa)
+        if not gotowa:
+            df = load_data_range(od, do, [kolumna])
+            if df is None or df.empty:
+                return None
+            with metrics.etapy(f"kostka_{metoda}"):
+                kostka.zbuduj(sciezka, df, kolumna, metoda, CUBE_GRID_SIZE)
+            _przytnij_kostki(klucz)
+        try:
+            return kostka.Kostka(sciezka)
+        except FileNotFoundError:
+            # Usunięta przez przycinanie w innym procesie - policz ponownie
+            if proba:
+                raise
+
+def animacja_kostki(zmienna: str, metoda: str, od: str, do: str, format_: str = 'gif', fps: int = 4):
+    """Bajty animacji kostki zapisywane obok niej - tworzone raz; None, gdy brak danych"""
+    k = kostka_interpolacji(zmienna, metoda, od, do)
+    if k is None:
+        return None
+    sciezka = f"{os.path.splitext(k.sciezka)[0]}-{fps}.{format_}"
+    try:
+        with open(sciezka, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    with metrics.etapy(f"animacja_{format_}"):
+        dane = kostka.animacja(k, format_, fps, tytul=f"{zmienna.upper()} ({metoda.upper()})",
+                               podklad=dodaj_basemape)
+    kostka.zapisz_atomowo(sciezka, lambda f: f.write(dane))
+    _przytnij_kostki(os.path.basename(os.path.splitext(k.sciezka)[0]))
+    return dane
+
+def _parametry_kostki(args):
+    """(zmienna, metoda, od, do) zapytania o kostkę albo (None, komunikat błędu)"""
+    zmienna = args.get('zmienna', 'pm25').strip()
+    metoda = args.get('metoda', 'idw').strip()
+    od, do = args.get('od', '').strip(), args.get('do', '').strip()
+    if zmienna not in MAPA_ZMIENNYCH:
+        return None, 'Nieprawidłowa zmienna'
+    if metoda not in kostka.METODY:
+        return None, f'Nieprawidłowa metoda (dostępne: {", ".join(kostka.METODY)})'
+    try:
+        if date.fromisoformat(od) > date.fromisoformat(do):
+            return None, 'Data od nie może być późniejsza niż do'
+    except ValueError:
+        return None, 'Parametry od i do (YYYY-MM-DD) są wymagane'
+    if sum(1 for d in get_available_dates() if od <= d[:10] <= do) > CUBE_MAX_DATES:
+        return None, f'Kostka przekracza limit {CUBE_MAX_DATES} dat - zawęź zakres'
+    return (zmienna, metoda, od, do), None
+
+@app.route('/api/kostka/piksel')
+def api_kostka_piksel():
+    """
+    Szereg czasowy punktu siatki najbliższego lat/lon z kostki interpolacji
+    zakresu od..do (liczonej przy pierwszym zapytaniu).
+    """
+    parametry, blad = _parametry_kostki(request.args)
+    try:
+        lat, lon = float(request.args['lat']), float(request.args['lon'])
+    except (KeyError, ValueError):
+        blad = blad or 'Parametry lat i lon są wymagane'
+    if blad is not None:
+        return jsonify({'status': 'error', 'message': blad}), 400
+
+    try:
+        k = kostka_interpolacji(*parametry)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    if k is None:
+        return jsonify({'status': 'error', 'message': 'Brak danych dla wybranych parametrów'}), 404
+    piksel = k.piksel(lon, lat)
+    if piksel is None:
+        return jsonify({'status': 'error', 'message': 'Punkt poza zasięgiem siatki'}), 400
+    wartosci = k.szereg(*piksel)
+    return jsonify({
+        'zmienna': parametry[0], 'metoda': parametry[1],
+        'lat': float(k.yi[piksel[0]]), 'lon': float(k.xi[piksel[1]]),
+        'dane': [{'data': data, 'wartosc': None if np.isnan(w) else float(w)}
+                 for data, w in zip(k.daty, wartosci)],
+    })
+
+@app.route('/api/kostka/animacja')
+def api_kostka_animacja():
+    """Animacja (format gif albo mp4, fps) kostki interpolacji zakresu od..do"""
+    parametry, blad = _parametry_kostki(request.args)
+    format_ = request.args.get('format', 'gif')
+    fps = request.args.get('fps', 4, type=int)
+    if blad is None and format_ not in kostka.FORMATY_ANIMACJI:
+        blad = f'Nieprawidłowy format (dostępne: {", ".join(kostka.FORMATY_ANIMACJI)})'
+    if blad is None and not 1 <= fps <= 30:
+        blad = 'fps musi być z zakresu 1-30'
+    if blad is not None:
+        return jsonify({'status': 'error', 'message': blad}), 400
+
+    etag = f"{klucz_kostki(*parametry)}-{fps}-{format_}"
+    if request.if_none_match.contains(etag):
+        return _odpowiedz_obrazem(etag, b'', IMAGE_MAX_AGE, mimetype=kostka.FORMATY_ANIMACJI[format_])
+    try:
+        dane = animacja_kostki(*parametry, format_, fps)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Błąd podczas tworzenia animacji: {str(e)}")
+        return jsonify({'status': 'error', 'message': f'Błąd: {str(e)}'}), 500
+    if dane is None:
+        return jsonify({'status': 'error', 'message': 'Brak danych dla wybranych parametrów'}), 404
+    return _odpowiedz_obrazem(etag, dane, IMAGE_MAX_AGE, mimetype=kostka.FORMATY_ANIMACJI[format_])
+
 @app.route('/generuj', methods=['POST'])
 def generuj():
     """Generuj wizualizację na podstawie wybranych parametrów"""
@@ -432,33 +1207,15 @@ def generuj():
     if zmienna not in MAPA_ZMIENNYCH:
         return jsonify({'status': 'error', 'message': 'Nieprawidłowa zmienna'}), 400
 
-    if metoda not in ['mapa', 'idw', 'kriging', 'wykres']:
+    if metoda not in RENDERERY:
         return jsonify({'status': 'error', 'message': 'Nieprawidłowa metoda'}), 400
 
     try:
-        output_path = os.path.join(PLOT_DIR, "wykres.png")
-
-        import matplotlib
-        matplotlib.use('Agg')
-        import matplotlib.pyplot as plt
-
-        if metoda == "mapa":
-            success = rysuj_mape_dla_daty(data, zmienna)
-        elif metoda == "idw":
-            success = rysuj_mape_idw(data, zmienna)
-        elif metoda == "kriging":
-            success = rysuj_mape_kriging(data, zmienna)
-        elif metoda == "wykres":
-            success = rysuj_wykresy_dla_daty(data, zmienna)
-
-        if not success:
-            plt.close('all')
+        klucz = renderuj_obraz(data, zmienna, metoda)
+        if klucz is None:
             return jsonify({'status': 'error', 'message': 'Brak danych dla wybranych parametrów'}), 404
 
-        plt.savefig(output_path, dpi=100, bbox_inches='tight', pad_inches=0.2)
-        plt.close('all')
-
-        return redirect(url_for('wynik', data=data, zmienna=zmienna, metoda=metoda))
+        return redirect(url_for('wynik', data=data, zmienna=zmienna, metoda=metoda, obraz=klucz))
 
     except Exception as e:
         app.logger.error(f"Błąd podczas generowania wykresu: {str(e)}")
@@ -470,432 +1227,422 @@ def wynik():
     data = request.args.get('data', '')
     zmienna = request.args.get('zmienna', 'pm25')
     metoda = request.args.get('metoda', 'mapa')
-    
+    klucz = request.args.get('obraz', '')
+
+    if not poprawny_klucz(klucz):
+        return jsonify({'status': 'error', 'message': 'Nieprawidłowy identyfikator obrazu'}), 400
+
     return render_template(
         'wynik.html',
-        obraz=url_for('static', filename='exports/wykres.png'),
+        obraz=_url_obrazu(klucz),
+        klucz=klucz,
+        rozszerzenie=obrazy.ROZSZERZENIE,
         data=data,
         zmienna=zmienna,
         metoda=metoda
     )
 
-@app.route('/eksportuj', methods=['POST'])
+@app.route('/eksportuj', methods=['GET', 'POST'])
 def eksportuj():
-    """Eksportuj dane do CSV"""
-    zmienna = request.form.get('zmienna', 'pm25')
-    
+    """
+    Strumieniowy eksport danych.
+    Parametry: zmienna (wiele, domyślnie wszystkie), od, do, stacja (wiele),
+    format (csv, csv.gz, parquet).
+    """
+    zmienne = request.values.getlist('zmienna')
+    od = request.values.get('od') or None
+    do = request.values.get('do') or None
+    stacje = request.values.getlist('stacja')
+    format_ = request.values.get('format', 'csv')
+
+    if format_ not in eksport.FORMATY:
+        return jsonify({'status': 'error', 'message': f'Nieznany format: {format_}'}), 400
+    nieznane = [z for z in zmienne if z not in MAPA_ZMIENNYCH]
+    if nieznane:
+        return jsonify({'status': 'error', 'message': f'Nieznane zmienne: {", ".join(nieznane)}'}), 400
     try:
-        df = load_data()
-        if df is None:
-            return jsonify({'status': 'error', 'message': 'Brak danych'}), 500
-        
-        # Utwórz nazwę pliku
-        filename = f"{zmienna}_export_{date.today()}.csv"
-        filepath = os.path.join(PLOT_DIR, filename)
-        
-        df.to_csv(filepath, index=False)
-        
-        return jsonify({
-            'status': 'success',
-            'message': f'Dane zostały zapisane jako {filename}',
-            'filename': filename,
-            'download_url': url_for('static', filename=f'exports/{filename}')
-        })
+        for d in (od, do):
+            if d is not None:
+                date.fromisoformat(d)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Daty muszą mieć format YYYY-MM-DD'}), 400
+    if format_ == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return jsonify({'status': 'error', 'message': 'Eksport Parquet wymaga pakietu pyarrow'}), 400
+
+    kolumny = [MAPA_ZMIENNYCH[z][1] for z in dict.fromkeys(zmienne)] or None
+    try:
+        porcje = porcje_danych(od, do, kolumny, stacje)
+    except FileNotFoundError:
+        return jsonify({'status': 'error', 'message': 'Brak danych'}), 500
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+    if format_ == 'parquet':
+        strumien = eksport.strumien_parquet(porcje)
+    else:
+        strumien = eksport.strumien_csv(porcje, kompresja=(format_ == 'csv.gz'))
+
+    rozszerzenie, typ = eksport.FORMATY[format_]
+    nazwa = '_'.join(dict.fromkeys(zmienne)) or 'dane'
+    filename = f"{nazwa}_export_{od or 'poczatek'}_{do or date.today()}.{rozszerzenie}"
+    return Response(stream_with_context(strumien), mimetype=typ,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@metrics.sledz('pdf')
+def zbuduj_raport_pdf(data_pomiaru: str, zmienna: str, metoda: str, klucz: str):
+    """
+    Zbuduj w pamięci raport PDF dla daty i obrazu o danym kluczu.
+    Zwraca bajty PDF albo None, gdy brak danych.
+    """
+    import raporty
+
+    # Statystyki z tabeli policzonej raz dla wersji danych - bez surowych wierszy
+    _, kolumna = MAPA_ZMIENNYCH[zmienna]
+    staty = statystyki_dla_daty(data_pomiaru, kolumna)
+    metrics.etap('statystyki')
+    if staty is None:
+        return None
+
+    # Te same bajty, które dostała przeglądarka - zwykle z pamięci procesu
+    dane_obrazu = bajty_obrazu(klucz)
+    metrics.etap('dane')
+    return raporty.zbuduj(data_pomiaru, zmienna, metoda, staty, klucz, dane_obrazu)
+
+def nazwa_raportu(data_pomiaru: str, zmienna: str, klucz: str):
+    return f"raport_{zmienna}_{data_pomiaru}_{klucz}.pdf"
+
+def zapisz_raport_pdf(data_pomiaru: str, zmienna: str, metoda: str, klucz: str):
+    """
+    Raport PDF zapisany w RENDER_CACHE_DIR (wynik zadania w tle, dostępny
+    dla wszystkich workerów). Zwraca nazwę pliku albo None, gdy brak danych.
+    """
+    pdf = zbuduj_raport_pdf(data_pomiaru, zmienna, metoda, klucz)
+    if pdf is None:
+        return None
+    nazwa = nazwa_raportu(data_pomiaru, zmienna, klucz)
+    # Zapis atomowy - odpytujący o stan nie zobaczą niepełnego pliku
+    fd, tymczasowy = tempfile.mkstemp(dir=RENDER_CACHE_DIR, prefix=PREFIKS_TYMCZASOWY, suffix='.pdf')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(pdf)
+    os.replace(tymczasowy, os.path.join(RENDER_CACHE_DIR, nazwa))
+    render_cache.przytnij()
+    return nazwa
+
 @app.route('/generuj_pdf', methods=['POST'])
 def generuj_pdf():
-    """Generuj raport PDF z wizualizacją"""
+    """Generuj raport PDF z wizualizacją i odeślij go bezpośrednio"""
     try:
         data = request.json
         data_pomiaru = data.get('data')
         zmienna = data.get('zmienna')
         metoda = data.get('metoda')
+        klucz = data.get('obraz', '')
         
-        if not all([data_pomiaru, zmienna, metoda]):
+        if not all([data_pomiaru, zmienna, metoda]) or not poprawny_klucz(klucz):
             return jsonify({'status': 'error', 'message': 'Brakuje wymaganych parametrów'}), 400
+        if zmienna not in MAPA_ZMIENNYCH:
+            return jsonify({'status': 'error', 'message': 'Nieprawidłowa zmienna'}), 400
         
-        # Wczytaj dane
-        df = load_data()
-        if df is None:
-            return jsonify({'status': 'error', 'message': 'Nie udało się wczytać danych'}), 500
-        
-        df_filtered = df[df['data'] == data_pomiaru].copy()
-        if df_filtered.empty:
+        pdf = zbuduj_raport_pdf(data_pomiaru, zmienna, metoda, klucz)
+        if pdf is None:
             return jsonify({'status': 'error', 'message': 'Brak danych dla wybranej daty'}), 404
         
-        # Przygotuj dane do raportu
-        _, kolumna = MAPA_ZMIENNYCH[zmienna]
-        
-        stats_html = ""
-        if kolumna in df_filtered.columns:
-            # Oblicz metryki statystyczne
-            values = df_filtered[kolumna]
-            min_val = values.min()
-            max_val = values.max()
-            mean_val = values.mean()
-            median_val = values.median()
-            std_val = values.std()
-            q1_val = values.quantile(0.25)
-            q3_val = values.quantile(0.75)
-            iqr_val = q3_val - q1_val
-            var_val = values.var()
-            cv_val = (std_val / mean_val * 100) if mean_val != 0 else 0
-            
-            stats_html = f"""
-            <h2>Statystyki Danych</h2>
-            <table style="width: 100%; border-collapse: collapse; margin: 20px 0;">
-                <tr style="background-color: #f0f9ff;">
-                    <td colspan="2" style="border: 1px solid #e5e7eb; padding: 10px; font-weight: bold; text-align: center; background-color: #3b82f6; color: white;">Miary Tendencji Centralnej</td>
-                </tr>
-                <tr style="background-color: #f3f4f6;">
-                    <td style="border: 1px solid #e5e7eb; padding: 10px; font-weight: bold; width: 50%;">Średnia (Mean):</td>
-                    <td style="border: 1px solid #e5e7eb; padding: 10px;">{mean_val:.4f}</td>
-                </tr>
-                <tr>
-                    <td style="border: 1px solid #e5e7eb; padding: 10px; font-weight: bold;">Mediana (Median):</td>
-                    <td style="border: 1px solid #e5e7eb; padding: 10px;">{median_val:.4f}</td>
-                </tr>
-                
-                <tr style="background-color: #f0f9ff;">
-                    <td colspan="2" style="border: 1px solid #e5e7eb; padding: 10px; font-weight: bold; text-align: center; background-color: #3b82f6; color: white;">Miary Rozproszenia</td>
-                </tr>
-                <tr style="background-color: #f3f4f6;">
-                    <td style="border: 1px solid #e5e7eb; padding: 10px; font-weight: bold;">Minimalna wartość (Min):</td>
-                    <td style="border: 1px solid #e5e7eb; padding: 10px;">{min_val:.4f}</td>
-                </tr>
-                <tr>
-                    <td style="border: 1px solid #e5e7eb; padding: 10px; font-weight: bold;">Maksymalna wartość (Max):</td>
-                    <td style="border: 1px solid #e5e7eb; padding: 10px;">{max_val:.4f}</td>
-                </tr>
-                <tr style="background-color: #f3f4f6;">
-                    <td style="border: 1px solid #e5e7eb; padding: 10px; font-weight: bold;">Zakres (Range):</td>
-                    <td style="border: 1px solid #e5e7eb; padding: 10px;">{max_val - min_val:.4f}</td>
-                </tr>
-                <tr>
-                    <td style="border: 1px solid #e5e7eb; padding: 10px; font-weight: bold;">Odchylenie Standardowe (Std Dev):</td>
-                    <td style="border: 1px solid #e5e7eb; padding: 10px;">{std_val:.4f}</td>
-                </tr>
-                <tr style="background-color: #f3f4f6;">
-                    <td style="border: 1px solid #e5e7eb; padding: 10px; font-weight: bold;">Wariancja (Variance):</td>
-                    <td style="border: 1px solid #e5e7eb; padding: 10px;">{var_val:.4f}</td>
-                </tr>
-                <tr>
-                    <td style="border: 1px solid #e5e7eb; padding: 10px; font-weight: bold;">Współczynnik Zmienności (CV %):</td>
-                    <td style="border: 1px solid #e5e7eb; padding: 10px;">{cv_val:.2f}%</td>
-                </tr>
-                
-                <tr style="background-color: #f0f9ff;">
-                    <td colspan="2" style="border: 1px solid #e5e7eb; padding: 10px; font-weight: bold; text-align: center; background-color: #3b82f6; color: white;">Kwartyle i Percentyle</td>
-                </tr>
-                <tr style="background-color: #f3f4f6;">
-                    <td style="border: 1px solid #e5e7eb; padding: 10px; font-weight: bold;">Q1 (25. percentyl):</td>
-                    <td style="border: 1px solid #e5e7eb; padding: 10px;">{q1_val:.4f}</td>
-                </tr>
-                <tr>
-                    <td style="border: 1px solid #e5e7eb; padding: 10px; font-weight: bold;">Q3 (75. percentyl):</td>
-                    <td style="border: 1px solid #e5e7eb; padding: 10px;">{q3_val:.4f}</td>
-                </tr>
-                <tr style="background-color: #f3f4f6;">
-                    <td style="border: 1px solid #e5e7eb; padding: 10px; font-weight: bold;">IQR (Rozstęp międzykwartylowy):</td>
-                    <td style="border: 1px solid #e5e7eb; padding: 10px;">{iqr_val:.4f}</td>
-                </tr>
-                
-                <tr style="background-color: #f0f9ff;">
-                    <td colspan="2" style="border: 1px solid #e5e7eb; padding: 10px; font-weight: bold; text-align: center; background-color: #3b82f6; color: white;">Liczebność Próby</td>
-                </tr>
-                <tr style="background-color: #f3f4f6;">
-                    <td style="border: 1px solid #e5e7eb; padding: 10px; font-weight: bold;">Liczba obserwacji (N):</td>
-                    <td style="border: 1px solid #e5e7eb; padding: 10px;">{len(df_filtered)}</td>
-                </tr>
-            </table>
-            """
-        
-        # Przygotuj obrazek
-        viz_image_path = os.path.join(PLOT_DIR, "wykres.png")
-        img_html = ""
-        if os.path.exists(viz_image_path):
-            img_html = f'<img src="{os.path.abspath(viz_image_path)}" style="width: 100%; max-width: 600px; margin: 20px 0;">'
-        
-        # Utwórz HTML
-        html_content = f"""<!DOCTYPE html>
-<html lang="pl">
-<head>
-    <meta charset="UTF-8">
-    <meta http-equiv="Content-Type" content="text/html; charset=UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <style>
-                body {{
-                    font-family: Arial, sans-serif;
-                    color: #1f2937;
-                    line-height: 1.6;
-                    margin: 20px;
-                }}
-                h1 {{
-                    color: #1f2937;
-                    text-align: center;
-                    font-size: 24px;
-                    margin-bottom: 30px;
-                }}
-                h2 {{
-                    color: #374151;
-                    font-size: 14px;
-                    margin-top: 20px;
-                    margin-bottom: 12px;
-                }}
-                .metadata {{
-                    background-color: #f3f4f6;
-                    border: 1px solid #d1d5db;
-                    border-radius: 4px;
-                    padding: 15px;
-                    margin-bottom: 20px;
-                }}
-                .metadata-row {{
-                    display: flex;
-                    margin: 8px 0;
-                }}
-                .metadata-label {{
-                    font-weight: bold;
-                    width: 150px;
-                }}
-                table {{
-                    width: 100%;
-                }}
-            </style>
-        </head>
-        <body>
-            <h1>silesiaAIR - Raport Wizualizacji Danych</h1>
-            
-            <div class="metadata">
-                <div class="metadata-row">
-                    <span class="metadata-label">Data:</span>
-                    <span>{data_pomiaru}</span>
-                </div>
-                <div class="metadata-row">
-                    <span class="metadata-label">Zmienna:</span>
-                    <span>{zmienna.upper()}</span>
-                </div>
-                <div class="metadata-row">
-                    <span class="metadata-label">Metoda:</span>
-                    <span>{metoda.upper()}</span>
-                </div>
-                <div class="metadata-row">
-                    <span class="metadata-label">Data raportu:</span>
-                    <span>{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</span>
-                </div>
-            </div>
-            
-            {stats_html}
-            
-            <h2>Wizualizacja</h2>
-            {img_html}
-            
-            <footer style="margin-top: 40px; padding-top: 20px; border-top: 1px solid #d1d5db; color: #6b7280; font-size: 12px; text-align: center;">
-                &copy; 2025 silesiaAIR. Wizualizacja Danych Geoprzestrzennych dla GZM.
-            </footer>
-        </body>
-        </html>
-        """
-        
-        # Zapisz HTML tymczasowo
-        html_filename = f"raport_{zmienna}_{data_pomiaru}.html"
-        html_path = os.path.join(PLOT_DIR, html_filename)
-        
-        with open(html_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        
-        # Konwertuj do PDF
-        pdf_filename = f"raport_{zmienna}_{data_pomiaru}.pdf"
-        pdf_path = os.path.join(PLOT_DIR, pdf_filename)
-        
-        try:
-            import pdfkit
-            pdfkit.from_file(html_path, pdf_path, options={
-                'encoding': 'UTF-8',
-                'quiet': '',
-                'enable-local-file-access': None,
-                'margin-top': '0.5in',
-                'margin-bottom': '0.5in',
-                'margin-left': '0.5in',
-                'margin-right': '0.5in'
-            })
-        except Exception as e:
-            app.logger.warning(f"pdfkit nie zadziałał ({e}), próbuję alternatywną metodę")
-            # Fallback - użyj reportlab z prostszym podejściem
-            from reportlab.lib.pagesizes import A4
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.lib.units import inch
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak
-            from reportlab.lib import colors
-            from reportlab.lib.enums import TA_CENTER, TA_LEFT
-            
-            doc = SimpleDocTemplate(pdf_path, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-            story = []
-            styles = getSampleStyleSheet()
-            
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=24,
-                textColor=colors.HexColor('#1f2937'),
-                spaceAfter=30,
-                alignment=TA_CENTER,
-                fontName='Helvetica-Bold'
-            )
-            
-            heading_style = ParagraphStyle(
-                'CustomHeading',
-                parent=styles['Heading2'],
-                fontSize=14,
-                textColor=colors.HexColor('#374151'),
-                spaceAfter=12,
-                fontName='Helvetica-Bold'
-            )
-            
-            story.append(Paragraph("silesiaAIR - Raport Wizualizacji Danych", title_style))
-            story.append(Spacer(1, 0.2*inch))
-            
-            # Metadane
-            metadata_data = [
-                ['Data:', data_pomiaru],
-                ['Zmienna:', zmienna.upper()],
-                ['Metoda:', metoda.upper()],
-                ['Data raportu:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')]
-            ]
-            metadata_table = Table(metadata_data, colWidths=[2*inch, 4*inch])
-            metadata_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#e5e7eb')),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#1f2937')),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                ('TOPPADDING', (0, 0), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#d1d5db'))
-            ]))
-            story.append(metadata_table)
-            story.append(Spacer(1, 0.3*inch))
-            
-            # Statystyki danych
-            if kolumna in df_filtered.columns:
-                values = df_filtered[kolumna]
-                min_val = values.min()
-                max_val = values.max()
-                mean_val = values.mean()
-                median_val = values.median()
-                std_val = values.std()
-                q1_val = values.quantile(0.25)
-                q3_val = values.quantile(0.75)
-                iqr_val = q3_val - q1_val
-                var_val = values.var()
-                cv_val = (std_val / mean_val * 100) if mean_val != 0 else 0
-                
-                story.append(Paragraph("Miary Tendencji Centralnej", heading_style))
-                stats_data_1 = [
-                    ['Średnia (Mean):', f"{mean_val:.4f}"],
-                    ['Mediana (Median):', f"{median_val:.4f}"]
-                ]
-                stats_table_1 = Table(stats_data_1, colWidths=[2.5*inch, 3.5*inch])
-                stats_table_1.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f3f4f6')),
-                    ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#1f2937')),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                    ('TOPPADDING', (0, 0), (-1, -1), 8),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb'))
-                ]))
-                story.append(stats_table_1)
-                story.append(Spacer(1, 0.2*inch))
-                
-                story.append(Paragraph("Miary Rozproszenia", heading_style))
-                stats_data_2 = [
-                    ['Minimalna wartość (Min):', f"{min_val:.4f}"],
-                    ['Maksymalna wartość (Max):', f"{max_val:.4f}"],
-                    ['Zakres (Range):', f"{max_val - min_val:.4f}"],
-                    ['Odchylenie Standardowe (Std Dev):', f"{std_val:.4f}"],
-                    ['Wariancja (Variance):', f"{var_val:.4f}"],
-                    ['Współczynnik Zmienności (CV %):', f"{cv_val:.2f}%"]
-                ]
-                stats_table_2 = Table(stats_data_2, colWidths=[2.5*inch, 3.5*inch])
-                stats_table_2.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f3f4f6')),
-                    ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#1f2937')),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                    ('TOPPADDING', (0, 0), (-1, -1), 8),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb'))
-                ]))
-                story.append(stats_table_2)
-                story.append(Spacer(1, 0.2*inch))
-                
-                story.append(Paragraph("Kwartyle i Percentyle", heading_style))
-                stats_data_3 = [
-                    ['Q1 (25. percentyl):', f"{q1_val:.4f}"],
-                    ['Q3 (75. percentyl):', f"{q3_val:.4f}"],
-                    ['IQR (Rozstęp międzykwartylowy):', f"{iqr_val:.4f}"],
-                    ['Liczba obserwacji (N):', str(len(df_filtered))]
-                ]
-                stats_table_3 = Table(stats_data_3, colWidths=[2.5*inch, 3.5*inch])
-                stats_table_3.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f3f4f6')),
-                    ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#1f2937')),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                    ('TOPPADDING', (0, 0), (-1, -1), 8),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb'))
-                ]))
-                story.append(stats_table_3)
-                story.append(Spacer(1, 0.2*inch))
-            story.append(Paragraph(f"Metoda: {metoda}", heading_style))
-            story.append(Spacer(1, 0.3*inch))
-            
-            if os.path.exists(viz_image_path):
-                story.append(PageBreak())
-                story.append(Paragraph("Wizualizacja", heading_style))
-                story.append(Spacer(1, 0.2*inch))
-                img = Image(viz_image_path, width=6.5*inch, height=4.875*inch)
-                story.append(img)
-            
-            doc.build(story)
-        
-        # Usuń plik HTML
-        try:
-            os.remove(html_path)
-        except:
-            pass
-        
-        return jsonify({
-            'status': 'success',
-            'message': f'Raport PDF został wygenerowany',
-            'filename': pdf_filename,
-            'download_url': url_for('pobierz_pdf', filename=pdf_filename)
-        })
+        filename = nazwa_raportu(data_pomiaru, zmienna, klucz)
+        return Response(pdf, mimetype='application/pdf',
+                        headers={'Content-Disposition': f'attachment; filename="{filename}"'})
     
     except Exception as e:
         app.logger.error(f"Błąd podczas generowania PDF: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def _wynik_istnieje(typ: str, wynik: str):
+    """Czy wynik zadania (klucz obrazu albo nazwa raportu PDF) jest nadal dostępny"""
+    if typ == 'render':
+        return pamiec_obrazow.pobierz(wynik) is not None or znajdz_obraz(wynik) is not None
+    return os.path.isfile(os.path.join(RENDER_CACHE_DIR, wynik))
+
+def nazwa_raportu_zbiorczego(od: str, do: str, klucz: str):
+    return f"raport_{od}_{do}_{klucz}.pdf"
+
+def zapisz_raport_zbiorczy(od: str, do: str, zmienne: list, metody: list, klucz: str):
+    """
+    Raport zbiorczy zapisany w RENDER_CACHE_DIR (wynik zadania w tle). Strony
+    są renderowane kolejno w procesie zadania, który zajmuje jedno miejsce w
+    puli. Zwraca nazwę pliku albo None, gdy w zakresie brak danych.
+    """
+    import raport_zbiorczy
+
+    id_zadania = f"zbiorczy-{klucz}"
+
+    def zlec(zadanie):
+        def obraz():
+            kolejka_zadan.odswiez_znacznik(id_zadania)
+            return raport_zbiorczy.obraz_strony(renderuj_obraz(*zadanie))
+        return obraz
+
+    nazwa = nazwa_raportu_zbiorczego(od, do, klucz)
+    # Zapis atomowy - odpytujący o stan nie zobaczą niepełnego pliku
+    fd, tymczasowy = tempfile.mkstemp(dir=RENDER_CACHE_DIR, prefix=PREFIKS_TYMCZASOWY, suffix='.pdf')
+    os.close(fd)
+    try:
+        strony = raport_zbiorczy.zbuduj_raport(tymczasowy, od, do, zmienne, metody, zlec, okno=1)
+        if strony is None:
+            os.remove(tymczasowy)
+            return None
+        os.replace(tymczasowy, os.path.join(RENDER_CACHE_DIR, nazwa))
+    except Exception:
+        try:
+            os.remove(tymczasowy)
+        except OSError:
+            pass
+        raise
+    render_cache.przytnij()
+    return nazwa
+
+@app.route('/generuj_raport', methods=['POST'])
+def generuj_raport():
+    """
+    Zgłoś zbiorczy raport PDF dla zakresu dat jako zadanie w tle.
+    Parametry: od, do, zmienna (wiele, domyślnie pm25), metoda (wiele, domyślnie idw).
+    """
+    params = request.get_json(silent=True)
+    if params is None:
+        params = request.form
+        lista = params.getlist
+    else:
+        def lista(nazwa):
+            wartosc = params.get(nazwa)
+            return wartosc if isinstance(wartosc, list) else ([wartosc] if wartosc else [])
+    od = (params.get('od') or '').strip()
+    do = (params.get('do') or '').strip()
+    zmienne = list(dict.fromkeys(lista('zmienna'))) or ['pm25']
+    metody = list(dict.fromkeys(lista('metoda'))) or ['idw']
+
+    try:
+        if date.fromisoformat(do) < date.fromisoformat(od):
+            return jsonify({'status': 'error', 'message': 'Data końcowa jest przed początkową'}), 400
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Daty od i do muszą mieć format YYYY-MM-DD'}), 400
+    nieznane = [z for z in zmienne if z not in MAPA_ZMIENNYCH]
+    if nieznane:
+        return jsonify({'status': 'error', 'message': f'Nieznane zmienne: {", ".join(nieznane)}'}), 400
+    nieznane = [m for m in metody if m not in RENDERERY]
+    if nieznane:
+        return jsonify({'status': 'error', 'message': f'Nieznane metody: {", ".join(nieznane)}'}), 400
+    dni = sum(1 for d in get_available_dates() if od <= d[:10] <= do)
+    if dni == 0:
+        return jsonify({'status': 'error', 'message': 'Brak danych w wybranym zakresie dat'}), 404
+    if dni * len(zmienne) * len(metody) > BATCH_REPORT_MAX_PAGES:
+        return jsonify({'status': 'error', 'message':
+                        f'Raport przekracza limit {BATCH_REPORT_MAX_PAGES} stron - zawęź zakres'}), 400
+
+    # Raport do kilkuset stron nie zmieściłby się w czasie żądania - zadanie w tle
+    klucz = klucz_renderu(f"{od}..{do}", zmienne, 'zbiorczy', get_data_version(),
+                          parametry={'metody': metody}, rozszerzenie='pdf')
+    id_zadania = f"zbiorczy-{klucz}"
+    try:
+        if not os.path.isfile(os.path.join(RENDER_CACHE_DIR, nazwa_raportu_zbiorczego(od, do, klucz))):
+            kolejka_zadan.zglos(id_zadania, _wykonaj_raport_zbiorczy, od, do, zmienne, metody, klucz,
+                                istnieje=partial(_wynik_istnieje, 'zbiorczy'))
+    except KolejkaPelnaError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+
+    return jsonify({
+        'status': 'success',
+        'id': id_zadania,
+        'status_url': url_for('api_job_status', id_zadania=id_zadania)
+    }), 202
+
+@app.route('/api/jobs', methods=['POST'])
+def api_jobs_submit():
+    """Zgłoś render ('render'), raport PDF ('pdf') lub raport zbiorczy ('zbiorczy') w tle"""
+    params = request.get_json(silent=True) or request.form
+    typ = params.get('typ', 'render')
+    if typ == 'zbiorczy':
+        # Zakres dat i wiele zmiennych/metod - parametry jak w /generuj_raport
+        return generuj_raport()
+    data = (params.get('data') or '').strip()
+    zmienna = (params.get('zmienna') or 'pm25').strip()
+    metoda = (params.get('metoda') or 'mapa').strip()
+
+    if not data:
+        return jsonify({'status': 'error', 'message': 'Data pomiaru jest wymagana'}), 400
+    if zmienna not in MAPA_ZMIENNYCH:
+        return jsonify({'status': 'error', 'message': 'Nieprawidłowa zmienna'}), 400
+    if metoda not in RENDERERY:
+        return jsonify({'status': 'error', 'message': 'Nieprawidłowa metoda'}), 400
+
+    try:
+        if typ == 'render':
+            klucz = klucz_obrazu(data, zmienna, metoda)
+            id_zadania = f"render-{klucz}"
+            if znajdz_obraz(klucz) is None:
+                # Chybienie policzy renderuj_obraz w procesie roboczym
+                kolejka_zadan.zglos(id_zadania, _wykonaj_render, data, zmienna, metoda,
+                                    istnieje=partial(_wynik_istnieje, 'render'))
+            else:
+                metrics.cache('render', True)
+        elif typ == 'pdf':
+            klucz = params.get('obraz', '')
+            if not poprawny_klucz(klucz):
+                return jsonify({'status': 'error', 'message': 'Nieprawidłowy identyfikator obrazu'}), 400
+            id_zadania = f"pdf-{klucz}"
+            kolejka_zadan.zglos(id_zadania, _wykonaj_raport, data, zmienna, metoda, klucz,
+                                istnieje=partial(_wynik_istnieje, 'pdf'))
+        else:
+            return jsonify({'status': 'error', 'message': 'Nieprawidłowy typ zadania'}), 400
+    except KolejkaPelnaError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+
+    return jsonify({
+        'status': 'success',
+        'id': id_zadania,
+        'status_url': url_for('api_job_status', id_zadania=id_zadania)
+    }), 202
+
+@app.route('/api/jobs/<id_zadania>')
+def api_job_status(id_zadania):
+    """Stan zadania i adres wyniku po jego zakończeniu"""
+    typ, _, klucz = id_zadania.partition('-')
+    if typ not in ('render', 'pdf', 'zbiorczy') or not poprawny_klucz(klucz):
+        return jsonify({'status': 'error', 'message': 'Nieprawidłowy identyfikator zadania'}), 400
+
+    stan, wynik, blad = kolejka_zadan.status(id_zadania)
+    if stan == 'gotowe' and wynik is not None and not _wynik_istnieje(typ, wynik):
+        # Wynik usunięty przez LRU albo sprzątanie - nie odsyłamy martwego adresu
+        kolejka_zadan.zapomnij(id_zadania)
+        stan, wynik, blad = None, None, None
+
+    if stan is None:
+        # Zadanie zgłoszone w innym procesie - wynik może już być na dysku
+        if typ == 'render' and znajdz_obraz(klucz) is not None:
+            stan, wynik = 'gotowe', klucz
+        elif typ in ('pdf', 'zbiorczy'):
+            pliki = glob.glob(os.path.join(RENDER_CACHE_DIR, f"raport_*_{klucz}.pdf"))
+            if pliki:
+                stan, wynik = 'gotowe', os.path.basename(pliki[0])
+        if stan is None:
+            # W toku albo zakończone bez wyniku - według znacznika na dysku
+            stan, blad = kolejka_zadan.znacznik(id_zadania)
+        if stan is None:
+            return jsonify({'status': 'error', 'message': 'Nieznane zadanie'}), 404
+
+    if stan == 'gotowe' and wynik is None:
+        stan, blad = 'blad', 'Brak danych dla wybranych parametrów'
+    if stan == 'blad':
+        return jsonify({'status': 'error', 'id': id_zadania, 'stan': stan, 'message': blad})
+
+    odpowiedz = {'status': 'success', 'id': id_zadania, 'stan': stan}
+    if stan == 'gotowe':
+        if typ == 'render':
+            odpowiedz['obraz'] = wynik
+            odpowiedz['result_url'] = _url_obrazu(wynik)
+        else:
+            odpowiedz['filename'] = wynik
+            odpowiedz['result_url'] = url_for('pobierz_pdf', filename=wynik)
+    return jsonify(odpowiedz)
+
 @app.route('/pobierz_pdf/<filename>')
 def pobierz_pdf(filename):
     """Pobierz plik PDF"""
     try:
-        filepath = os.path.join(PLOT_DIR, filename)
-        if not os.path.exists(filepath):
+        filepath = os.path.join(RENDER_CACHE_DIR, filename)
+        if not os.path.isfile(filepath):
             return jsonify({'status': 'error', 'message': 'Plik nie znaleziony'}), 404
-        
+        # Pobranie odświeża pozycję raportu w LRU katalogu cache
+        os.utime(filepath)
+
         return send_file(filepath, mimetype='application/pdf', as_attachment=True, download_name=filename)
     except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500@app.route('/health')
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.before_request
+def _start_pomiaru():
+    g.start_zadania = time.perf_counter()
+
+@app.after_request
+def _koniec_pomiaru(response):
+    """Histogram czasu obsługi żądań per trasa i metoda wizualizacji"""
+    start = g.pop('start_zadania', None)
+    if start is not None and metrics.WLACZONE:
+        trasa = request.url_rule.rule if request.url_rule is not None else 'nieznana'
+        params = request.get_json(silent=True) if request.is_json else request.values
+        metoda = params.get('metoda') if isinstance(params, (dict, MultiDict)) else None
+        # Tylko znane metody - etykiety o ograniczonej liczbie wartości
+        metrics.obserwuj('request_duration_seconds', time.perf_counter() - start,
+                         route=trasa, method=metoda if isinstance(metoda, str) and metoda in RENDERERY else '')
+    return response
+
+# Ciężkie biblioteki kolejnych podsystemów - importowane leniwie przez trasy,
+# a w gunicornie z preload_app ładowane raz w procesie nadrzędnym (rozgrzej)
+MODULY_PODSYSTEMOW = {
+    'mapy': ['matplotlib.pyplot', 'geopandas', 'shapely.geometry', 'contextily'],
+    'interpolacja': ['scipy.spatial', 'scipy.interpolate', 'pykrige.ok'],
+    'wykresy': ['seaborn'],
+    'raporty': ['raporty'],
+}
+
+def rozgrzej(podsystemy=None):
+    """
+    Zaimportuj biblioteki podsystemów, wczytaj dane i narysuj pusty wykres
+    (cache czcionek matplotlib). Wywoływane przed rozwidleniem workerów, aby
+    dzieliły te strony pamięci zamiast ładować je przy pierwszym żądaniu.
+    Zwraca czasy kolejnych kroków w sekundach.
+    """
+    import importlib
+
+    czasy = {}
+    for podsystem in podsystemy or MODULY_PODSYSTEMOW:
+        start = time.perf_counter()
+        for modul in MODULY_PODSYSTEMOW[podsystem]:
+            try:
+                importlib.import_module(modul)
+            except ImportError as e:
+                print(f"Rozgrzewka: pominięto {modul} ({e})")
+        czasy[podsystem] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    get_available_dates()
+    tabela_statystyk()
+    archiwum_szeregow()
+    czasy['dane'] = time.perf_counter() - start
+
+    if 'matplotlib.pyplot' in sys.modules:
+        import matplotlib.pyplot as plt
+        start = time.perf_counter()
+        with _lock_pyplot:
+            fig, ax = plt.subplots(figsize=(2, 2), dpi=50)
+            ax.set_title("rozgrzewka")
+            fig.savefig(io.BytesIO(), format='png')
+            plt.close(fig)
+        czasy['rysowanie'] = time.perf_counter() - start
+    return czasy
+
+def po_rozwidleniu():
+    """Odtwórz w procesie potomnym zasoby, które nie przeżywają fork()"""
+    # Wątki procesu nadrzędnego nie istnieją w potomku
+    render_cache.uruchom_sprzatanie(ARTIFACT_TTL_HOURS * 3600, JANITOR_INTERVAL)
+    # Metryki rodzica są w jego pliku - worker liczy od zera i zapisuje własne
+    metrics.po_rozwidleniu()
+    # Połączenia z puli procesu nadrzędnego nie mogą być współdzielone
+    engine = getattr(baza, 'engine', None)
+    if engine is not None:
+        engine.dispose(close=False)
+
+@app.route('/health')
 def health():
     """Health check endpoint"""
     return jsonify({'status': 'ok'})
 
+@app.route('/metrics')
+def metryki():
+    """Metryki w formacie tekstowym Prometheusa"""
+    if not metrics.WLACZONE:
+        return jsonify({'status': 'error', 'message': 'Metryki są wyłączone (METRICS_ENABLED=0)'}), 404
+    return Response(metrics.generuj_tekst(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 if __name__ == '__main__':
     app.run(debug=True)
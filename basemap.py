@@ -0,0 +1,128 @@
+"""
+Lokalny podkład mapowy dla GZM.
+
+Kafelki OSM są zapisywane na dysku (katalog cache contextily, z którego
+korzysta także ctx.add_basemap), a z nich budowany jest jednorazowo raster
+przeprojektowany do EPSG:4326 dla stałego zasięgu GZM. Renderery rysują ten
+raster bezpośrednio przez imshow - bez sieci.
+
+Wypełnienie magazynu (wymaga sieci, uruchamiane raz):
+    python basemap.py
+"""
+
+import argparse
+import os
+import threading
+
+import numpy as np
+
+from generate_data import CITIES
+
+DATA_DIR = "data"
+TILE_CACHE_DIR = os.path.join(DATA_DIR, "tiles")
+BASEMAP_FILE = os.path.join(DATA_DIR, "basemap_gzm.npz")
+BASEMAP_ZOOM = 11
+
+# Zasięg GZM (lon_min, lon_max, lat_min, lat_max) - stacje plus margines
+# większy niż bufor 0.1° używany przez renderery
+MARGINES = 0.15
+GZM_EXTENT = (
+    min(lon for _, _, lon in CITIES) - MARGINES,
+    max(lon for _, _, lon in CITIES) + MARGINES,
+    min(lat for _, lat, _ in CITIES) - MARGINES,
+    max(lat for _, lat, _ in CITIES) + MARGINES,
+)
+
+_raster = None
+_raster_lock = threading.Lock()
+
+
+def _zrodlo_kafelkow():
+    import contextily as ctx
+    return ctx.providers.OpenStreetMap.Mapnik
+
+
+def _wlacz_cache_kafelkow():
+    """Kafelki pobierane przez contextily trafiają do katalogu na dysku"""
+    import contextily as ctx
+    os.makedirs(TILE_CACHE_DIR, exist_ok=True)
+    ctx.set_cache_dir(TILE_CACHE_DIR)
+
+
+def zbuduj_basemape(sciezka=BASEMAP_FILE, extent=GZM_EXTENT, zoom=BASEMAP_ZOOM):
+    """Pobierz kafelki dla zasięgu GZM i zapisz raster w EPSG:4326"""
+    import contextily as ctx
+
+    _wlacz_cache_kafelkow()
+    lon_min, lon_max, lat_min, lat_max = extent
+
+    img, ext = ctx.bounds2img(lon_min, lat_min, lon_max, lat_max, zoom=zoom,
+                              source=_zrodlo_kafelkow(), ll=True)
+    img, ext = ctx.warp_tiles(img, ext, t_crs='EPSG:4326')
+    np.savez_compressed(sciezka, obraz=img, extent=np.asarray(ext, dtype=float))
+
+    global _raster
+    with _raster_lock:
+        _raster = None
+    return sciezka
+
+
+def wczytaj_basemape(sciezka=BASEMAP_FILE):
+    """(obraz, extent) z lokalnego rastra - wczytywane raz na proces"""
+    global _raster
+    if _raster is not None:
+        return _raster
+
+    with _raster_lock:
+        if _raster is None:
+            if not os.path.exists(sciezka):
+                return None
+            with np.load(sciezka) as plik:
+                _raster = (plik['obraz'], tuple(plik['extent']))
+        return _raster
+
+
+def dodaj_basemape(ax, alpha=0.4):
+    """
+    Dodaj podkład OSM do osi w EPSG:4326.
+
+    Używa lokalnego rastra, gdy pokrywa on zakres osi; w przeciwnym razie
+    pobiera kafelki przez contextily (z trwałym cache na dysku).
+    Zwraca False, gdy podkładu nie udało się dodać.
+    """
+    try:
+        raster = wczytaj_basemape()
+        x0, x1 = ax.get_xlim()
+        y0, y1 = ax.get_ylim()
+        if raster is not None:
+            img, (lon_min, lon_max, lat_min, lat_max) = raster
+            if lon_min <= x0 and x1 <= lon_max and lat_min <= y0 and y1 <= lat_max:
+                ax.imshow(img, extent=(lon_min, lon_max, lat_min, lat_max),
+                          alpha=alpha, interpolation='bilinear', zorder=0)
+                ax.set_xlim(x0, x1)
+                ax.set_ylim(y0, y1)
+                return True
+
+        import contextily as ctx
+        _wlacz_cache_kafelkow()
+        ctx.add_basemap(ax, source=_zrodlo_kafelkow(), zoom=BASEMAP_ZOOM, alpha=alpha, crs='EPSG:4326')
+        return True
+    except Exception as e:
+        print(f"Błąd basemapy: {e}")
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Zbuduj lokalny podkład mapowy GZM")
+    parser.add_argument('--output', default=BASEMAP_FILE, help="ścieżka pliku rastra (.npz)")
+    parser.add_argument('--zoom', type=int, default=BASEMAP_ZOOM, help="poziom przybliżenia kafelków")
+    args = parser.parse_args()
+
+    print(f"Pobieranie kafelków dla zasięgu GZM {GZM_EXTENT} (zoom {args.zoom})...")
+    sciezka = zbuduj_basemape(args.output, zoom=args.zoom)
+    print(f"✓ Podkład zapisany do: {sciezka}")
+    print(f"✓ Kafelki w: {TILE_CACHE_DIR}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+"""
+Powtarzalny benchmark ścieżek danych i renderowania.
+
+Zbiory danych o różnych rozmiarach są generowane (z ustalonym ziarnem)
+przez generate_data.py do katalogu tymczasowego, podkład mapowy jest
+wyłączony (benchmark działa offline), a raport PDF zawsze idzie ścieżką
+zapasową reportlab. Wyniki są zapisywane jako JSON i mogą być porównane z
+zapisanym wcześniej punktem odniesienia.
+
+Przykład:
+    python benchmark.py --zapisz bench_baseline.json
+    python benchmark.py --porownaj bench_baseline.json --prog 0.25
+    python benchmark.py --rozmiary male duze --siatki 100 300 --powtorzenia 3
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import date, datetime, timedelta
+
+# Rozmiar zbioru -> (liczba stacji, liczba dni)
+ROZMIARY = {
+    'male': (14, 31),
+    'srednie': (200, 365),
+    'duze': (1000, 1000),
+}
+DOMYSLNE_ROZMIARY = ['male', 'srednie']
+DOMYSLNE_SIATKI = [100, 150, 300]
+SEED = 2025
+DATA_STARTOWA = '2025-01-01'
+
+# Względny wzrost najkrótszego czasu uznawany za regresję
+PROG_REGRESJI = 0.25
+# Bezwzględny wzrost (ms) poniżej którego różnica jest szumem pomiaru
+PROG_BEZWZGLEDNY_MS = 2.0
+DOMYSLNE_POWTORZENIA = 5
+# Porównanie z punktem odniesienia potrzebuje więcej pomiarów
+POWTORZENIA_POROWNANIA = 15
+
+
+def zmierz(funkcja, powtorzenia, rozgrzewka=1, przygotuj=None, kalibruj=False):
+    """
+    Czasy wykonania funkcji w ms; przygotuj() przed każdym pomiarem nie jest
+    liczone. Odśmiecanie jest wyłączone na czas pomiaru (jak w timeit).
+    Z kalibruj=True po każdym pomiarze mierzona jest też kalibracja(), a
+    czasy względne (pomiar / kalibracja) nie zależą od chwilowej szybkości
+    maszyny.
+    """
+    def czas_ms(f):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            f()
+            return (time.perf_counter() - start) * 1000
+        finally:
+            gc.enable()
+
+    czasy, kalibracje = [], []
+    for i in range(rozgrzewka + powtorzenia):
+        if przygotuj is not None:
+            przygotuj()
+        czas = czas_ms(funkcja)
+        kalibracja_ms = czas_ms(kalibracja) if kalibruj else None
+        if i >= rozgrzewka:
+            czasy.append(czas)
+            kalibracje.append(kalibracja_ms)
+    wynik = {
+        'min_ms': round(min(czasy), 3),
+        'mediana_ms': round(statistics.median(czasy), 3),
+        'srednia_ms': round(statistics.fmean(czasy), 3),
+        'odchylenie_ms': round(statistics.stdev(czasy), 3) if len(czasy) > 1 else 0.0,
+        'powtorzenia': len(czasy),
+    }
+    if kalibruj:
+        wzgledne = [c / k for c, k in zip(czasy, kalibracje)]
+        wynik.update({
+            'kalibracja_ms': round(statistics.median(kalibracje), 3),
+            'min_wzgledny': round(min(wzgledne), 4),
+            'mediana_wzgledna': round(statistics.median(wzgledne), 4),
+        })
+    return wynik
+
+
+def kalibracja():
+    """
+    Stałe obciążenie (pętla Pythona, mnożenie macierzy, JSON) mierzone tuż
+    po każdym pomiarze - jego czas pokazuje bieżącą szybkość maszyny.
+    """
+    import numpy as np
+
+    a = np.random.default_rng(SEED).random((200, 200))
+    suma = 0
+    for i in range(20000):
+        suma += i * i
+    for _ in range(3):
+        a = a @ a.T
+        a /= a.max()
+    json.dumps([{'i': i} for i in range(3000)])
+
+
+def przygotuj_zbior(katalog, rozmiar):
+    """Wygeneruj (raz) plik CSV danego rozmiaru; zwraca (ścieżka, liczba wierszy)"""
+    from generate_data import AtmosphericDataGenerator
+
+    stacje, dni = ROZMIARY[rozmiar]
+    sciezka = os.path.join(katalog, f"dane_{rozmiar}.csv")
+    koniec = (date.fromisoformat(DATA_STARTOWA) + timedelta(days=dni - 1)).isoformat()
+    with contextlib.redirect_stdout(io.StringIO()):
+        wiersze = AtmosphericDataGenerator().generate_stream(
+            DATA_STARTOWA, koniec, sciezka, stations=stacje, seed=SEED)
+    return sciezka, wiersze
+
+
+def _izoluj_aplikacje(app, katalog):
+    """Przekieruj aplikację na katalog tymczasowy i wyłącz podkład mapowy"""
+    from render_cache import RenderCache
+
+    app.dodaj_basemape = lambda ax, alpha=0.4: None
+    app.app.logger.setLevel('ERROR')
+    app.baza = None
+    app.RENDER_CACHE_DIR = os.path.join(katalog, 'cache')
+    app.CUBE_DIR = os.path.join(katalog, 'kostki')
+    app.render_cache = RenderCache(app.RENDER_CACHE_DIR, None, rozszerzenie=app.obrazy.ROZSZERZENIE)
+    app.render_archive = RenderCache(os.path.join(katalog, 'archiwum'), None,
+                                     rozszerzenie=app.obrazy.ROZSZERZENIE)
+    # Zawsze ścieżka PDF reportlab, niezależnie od instalacji pdfkit
+    import raporty
+    raporty.SILNIK = 'reportlab'
+
+
+def przypadki_danych(app, data):
+    """(nazwa, funkcja, przygotuj) - ścieżki danych niezależne od siatki"""
+    cache = app.dataset.get_cache(app.CSV_FILE)
+    return [
+        ('load_data', app.load_data, cache.wyczysc),
+        ('load_data_for_date', lambda: app.load_data_for_date(data, ['PM25']), None),
+        ('statystyki', lambda: app.statystyki.policz(app.load_data()), None),
+        ('szeregi', lambda: app.szeregi.ArchiwumSzeregow().aktualizuj(
+            app.porcje_danych(), app.get_available_dates()), None),
+        ('kostka_idw', lambda: app.kostka.zbuduj(os.path.join(app.CUBE_DIR, 'benchmark.npy'), app.load_data(),
+                                                'PM25', 'idw', app.CUBE_GRID_SIZE), None),
+        ('szereg_miesieczny', lambda: app.archiwum_szeregow().szereg('PM25', okres='miesiac', prog=15), None),
+    ]
+
+
+def przypadki_renderowania(app, data, plt):
+    """(nazwa, funkcja, przygotuj) - renderery i zapis niezależne od siatki"""
+    klucz = app.renderuj_obraz(data, 'pm25', 'idw')
+
+    def png():
+        app.rysuj_mape_idw(data, 'pm25')
+
+    return [
+        ('rysuj_wykresy_dla_daty', lambda: app.rysuj_wykresy_dla_daty(data, 'pm25'),
+         lambda: plt.close('all')),
+        ('png', lambda: app.obrazy.koduj_figure(plt.gcf(), 'png', dpi=100, bbox_inches='tight', pad_inches=0.2),
+         lambda: (plt.close('all'), png())),
+        ('pdf_reportlab', lambda: app.zbuduj_raport_pdf(data, 'pm25', 'idw', klucz), None),
+    ]
+
+
+def przypadki_siatki(app, data, plt):
+    """(nazwa, funkcja, przygotuj) - interpolacje zależne od rozdzielczości siatki"""
+    def kriging_od_zera():
+        plt.close('all')
+        app.kriging_cache.wyczysc()
+
+    return [
+        ('rysuj_mape_idw', lambda: app.rysuj_mape_idw(data, 'pm25'), lambda: plt.close('all')),
+        ('rysuj_mape_kriging', lambda: app.rysuj_mape_kriging(data, 'pm25'), kriging_od_zera),
+        # Szablon figury jest budowany w rozgrzewce - mierzymy samą warstwę danych
+        ('szablon_idw', lambda: app.renderuj_szablon(data, 'pm25', 'idw'), None),
+        ('szablon_kriging', lambda: app.renderuj_szablon(data, 'pm25', 'kriging'), kriging_od_zera),
+    ]
+
+
+def uruchom(rozmiary, siatki, powtorzenia):
+    """Wykonaj benchmark; zwraca listę wyników"""
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    warnings.simplefilter('ignore')
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    import app
+
+    wyniki = []
+    domyslne_siatki = (app.GRID_SIZE, app.KRIGING_GRID_SIZE)
+    with tempfile.TemporaryDirectory() as katalog:
+        _izoluj_aplikacje(app, katalog)
+        for rozmiar in rozmiary:
+            app.GRID_SIZE, app.KRIGING_GRID_SIZE = domyslne_siatki
+            sciezka, wiersze = przygotuj_zbior(katalog, rozmiar)
+            app.CSV_FILE = sciezka
+            data = app.get_available_dates()[len(app.get_available_dates()) // 2]
+            opis = {'rozmiar': rozmiar, 'stacje': ROZMIARY[rozmiar][0], 'wiersze': wiersze}
+
+            zadania = [(nazwa, None, f, p) for nazwa, f, p in przypadki_danych(app, data)]
+            zadania += [(nazwa, None, f, p) for nazwa, f, p in przypadki_renderowania(app, data, plt)]
+            for siatka in siatki:
+                zadania += [(nazwa, siatka, f, p) for nazwa, f, p in przypadki_siatki(app, data, plt)]
+
+            for nazwa, siatka, funkcja, przygotuj in zadania:
+                if siatka is None:
+                    app.GRID_SIZE, app.KRIGING_GRID_SIZE = domyslne_siatki
+                else:
+                    app.GRID_SIZE = app.KRIGING_GRID_SIZE = siatka
+                with contextlib.redirect_stdout(io.StringIO()):
+                    wynik = zmierz(funkcja, powtorzenia, przygotuj=przygotuj, kalibruj=True)
+                plt.close('all')
+                wyniki.append({'przypadek': nazwa, **opis, 'siatka': siatka, **wynik})
+                print(f"{rozmiar:8} {nazwa:24} {siatka or '-':>5} "
+                      f"{wynik['mediana_ms']:10.1f} ms (min {wynik['min_ms']:.1f})")
+    return wyniki
+
+
+def metadane():
+    """Środowisko pomiaru - do interpretacji porównań między maszynami"""
+    import matplotlib
+    import numpy
+    import pandas
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'czas': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platforma': platform.platform(),
+        'procesory': os.cpu_count(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+        'matplotlib': matplotlib.__version__,
+        'seed': SEED,
+    }
+
+
+def _klucz(wynik):
+    return (wynik['przypadek'], wynik['rozmiar'], wynik['siatka'])
+
+
+def _do_porownania(wynik, bazowy):
+    """
+    (oczekiwany, zmierzony, rozrzut) w ms. Czasy względne z obu uruchomień są
+    przeliczane na bieżącą szybkość maszyny (kalibracja tego uruchomienia).
+    """
+    if 'min_wzgledny' in wynik and 'min_wzgledny' in bazowy:
+        skala = wynik['kalibracja_ms']
+        rozrzut = (bazowy['mediana_wzgledna'] - bazowy['min_wzgledny']
+                   + wynik['mediana_wzgledna'] - wynik['min_wzgledny'])
+        return bazowy['min_wzgledny'] * skala, wynik['min_wzgledny'] * skala, rozrzut * skala
+    # Punkt odniesienia bez kalibracji - same najkrótsze czasy
+    rozrzut = bazowy['mediana_ms'] - bazowy['min_ms'] + wynik['mediana_ms'] - wynik['min_ms']
+    return bazowy['min_ms'], wynik['min_ms'], rozrzut
+
+
+def porownaj(wyniki, odniesienie, prog=PROG_REGRESJI, prog_ms=PROG_BEZWZGLEDNY_MS):
+    """
+    Porównaj najkrótsze czasy z punktem odniesienia; zwraca listę regresji.
+    Minimum jest najmniej zaszumioną miarą (zakłócenia tylko wydłużają
+    pomiar), a każdy pomiar jest odnoszony do kalibracji zmierzonej tuż po
+    nim - spowolnienie całej maszyny nie jest regresją. Regresja musi
+    przekroczyć próg względny, bezwzględny prog_ms oraz rozrzut obu pomiarów
+    (mediana - minimum), więc drobne i zaszumione przypadki nie fluktuują o
+    dziesiątki procent.
+    """
+    bazowe = {_klucz(w): w for w in odniesienie['wyniki']}
+    regresje = []
+    print(f"\n{'przypadek':24} {'rozmiar':8} {'siatka':>6} {'bazowo':>10} {'teraz':>10} {'zmiana':>8}")
+    for wynik in wyniki:
+        bazowy = bazowe.get(_klucz(wynik))
+        if bazowy is None:
+            continue
+        oczekiwany, teraz, rozrzut = _do_porownania(wynik, bazowy)
+        roznica = teraz - oczekiwany
+        zmiana = roznica / oczekiwany if oczekiwany else 0.0
+        znacznik = ''
+        if zmiana > prog and roznica > max(prog_ms, rozrzut):
+            znacznik = ' ✗'
+            regresje.append({**wynik, 'zmiana': zmiana})
+        print(f"{wynik['przypadek']:24} {wynik['rozmiar']:8} {str(wynik['siatka'] or '-'):>6} "
+              f"{oczekiwany:10.1f} {teraz:10.1f} {zmiana:+8.1%}{znacznik}")
+    return regresje
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ścieżek danych i renderowania")
+    parser.add_argument('--rozmiary', nargs='+', choices=list(ROZMIARY), default=DOMYSLNE_ROZMIARY,
+                        help="rozmiary zbiorów danych")
+    parser.add_argument('--siatki', nargs='+', type=int, default=DOMYSLNE_SIATKI,
+                        help="rozdzielczości siatek interpolacji")
+    parser.add_argument('--powtorzenia', type=int, default=None,
+                        help=f"liczba pomiarów na przypadek (domyślnie {DOMYSLNE_POWTORZENIA}, "
+                             f"z --porownaj {POWTORZENIA_POROWNANIA})")
+    parser.add_argument('--zapisz', help="zapisz wyniki do pliku JSON")
+    parser.add_argument('--porownaj', help="porównaj z wynikami zapisanymi w pliku JSON")
+    parser.add_argument('--prog', type=float, default=PROG_REGRESJI,
+                        help="względny wzrost najkrótszego czasu uznawany za regresję (domyślnie 0.25)")
+    parser.add_argument('--prog-ms', type=float, default=PROG_BEZWZGLEDNY_MS,
+                        help="pomijaj wzrosty mniejsze niż tyle ms (domyślnie 2)")
+    args = parser.parse_args()
+
+    powtorzenia = args.powtorzenia or (POWTORZENIA_POROWNANIA if args.porownaj else DOMYSLNE_POWTORZENIA)
+    wyniki = uruchom(args.rozmiary, args.siatki, powtorzenia)
+    raport = {'meta': metadane(), 'wyniki': wyniki}
+
+    if args.zapisz:
+        with open(args.zapisz, 'w', encoding='utf-8') as f:
+            json.dump(raport, f, indent=2, ensure_ascii=False)
+        print(f"\n✓ Wyniki zapisane do: {args.zapisz}")
+
+    if args.porownaj:
+        with open(args.porownaj, encoding='utf-8') as f:
+            odniesienie = json.load(f)
+        regresje = porownaj(wyniki, odniesienie, args.prog, args.prog_ms)
+        if regresje:
+            print(f"\n✗ Regresje wydajności: {len(regresje)} (próg {args.prog:.0%} i {args.prog_ms:g} ms)")
+            return 1
+        print("\n✓ Brak regresji wydajności")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
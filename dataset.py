@@ -0,0 +1,145 @@
+"""
+Współdzielony w procesie cache zbioru pomiarów.
+
+Plik CSV jest parsowany raz i przeładowywany tylko wtedy, gdy zmieni się
+jego czas modyfikacji lub rozmiar. Zwracana ramka jest współdzielona między
+żądaniami - wywołujący nie mogą jej modyfikować (filtrowanie i .copy() są OK).
+"""
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Kolumny pomiarowe przechowywane jako float32
+KOLUMNY_POMIAROWE = ['PM25', 'temperatura', 'wilgotnosc']
+
+
+def _wczytaj_csv(sciezka):
+    """Parsuj CSV do ramki o zwartych typach kolumn"""
+    return przygotuj_ramke(pd.read_csv(sciezka, encoding='utf-8'))
+
+
+def przygotuj_ramke(df):
+    """Posortuj ramkę po dacie i nadaj kolumnom zwarte typy"""
+    if 'nazwa' in df.columns:
+        df['nazwa'] = df['nazwa'].astype('category')
+    if 'data' in df.columns:
+        # Sortowanie stabilne - kolejność stacji w obrębie dnia bez zmian
+        df['data'] = df['data'].astype(str)
+        df = df.sort_values('data', kind='stable', ignore_index=True)
+        df['data'] = df['data'].astype('category')
+    for kolumna in KOLUMNY_POMIAROWE:
+        if kolumna in df.columns:
+            df[kolumna] = pd.to_numeric(df[kolumna], errors='coerce').astype(np.float32)
+
+    return df
+
+
+class IndeksDat:
+    """
+    Indeks ramki posortowanej po dacie: dla każdej daty zakres wierszy.
+
+    Daty w formacie ISO sortują się leksykograficznie, więc wyszukiwanie
+    binarne działa również dla znaczników godzinowych ('YYYY-MM-DD HH:MM').
+    """
+
+    def __init__(self, df):
+        if 'data' in df.columns and len(df):
+            kody = df['data'].cat.codes.to_numpy()
+            granice = np.flatnonzero(np.diff(kody)) + 1
+            starty = np.concatenate(([0], granice))
+            self.daty = np.asarray(df['data'].cat.categories, dtype=object)[kody[starty]]
+            self.offsety = np.concatenate((starty, [len(df)]))
+        else:
+            self.daty = np.array([], dtype=object)
+            self.offsety = np.array([0])
+
+    def wiersze_daty(self, data):
+        """Zakres wierszy (start, stop) dla jednej daty"""
+        i = np.searchsorted(self.daty, data)
+        if i < len(self.daty) and self.daty[i] == data:
+            return self.offsety[i], self.offsety[i + 1]
+        return 0, 0
+
+    def wiersze_zakresu(self, od=None, do=None):
+        """Zakres wierszy (start, stop) dla dat od..do włącznie"""
+        i0 = 0 if od is None else np.searchsorted(self.daty, od, side='left')
+        # '\x7f' - obejmij także znaczniki godzinowe z dnia `do`
+        i1 = len(self.daty) if do is None else np.searchsorted(self.daty, do + '\x7f', side='right')
+        if i1 <= i0:
+            return 0, 0
+        return self.offsety[i0], self.offsety[i1]
+
+
+class DatasetCache:
+    """Cache jednego pliku danych unieważniany po (mtime, rozmiar)"""
+
+    def __init__(self, sciezka):
+        self.sciezka = sciezka
+        self._lock = threading.Lock()
+        # (sygnatura, ramka, indeks) - podmieniane jednym przypisaniem
+        self._stan = (None, None, None)
+
+    def _aktualna_sygnatura(self):
+        st = os.stat(self.sciezka)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _aktualny_stan(self):
+        sygnatura = self._aktualna_sygnatura()  # FileNotFoundError -> wywołujący
+        stan = self._stan
+        if stan[0] == sygnatura:
+            return stan
+
+        with self._lock:
+            # Inny wątek mógł już przeładować dane
+            if self._stan[0] != sygnatura:
+                df = _wczytaj_csv(self.sciezka)
+                self._stan = (sygnatura, df, IndeksDat(df))
+            return self._stan
+
+    def get(self):
+        """Zwróć ramkę danych, przeładowując plik tylko po jego zmianie"""
+        return self._aktualny_stan()[1]
+
+    def dla_daty(self, data):
+        """Wiersze jednej daty jako widok na współdzieloną ramkę"""
+        _, df, indeks = self._aktualny_stan()
+        start, stop = indeks.wiersze_daty(data)
+        return df.iloc[start:stop]
+
+    def zakres_dat(self, od=None, do=None):
+        """Wiersze z dat od..do (włącznie) jako widok na współdzieloną ramkę"""
+        _, df, indeks = self._aktualny_stan()
+        start, stop = indeks.wiersze_zakresu(od, do)
+        return df.iloc[start:stop]
+
+    def daty(self):
+        """Posortowana lista dostępnych dat"""
+        return list(self._aktualny_stan()[2].daty)
+
+    @property
+    def wersja(self):
+        """Identyfikator aktualnej wersji danych (przeładowuje zmieniony plik)"""
+        mtime_ns, rozmiar = self._aktualny_stan()[0]
+        return f"{mtime_ns:x}-{rozmiar:x}"
+
+    def wyczysc(self):
+        """Wymuś ponowne wczytanie przy następnym dostępie"""
+        with self._lock:
+            self._stan = (None, None, None)
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_cache(sciezka):
+    """Zwróć (tworząc w razie potrzeby) cache dla danego pliku"""
+    sciezka = os.path.abspath(sciezka)
+    cache = _cache.get(sciezka)
+    if cache is None:
+        with _cache_lock:
+            cache = _cache.setdefault(sciezka, DatasetCache(sciezka))
+    return cache
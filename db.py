@@ -0,0 +1,193 @@
+"""
+Backend bazodanowy pomiarów (PostgreSQL, w testach SQLite).
+
+Filtry daty, zmiennej i stacji są wykonywane po stronie serwera w
+sparametryzowanych zapytaniach - do aplikacji trafiają tylko potrzebne
+wiersze i kolumny. Wgrywanie CSV w PostgreSQL używa COPY.
+
+Wgranie danych:
+    python db.py data/dane.csv
+"""
+
+import argparse
+import os
+from datetime import date, timedelta
+
+import pandas as pd
+from sqlalchemy import (Column, Float, Index, Integer, MetaData, String, Table,
+                        bindparam, create_engine, func, insert, select, text)
+
+import dataset
+
+DB_NAME = os.environ.get("DB_NAME", "silesiaair")
+DB_USER = os.environ.get("DB_USER", "postgres")
+DB_PASSWORD = os.environ.get("DB_PASSWORD", "postgres")
+DB_HOST = os.environ.get("DB_HOST", "localhost")
+DB_PORT = os.environ.get("DB_PORT", "5432")
+
+DATABASE_URL = os.environ.get(
+    "DATABASE_URL",
+    f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+
+# Kolumna w aplikacji (jak w CSV) -> kolumna w tabeli measurements
+KOLUMNY = {
+    'nazwa': 'nazwa',
+    'lat': 'lat',
+    'lon': 'lon',
+    'data': 'data',
+    'PM25': 'pm25',
+    'temperatura': 'temperatura',
+    'wilgotnosc': 'wilgotnosc',
+}
+KOLUMNY_POMIAROWE = ['PM25', 'temperatura', 'wilgotnosc']
+
+metadata = MetaData()
+measurements = Table(
+    'measurements', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('nazwa', String(100), nullable=False),
+    Column('lat', Float, nullable=False),
+    Column('lon', Float, nullable=False),
+    # ISO 'YYYY-MM-DD' lub 'YYYY-MM-DD HH:MM' - jak w pliku CSV
+    Column('data', String(19), nullable=False),
+    Column('pm25', Float),
+    Column('temperatura', Float),
+    Column('wilgotnosc', Float),
+    Index('ix_measurements_data', 'data'),
+)
+
+
+def _dzien_po(dzien):
+    """Pierwszy dzień po dacie 'YYYY-MM-DD' (górna granica zakresu)"""
+    return (date.fromisoformat(dzien[:10]) + timedelta(days=1)).isoformat()
+
+
+class BazaPomiarow:
+    """Dostęp do tabeli measurements przez pulę połączeń SQLAlchemy"""
+
+    def __init__(self, url=DATABASE_URL, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW):
+        opcje = {'pool_pre_ping': True}
+        if not url.startswith('sqlite'):
+            opcje.update(pool_size=pool_size, max_overflow=max_overflow)
+        self.engine = create_engine(url, **opcje)
+
+    def utworz_tabele(self):
+        metadata.create_all(self.engine)
+
+    def _zapytanie(self, data=None, od=None, do=None, zmienne=None, stacje=None):
+        """(zapytanie, parametry) SELECT z filtrami wykonywanymi w bazie"""
+        zmienne = zmienne or KOLUMNY_POMIAROWE
+        nieznane = set(zmienne) - set(KOLUMNY_POMIAROWE)
+        if nieznane:
+            raise ValueError(f"Nieznane zmienne: {', '.join(sorted(nieznane))}")
+
+        kolumny = ['nazwa', 'lat', 'lon', 'data'] + list(zmienne)
+        lista = ', '.join(f'{KOLUMNY[k]} AS "{k}"' for k in kolumny)
+
+        warunki, parametry = [], {}
+        if data is not None:
+            warunki.append("data = :data")
+            parametry['data'] = data
+        if od is not None:
+            warunki.append("data >= :od")
+            parametry['od'] = od
+        if do is not None:
+            # Granica '< następny dzień' obejmuje też pomiary godzinowe z dnia `do`
+            warunki.append("data < :do_nastepny")
+            parametry['do_nastepny'] = _dzien_po(do)
+        if stacje:
+            warunki.append("nazwa IN :stacje")
+            parametry['stacje'] = list(stacje)
+
+        sql = f"SELECT {lista} FROM measurements"
+        if warunki:
+            sql += " WHERE " + " AND ".join(warunki)
+        sql += " ORDER BY data, id"
+
+        zapytanie = text(sql)
+        if stacje:
+            zapytanie = zapytanie.bindparams(bindparam('stacje', expanding=True))
+        return zapytanie, parametry
+
+    def pobierz(self, data=None, od=None, do=None, zmienne=None, stacje=None):
+        """
+        Wiersze pasujące do filtrów jako ramka o typach jak z CSV.
+        data - jedna data, od/do - zakres dat włącznie, zmienne - kolumny
+        pomiarowe (domyślnie wszystkie), stacje - lista nazw stacji.
+        """
+        zapytanie, parametry = self._zapytanie(data, od, do, zmienne, stacje)
+        with self.engine.connect() as conn:
+            df = pd.read_sql_query(zapytanie, conn, params=parametry)
+        return dataset.przygotuj_ramke(df)
+
+    def porcje(self, od=None, do=None, zmienne=None, stacje=None, rozmiar=50_000):
+        """
+        Wiersze jak w pobierz(), ale porcjami po `rozmiar` - kursor po stronie
+        serwera, więc w pamięci jest naraz tylko jedna porcja.
+        """
+        zapytanie, parametry = self._zapytanie(None, od, do, zmienne, stacje)
+        with self.engine.connect().execution_options(stream_results=True) as conn:
+            pusto = True
+            for df in pd.read_sql_query(zapytanie, conn, params=parametry, chunksize=rozmiar):
+                pusto = False
+                yield dataset.przygotuj_ramke(df)
+            if pusto:
+                kolumny = ['nazwa', 'lat', 'lon', 'data'] + list(zmienne or KOLUMNY_POMIAROWE)
+                yield dataset.przygotuj_ramke(pd.DataFrame(columns=kolumny))
+
+    def daty(self):
+        """Posortowana lista dostępnych dat"""
+        with self.engine.connect() as conn:
+            wynik = conn.execute(text("SELECT DISTINCT data FROM measurements ORDER BY data"))
+            return [wiersz[0] for wiersz in wynik]
+
+    def wersja(self):
+        """Identyfikator wersji danych - zmienia się po każdym wgraniu"""
+        with self.engine.connect() as conn:
+            ostatni = conn.execute(select(func.max(measurements.c.id))).scalar()
+        return f"db-{ostatni or 0}"
+
+    def wgraj_csv(self, sciezka, chunksize=50_000):
+        """Wgraj plik CSV do tabeli (COPY w PostgreSQL); zwraca liczbę wierszy"""
+        self.utworz_tabele()
+        naglowek = pd.read_csv(sciezka, nrows=0, encoding='utf-8').columns
+        kolumny_db = [KOLUMNY[k] for k in naglowek]
+
+        if self.engine.dialect.name == 'postgresql':
+            surowe = self.engine.raw_connection()
+            try:
+                with surowe.cursor() as cur, open(sciezka, encoding='utf-8') as f:
+                    cur.copy_expert(
+                        f"COPY measurements ({', '.join(kolumny_db)}) FROM STDIN WITH (FORMAT csv, HEADER true)",
+                        f)
+                    liczba = cur.rowcount
+                surowe.commit()
+            finally:
+                surowe.close()
+            return liczba
+
+        # Inne bazy (SQLite w testach) - wstawianie wsadowe porcjami
+        liczba = 0
+        with self.engine.begin() as conn:
+            for porcja in pd.read_csv(sciezka, encoding='utf-8', chunksize=chunksize):
+                porcja.columns = kolumny_db
+                conn.execute(insert(measurements), porcja.to_dict('records'))
+                liczba += len(porcja)
+        return liczba
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wgraj plik CSV do tabeli measurements")
+    parser.add_argument('plik', help="plik CSV z pomiarami")
+    parser.add_argument('--url', default=DATABASE_URL, help="adres bazy SQLAlchemy")
+    args = parser.parse_args()
+
+    liczba = BazaPomiarow(args.url).wgraj_csv(args.plik)
+    print(f"✓ Wgrano {liczba} rekordów z {args.plik}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Strumieniowy eksport pomiarów (CSV, CSV.gz, Parquet).
+
+Dane przechodzą porcjami od źródła do odpowiedzi HTTP - pełna ramka nie
+jest kopiowana ani zapisywana do pliku tymczasowego, więc pamięć workera
+zależy od rozmiaru porcji, a nie od rozmiaru eksportu.
+"""
+
+import io
+import zlib
+
+FORMATY = {
+    # format -> (rozszerzenie, typ MIME)
+    'csv': ('csv', 'text/csv; charset=utf-8'),
+    'csv.gz': ('csv.gz', 'application/gzip'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+# Liczba wierszy w jednej porcji eksportu
+ROZMIAR_PORCJI = 50_000
+
+
+def porcje_ramki(df, kolumny, stacje=None, rozmiar=ROZMIAR_PORCJI):
+    """Kolejne porcje ramki (widoki iloc) z wybranymi kolumnami i stacjami"""
+    # Co najmniej jedna (choćby pusta) porcja - eksport zawsze ma nagłówek
+    for start in range(0, max(len(df), 1), rozmiar):
+        porcja = df.iloc[start:start + rozmiar]
+        if stacje:
+            porcja = porcja[porcja['nazwa'].isin(stacje)]
+        yield porcja[kolumny]
+
+
+def strumien_csv(porcje, kompresja=False):
+    """Bajty CSV (opcjonalnie gzip) porcja po porcji, nagłówek tylko raz"""
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if kompresja else None
+    naglowek = True
+    for porcja in porcje:
+        if porcja.empty and not naglowek:
+            continue
+        dane = porcja.to_csv(index=False, header=naglowek).encode('utf-8')
+        naglowek = False
+        if gzip is not None:
+            dane = gzip.compress(dane)
+        if dane:
+            yield dane
+    if gzip is not None:
+        yield gzip.flush()
+
+
+class _Bufor(io.RawIOBase):
+    """Plik tylko do zapisu, z którego strumień odbiera zapisane bajty"""
+
+    def __init__(self):
+        self._porcje = []
+
+    def writable(self):
+        return True
+
+    def write(self, dane):
+        self._porcje.append(bytes(dane))
+        return len(dane)
+
+    def odbierz(self):
+        dane = b''.join(self._porcje)
+        self._porcje.clear()
+        return dane
+
+
+def _schemat_bez_slownikow(schemat):
+    """Kolumny kategorii zapisujemy jako zwykłe napisy (porcje mogą mieć różne słowniki)"""
+    import pyarrow as pa
+    return pa.schema([
+        pa.field(pole.name, pole.type.value_type) if pa.types.is_dictionary(pole.type) else pole
+        for pole in schemat
+    ])
+
+
+def strumien_parquet(porcje):
+    """Bajty pliku Parquet - każda porcja to osobna grupa wierszy"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    bufor = _Bufor()
+    writer = None
+    try:
+        for porcja in porcje:
+            tabela = pa.Table.from_pandas(porcja, preserve_index=False)
+            if writer is None:
+                schemat = _schemat_bez_slownikow(tabela.schema).remove_metadata()
+                writer = pq.ParquetWriter(bufor, schemat, compression='snappy')
+            elif porcja.empty:
+                continue
+            writer.write_table(tabela.cast(schemat))
+            dane = bufor.odbierz()
+            if dane:
+                yield dane
+    finally:
+        if writer is not None:
+            writer.close()
+    yield bufor.odbierz()
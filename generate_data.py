@@ -1,8 +1,11 @@
 import csv
 import random
+import time
 from datetime import datetime, timedelta
 import argparse
 
+import numpy as np
+
 # Lista miast GZM (Górnośląsko-Zagłębiowska Metropolia)
 CITIES = [
     ('Katowice',       50.2643, 19.0235),   # zgodnie z danymi GPS :contentReference[oaicite:0]{index=0}
@@ -21,6 +24,36 @@ CITIES = [
     ('Pyskowice',      50.3956, 18.6345),   # poprzednia 50.3972,19.2458 wydaje się błędna (zbyt duża długość E); sugeruję manualne sprawdzenie — oficjalne online dane są sprzeczne
 ]
 
+# Zmienne generowane przez generator wektorowy:
+# nazwa -> (zakres wartości startowych, zakres dopuszczalnych wartości)
+ZMIENNE = {
+    'PM25': ((25, 40), (5, 50)),
+    'temperatura': ((-10, 10), (-30, 40)),
+    'wilgotnosc': ((40, 80), (10, 100)),
+}
+
+# Zasięg losowania stacji syntetycznych (lat_min, lat_max, lon_min, lon_max)
+ZASIEG_GZM = (
+    min(lat for _, lat, _ in CITIES), max(lat for _, lat, _ in CITIES),
+    min(lon for _, _, lon in CITIES), max(lon for _, _, lon in CITIES),
+)
+
+# Przybliżona liczba wierszy generowanych i zapisywanych naraz (porcja wyjścia)
+WIERSZE_W_PORCJI = 500_000
+
+FORMAT_DATY = {'D': '%Y-%m-%d', 'h': '%Y-%m-%d %H:%M'}
+
+
+def stacje_syntetyczne(liczba, rng):
+    """Miasta GZM, a powyżej ich liczby losowe stacje w zasięgu metropolii"""
+    if liczba <= len(CITIES):
+        return list(CITIES[:liczba])
+    lat_min, lat_max, lon_min, lon_max = ZASIEG_GZM
+    dodatkowe = liczba - len(CITIES)
+    lat = np.round(rng.uniform(lat_min, lat_max, dodatkowe), 4)
+    lon = np.round(rng.uniform(lon_min, lon_max, dodatkowe), 4)
+    return list(CITIES) + [(f"Stacja {i:05d}", la, lo)
+                           for i, (la, lo) in enumerate(zip(lat, lon), 1)]
 
 
 class AtmosphericDataGenerator:
@@ -110,6 +143,111 @@ class AtmosphericDataGenerator:
         except Exception as e:
             print(f"Błąd przy zapisywaniu pliku: {e}")
     
+    def generate_stream(self, start_date, end_date, output_file, stations=None,
+                        freq='D', variables=None, seed=None, chunk_rows=WIERSZE_W_PORCJI):
+        """
+        Wektorowy generator dużych zbiorów danych.
+
+        Błądzenie losowe (±5% na krok, jak w generate_data) liczone jest na
+        tablicach NumPy dla wszystkich stacji naraz, a wynik zapisywany
+        porcjami po ok. chunk_rows wierszy do CSV lub Parquet (rozszerzenie
+        .parquet) przez writery pyarrow - w pamięci jest tylko jedna porcja.
+
+        stations - liczba stacji (domyślnie miasta GZM), freq - 'D' (dni) albo
+        'h' (godziny), variables - lista nazw z ZMIENNE, seed - ziarno
+        generatora (ten sam seed daje ten sam plik).
+        """
+        import pandas as pd
+        import pyarrow as pa
+
+        if freq not in FORMAT_DATY:
+            raise ValueError(f"Nieznana rozdzielczość: {freq} (dozwolone: D, h)")
+        variables = list(variables or ZMIENNE)
+        nieznane = set(variables) - set(ZMIENNE)
+        if nieznane:
+            raise ValueError(f"Nieznane zmienne: {', '.join(sorted(nieznane))}")
+
+        rng = np.random.default_rng(seed)
+        stacje = stacje_syntetyczne(stations or len(self.cities), rng)
+        liczba_stacji = len(stacje)
+        nazwy = np.array([nazwa for nazwa, _, _ in stacje], dtype=object)
+        lat = np.array([la for _, la, _ in stacje])
+        lon = np.array([lo for _, _, lo in stacje])
+
+        czasy = pd.date_range(start_date, pd.Timestamp(end_date) + pd.Timedelta(days=1),
+                              freq=freq, inclusive='left')
+        if len(czasy) == 0:
+            raise ValueError("Data rozpoczęcia nie może być późniejsza niż data zakończenia")
+
+        print("Generowanie danych (tryb wektorowy):")
+        print(f"  Zakres: {start_date} do {end_date} ({len(czasy)} kroków, rozdzielczość {freq})")
+        print(f"  Liczba stacji: {liczba_stacji}")
+        print(f"  Całkowita liczba rekordów: {len(czasy) * liczba_stacji}\n")
+
+        # Stan błądzenia losowego - jeden wektor na zmienną
+        poprzednie = {
+            zmienna: rng.uniform(*ZMIENNE[zmienna][0], size=liczba_stacji)
+            for zmienna in variables
+        }
+
+        # Porcja obejmuje całe kroki czasu - wszystkie stacje naraz
+        kroki_w_porcji = max(1, chunk_rows // liczba_stacji)
+        parquet = output_file.endswith('.parquet')
+        writer = None
+        start = time.perf_counter()
+        zapisane = 0
+        with open(output_file, 'wb') as f:
+            try:
+                for i0 in range(0, len(czasy), kroki_w_porcji):
+                    kroki = czasy[i0:i0 + kroki_w_porcji]
+                    porcja = {
+                        'nazwa': np.tile(nazwy, len(kroki)),
+                        'lat': np.tile(lat, len(kroki)),
+                        'lon': np.tile(lon, len(kroki)),
+                        'data': np.repeat(kroki.strftime(FORMAT_DATY[freq]).to_numpy(), liczba_stacji),
+                    }
+                    for zmienna in variables:
+                        porcja[zmienna] = self._bladzenie(poprzednie, zmienna, len(kroki), rng).ravel()
+
+                    tabela = pa.table(porcja)
+                    if writer is None:
+                        writer = self._writer(f, tabela.schema, parquet)
+                    writer.write_table(tabela)
+                    zapisane += tabela.num_rows
+            finally:
+                if writer is not None:
+                    writer.close()
+
+        print(f"✓ Dane zapisane do: {output_file}")
+        print(f"✓ Wygenerowano {zapisane} rekordów w {time.perf_counter() - start:.1f} s")
+        return zapisane
+
+    @staticmethod
+    def _bladzenie(poprzednie, zmienna, liczba_krokow, rng):
+        """
+        Kolejne kroki błądzenia losowego (kroki × stacje). Mnożniki losowane
+        są dla całej porcji naraz; pętla idzie tylko po krokach czasu, a każdy
+        krok to operacja na wektorze wszystkich stacji.
+        """
+        min_val, max_val = ZMIENNE[zmienna][1]
+        mnozniki = rng.uniform(0.95, 1.05, size=(liczba_krokow, len(poprzednie[zmienna])))
+        wartosci = np.empty_like(mnozniki)
+        wektor = poprzednie[zmienna]
+        for krok in range(liczba_krokow):
+            wektor = np.round(np.clip(wektor * mnozniki[krok], min_val, max_val), 1)
+            wartosci[krok] = wektor
+        poprzednie[zmienna] = wektor
+        return wartosci
+
+    @staticmethod
+    def _writer(plik, schemat, parquet):
+        """Writer pyarrow dopisujący kolejne porcje do pliku CSV lub Parquet"""
+        if parquet:
+            import pyarrow.parquet as pq
+            return pq.ParquetWriter(plik, schemat, compression='snappy')
+        from pyarrow import csv as pa_csv
+        return pa_csv.CSVWriter(plik, schemat, write_options=pa_csv.WriteOptions(quoting_style='needed'))
+
     def list_cities(self):
         """Wyświetla listę miast."""
         print("Miasta w Górnośląsko-Zagłębiowskiej Metropolii:")
@@ -119,14 +257,20 @@ class AtmosphericDataGenerator:
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Generator syntetycznych danych atmosferycznych GZM")
+    parser.add_argument('--od', default='2025-01-01', help="pierwsza data (YYYY-MM-DD)")
+    parser.add_argument('--do', default='2025-01-31', help="ostatnia data (YYYY-MM-DD)")
+    parser.add_argument('--output', default='data/generated_data.csv', help="plik wynikowy (.csv lub .parquet)")
+    parser.add_argument('--stacje', type=int, default=None, help="liczba stacji (powyżej 14 - stacje syntetyczne)")
+    parser.add_argument('--co-godzine', action='store_true', help="pomiary godzinowe zamiast dziennych")
+    parser.add_argument('--zmienne', nargs='+', choices=list(ZMIENNE), help="generowane zmienne (domyślnie wszystkie)")
+    parser.add_argument('--seed', type=int, default=None, help="ziarno generatora liczb losowych")
+    args = parser.parse_args()
+
     generator = AtmosphericDataGenerator()
-    
-    # Ustalenie dat domyślnie
-    start_date = '2025-01-01'
-    end_date = '2025-01-31'
-    output_file = 'data/generated_data.csv'
-    
-    generator.generate_data(start_date, end_date, output_file)
+    generator.generate_stream(args.od, args.do, args.output, stations=args.stacje,
+                              freq='h' if args.co_godzine else 'D',
+                              variables=args.zmienne, seed=args.seed)
 
 
 if __name__ == '__main__':
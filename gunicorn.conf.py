@@ -0,0 +1,54 @@
+"""
+Konfiguracja gunicorna (wczytywana automatycznie z katalogu aplikacji).
+
+Aplikacja jest ładowana raz w procesie nadrzędnym (preload_app), a hook
+when_ready importuje ciężkie biblioteki i wczytuje dane przed rozwidleniem
+workerów - workery startują od razu gotowe i dzielą te strony pamięci
+(copy-on-write), co skraca zimny start przy skalowaniu i restartach.
+"""
+
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+# Wątki dzielą proces: mapy z szablonów rysują się równolegle, pełne figury
+# pyplot (app._lock_pyplot) po kolei
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+preload_app = True
+
+# Podsystemy do rozgrzania (app.MODULY_PODSYSTEMOW), np. "mapy,interpolacja";
+# pusta wartość wyłącza rozgrzewkę
+WARMUP = os.environ.get("WARMUP", "mapy,interpolacja,wykresy,raporty")
+
+# Wspólny katalog metryk workerów - /metrics sumuje wszystkie procesy.
+# Ustawiany przed wczytaniem aplikacji, bo metrics czyta go przy imporcie.
+os.environ.setdefault("METRICS_DIR", os.path.join(
+    tempfile.gettempdir(), f"silesiaair-metrics-{os.environ.get('PORT', '8000')}"))
+
+
+def on_starting(server):
+    """Start serwera - metryki poprzedniego uruchomienia nie są doliczane"""
+    import metrics
+    metrics.przygotuj_katalog()
+
+
+def when_ready(server):
+    """Proces nadrzędny gotowy - rozgrzej aplikację przed startem workerów"""
+    if not WARMUP:
+        return
+    import app
+
+    podsystemy = [p.strip() for p in WARMUP.split(',') if p.strip()]
+    czasy = app.rozgrzej(podsystemy)
+    server.log.info("Rozgrzewka: %s", ", ".join(f"{k} {v:.2f}s" for k, v in czasy.items()))
+    # Metryki rozgrzewki raz, w pliku procesu nadrzędnego (workery zaczynają od zera)
+    import metrics
+    metrics.zrzuc()
+
+
+def post_fork(server, worker):
+    """Worker po rozwidleniu - wątki i połączenia do odtworzenia"""
+    import app
+    app.po_rozwidleniu()
@@ -0,0 +1,353 @@
+"""
+Silnik interpolacji przestrzennej współdzielony przez renderery map.
+"""
+
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+import metrics
+
+# Powyżej tej liczby stacji sąsiadów szukamy w KD-drzewie zamiast liczyć
+# odległości do wszystkich punktów
+KDTREE_PROG = 64
+
+# Domyślna liczba sąsiadów dla dużych zbiorów stacji (tryb KD-drzewa)
+DOMYSLNA_LICZBA_SASIADOW = 32
+
+# Maksymalna liczba elementów macierzy odległości (punkty siatki × stacje)
+# liczonych jednocześnie - ogranicza zużycie pamięci dla dużych siatek
+ROZMIAR_BLOKU = 1_000_000
+
+# Minimalna odległość - chroni przed dzieleniem przez zero w punktach stacji
+EPS = 1e-10
+
+# Powyżej tej liczby stacji Kriging liczy się w ruchomym oknie najbliższych
+# punktów (backend 'loop') zamiast pełnego układu równań dla każdego punktu
+KRIGING_OKNO_PROG = 200
+KRIGING_N_NAJBLIZSZYCH = 50
+
+
+def idw_grid(x, y, z, xi, yi, power=2, radius=None, max_neighbors=None):
+    """
+    Interpolacja IDW na regularnej siatce.
+
+    x, y, z - współrzędne i wartości stacji, xi, yi - osie siatki (1D).
+    radius ogranicza sąsiadów do podanego promienia (punkty bez sąsiadów
+    dostają NaN), max_neighbors do k najbliższych stacji.
+    Zwraca tablicę o kształcie (len(yi), len(xi)).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    z = np.asarray(z, dtype=float)
+    xi = np.asarray(xi, dtype=float)
+    yi = np.asarray(yi, dtype=float)
+
+    n = len(x)
+    if n == 0:
+        return np.full((len(yi), len(xi)), np.nan)
+
+    if max_neighbors is None and n > KDTREE_PROG:
+        max_neighbors = DOMYSLNA_LICZBA_SASIADOW
+
+    zgrid = np.empty((len(yi), len(xi)))
+
+    if max_neighbors is not None and max_neighbors < n:
+        _idw_kdtree(x, y, z, xi, yi, zgrid, power, radius, max_neighbors)
+    else:
+        _idw_brute(x, y, z, xi, yi, zgrid, power, radius)
+
+    return zgrid
+
+
+def _idw_brute(x, y, z, xi, yi, zgrid, power, radius):
+    """Pełna macierz odległości liczona blokami wierszy siatki"""
+    wiersze_na_blok = max(1, ROZMIAR_BLOKU // (len(xi) * len(x)))
+
+    for start in range(0, len(yi), wiersze_na_blok):
+        blok_y = yi[start:start + wiersze_na_blok]
+        # (wiersze, kolumny, stacje)
+        dx = xi[None, :, None] - x[None, None, :]
+        dy = blok_y[:, None, None] - y[None, None, :]
+        dist = np.hypot(dx, dy)
+        np.maximum(dist, EPS, out=dist)
+
+        weights = dist ** -power
+        if radius is not None:
+            weights[dist > radius] = 0.0
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            zgrid[start:start + len(blok_y)] = (weights @ z) / weights.sum(axis=2)
+
+
+def _idw_kdtree(x, y, z, xi, yi, zgrid, power, radius, k):
+    """k najbliższych sąsiadów z KD-drzewa, liczone blokami wierszy siatki"""
+    from scipy.spatial import cKDTree
+
+    tree = cKDTree(np.column_stack((x, y)))
+    # Brakujący sąsiedzi (poza promieniem) mają indeks n - dopisujemy zero
+    z_ext = np.append(z, 0.0)
+    upper = np.inf if radius is None else radius
+
+    wiersze_na_blok = max(1, ROZMIAR_BLOKU // (len(xi) * k))
+    for start in range(0, len(yi), wiersze_na_blok):
+        blok_y = yi[start:start + wiersze_na_blok]
+        gx, gy = np.meshgrid(xi, blok_y)
+        dist, idx = tree.query(np.column_stack((gx.ravel(), gy.ravel())), k=k,
+                               distance_upper_bound=upper)
+        np.maximum(dist, EPS, out=dist)
+
+        weights = dist ** -power  # inf -> 0 dla brakujących sąsiadów
+        with np.errstate(invalid='ignore', divide='ignore'):
+            wynik = (weights * z_ext[idx]).sum(axis=1) / weights.sum(axis=1)
+        zgrid[start:start + len(blok_y)] = wynik.reshape(len(blok_y), len(xi))
+
+
+def wagi_idw(x, y, xi, yi, power=2, max_neighbors=None):
+    """
+    Macierz wag IDW (punkty siatki × stacje) o wierszach sumujących się do 1:
+    siatka dla wartości z to wagi @ z, jak idw_grid bez promienia. Wagi
+    zależą tylko od położenia stacji, więc wiele dat liczy jeden iloczyn
+    macierzy. Dla dużych zbiorów stacji (k najbliższych) macierz jest rzadka.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    xi = np.asarray(xi, dtype=float)
+    yi = np.asarray(yi, dtype=float)
+    n = len(x)
+    if max_neighbors is None and n > KDTREE_PROG:
+        max_neighbors = DOMYSLNA_LICZBA_SASIADOW
+
+    gx, gy = np.meshgrid(xi, yi)
+    if max_neighbors is not None and max_neighbors < n:
+        from scipy.sparse import csr_matrix
+        from scipy.spatial import cKDTree
+
+        dist, idx = cKDTree(np.column_stack((x, y))).query(
+            np.column_stack((gx.ravel(), gy.ravel())), k=max_neighbors)
+        np.maximum(dist, EPS, out=dist)
+        wagi = dist ** -power
+        wagi /= wagi.sum(axis=1, keepdims=True)
+        wiersze = np.repeat(np.arange(len(wagi)), max_neighbors)
+        return csr_matrix((wagi.ravel(), (wiersze, idx.ravel())), shape=(len(wagi), n))
+
+    dist = np.hypot(gx.ravel()[:, None] - x[None, :], gy.ravel()[:, None] - y[None, :])
+    np.maximum(dist, EPS, out=dist)
+    wagi = dist ** -power
+    wagi /= wagi.sum(axis=1, keepdims=True)
+    return wagi
+
+
+def wagi_kriging(x, y, xi, yi, wariogram):
+    """
+    Macierz wag Krigingu zwykłego (punkty siatki × stacje) dla ustalonego
+    wariogramu (funkcja odległości): siatka dla wartości z to wagi @ z, jak
+    OrdinaryKriging.execute('grid', backend='vectorized') z tym wariogramem.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    gx, gy = np.meshgrid(np.asarray(xi, dtype=float), np.asarray(yi, dtype=float))
+
+    # Układ równań jak w pykrige: -γ między stacjami (0 na przekątnej) i mnożnik Lagrange'a
+    a = np.zeros((n + 1, n + 1))
+    a[:n, :n] = -wariogram(np.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :]))
+    np.fill_diagonal(a, 0.0)
+    a[n, :n] = a[:n, n] = 1.0
+
+    d = np.hypot(gx.ravel()[None, :] - x[:, None], gy.ravel()[None, :] - y[:, None])
+    b = np.ones((n + 1, d.shape[1]))
+    b[:n] = -wariogram(d)
+    # Punkt siatki w miejscu stacji - dokładnie jej wartość
+    b[:n][d <= EPS] = 0.0
+    return np.linalg.solve(a, b)[:n].T
+
+
+def rbf_grid(x, y, z, xi, yi, kernel='thin_plate_spline', smoothing=0.0, neighbors=None):
+    """
+    Interpolacja funkcjami radialnymi (RBF) na regularnej siatce.
+
+    Model jest dopasowywany raz, a siatka liczona blokami wierszy. Dla dużych
+    zbiorów stacji używany jest lokalny model z neighbors najbliższych punktów.
+    Zwraca tablicę o kształcie (len(yi), len(xi)).
+    """
+    from scipy.interpolate import RBFInterpolator
+
+    punkty = np.column_stack((np.asarray(x, dtype=float), np.asarray(y, dtype=float)))
+    z = np.asarray(z, dtype=float)
+    xi = np.asarray(xi, dtype=float)
+    yi = np.asarray(yi, dtype=float)
+
+    if neighbors is None and len(z) > KDTREE_PROG:
+        neighbors = DOMYSLNA_LICZBA_SASIADOW
+    rbf = RBFInterpolator(punkty, z, kernel=kernel, smoothing=smoothing, neighbors=neighbors)
+
+    zgrid = np.empty((len(yi), len(xi)))
+    wiersze_na_blok = max(1, ROZMIAR_BLOKU // (len(xi) * (neighbors or len(z))))
+    for start in range(0, len(yi), wiersze_na_blok):
+        blok_y = yi[start:start + wiersze_na_blok]
+        gx, gy = np.meshgrid(xi, blok_y)
+        wynik = rbf(np.column_stack((gx.ravel(), gy.ravel())))
+        zgrid[start:start + len(blok_y)] = wynik.reshape(len(blok_y), len(xi))
+    return zgrid
+
+
+def komorki_voronoi(x, y, extent):
+    """
+    Komórki Voronoia stacji przycięte do prostokąta extent
+    (lon_min, lon_max, lat_min, lat_max) - lista tablic wierzchołków
+    w kolejności stacji. Wynik jest zapamiętywany dla układu stacji.
+    """
+    return _komorki_voronoi(tuple(map(float, x)), tuple(map(float, y)), tuple(map(float, extent)))
+
+
+@lru_cache(maxsize=32)
+def _komorki_voronoi(x, y, extent):
+    import shapely
+    from shapely.geometry import MultiPoint, box
+
+    lon_min, lon_max, lat_min, lat_max = extent
+    granica = box(lon_min, lat_min, lon_max, lat_max)
+    punkty = MultiPoint(list(zip(x, y)))
+
+    if len(x) == 1:
+        return (np.asarray(granica.exterior.coords),)
+
+    komorki = shapely.voronoi_polygons(punkty, extend_to=granica, ordered=True)
+    wynik = []
+    for komorka in shapely.get_parts(komorki):
+        przyciete = komorka.intersection(granica)
+        if przyciete.geom_type != 'Polygon':
+            przyciete = przyciete.convex_hull
+        wynik.append(np.asarray(przyciete.exterior.coords))
+    return tuple(wynik)
+
+
+def _parametry_wariogramu(variogram_model, dopasowane):
+    """
+    Parametry dopasowanego wariogramu w postaci przyjmowanej przez
+    OrdinaryKriging(variogram_parameters=...). pykrige przechowuje psill,
+    a lista na wejściu oznacza pełny sill - dlatego przekazujemy słownik.
+    """
+    if variogram_model in ('spherical', 'exponential', 'gaussian', 'hole-effect'):
+        psill, zasieg, nugget = dopasowane
+        return {'psill': float(psill), 'range': float(zasieg), 'nugget': float(nugget)}
+    return [float(p) for p in dopasowane]
+
+
+class KrigingCache:
+    """
+    Cache dopasowanych modeli Kriginga zwykłego i policzonych siatek.
+
+    Model (dopasowany wariogram) jest trzymany pod kluczem (np. data, zmienna,
+    wersja danych) i parametrami wariogramu; dla tej samej siatki zwracany jest
+    gotowy wynik. Przy reuse_variogram=True parametry wariogramu dopasowane
+    dla dnia są używane dla dni oddalonych najwyżej o okno_wariogramu dni
+    (tej samej grupy i wersji danych), co pomija dopasowanie.
+    """
+
+    def __init__(self, max_modeli=64, reuse_variogram=False, okno_wariogramu=3):
+        self.max_modeli = max_modeli
+        self.reuse_variogram = reuse_variogram
+        self.okno_wariogramu = okno_wariogramu
+        self._lock = threading.Lock()
+        self._modele = OrderedDict()  # klucz -> (model, {klucz siatki: (zi, ss)})
+        # (grupa, model wariogramu) -> {numer dnia: parametry} dla _wersja_wariogramow
+        self._wariogramy = {}
+        self._wersja_wariogramow = None
+
+    def _zapamietaj(self, klucz, wpis):
+        with self._lock:
+            self._modele[klucz] = wpis
+            self._modele.move_to_end(klucz)
+            while len(self._modele) > self.max_modeli:
+                self._modele.popitem(last=False)
+
+    def _wariogram_sasiada(self, klucz_wariogramu, wersja, dzien):
+        """Parametry wariogramu najbliższego dnia w oknie albo None"""
+        with self._lock:
+            if wersja != self._wersja_wariogramow:
+                # Nowa wersja danych - wariogramy starych danych są nieaktualne
+                self._wariogramy.clear()
+                self._wersja_wariogramow = wersja
+            dni = self._wariogramy.get(klucz_wariogramu, {})
+            if dzien is None:
+                return dni.get(None)
+            odleglosc, parametry = min(((abs(d - dzien), p) for d, p in dni.items() if d is not None),
+                                       default=(None, None), key=lambda para: para[0])
+            if odleglosc is None or odleglosc > self.okno_wariogramu:
+                return None
+            return parametry
+
+    def _zapamietaj_wariogram(self, klucz_wariogramu, wersja, dzien, parametry):
+        with self._lock:
+            if wersja == self._wersja_wariogramow:
+                self._wariogramy.setdefault(klucz_wariogramu, {})[dzien] = parametry
+
+    def model(self, klucz, x, y, z, variogram_model='spherical', nlags=6, grupa_wariogramu=None,
+              dzien=None, wersja_danych=None):
+        """
+        Dopasowany OrdinaryKriging dla klucza (z cache albo nowy). dzien
+        (numer dnia, np. date.toordinal()) i wersja_danych wybierają
+        wariogram do ponownego użycia przy reuse_variogram.
+        """
+        from pykrige.ok import OrdinaryKriging
+
+        pelny_klucz = (klucz, variogram_model, nlags)
+        with self._lock:
+            wpis = self._modele.get(pelny_klucz)
+            if wpis is not None:
+                self._modele.move_to_end(pelny_klucz)
+        metrics.cache('kriging', wpis is not None)
+        if wpis is not None:
+            return wpis[0], wpis[1]
+
+        parametry = None
+        klucz_wariogramu = (grupa_wariogramu, variogram_model)
+        if self.reuse_variogram:
+            parametry = self._wariogram_sasiada(klucz_wariogramu, wersja_danych, dzien)
+
+        ok = OrdinaryKriging(
+            np.asarray(x, dtype=float), np.asarray(y, dtype=float), np.asarray(z, dtype=float),
+            variogram_model=variogram_model,
+            variogram_parameters=parametry,
+            verbose=False,
+            enable_plotting=False,
+            nlags=nlags
+        )
+        if self.reuse_variogram and parametry is None:
+            # Tylko dopasowane wariogramy - okno nie przesuwa się łańcuchem dni
+            self._zapamietaj_wariogram(klucz_wariogramu, wersja_danych, dzien, _parametry_wariogramu(
+                variogram_model, ok.variogram_model_parameters))
+
+        siatki = {}
+        self._zapamietaj(pelny_klucz, (ok, siatki))
+        return ok, siatki
+
+    def siatka(self, klucz, x, y, z, xi, yi, variogram_model='spherical', nlags=6, grupa_wariogramu=None,
+               dzien=None, wersja_danych=None):
+        """Wynik Kriginga (zi, ss) na siatce xi × yi"""
+        ok, siatki = self.model(klucz, x, y, z, variogram_model, nlags, grupa_wariogramu,
+                                dzien, wersja_danych)
+
+        xi = np.asarray(xi, dtype=float)
+        yi = np.asarray(yi, dtype=float)
+        klucz_siatki = (xi.tobytes(), yi.tobytes())
+        wynik = siatki.get(klucz_siatki)
+        if wynik is not None:
+            return wynik
+
+        if len(x) > KRIGING_OKNO_PROG:
+            wynik = ok.execute('grid', xi, yi, backend='loop', n_closest_points=KRIGING_N_NAJBLIZSZYCH)
+        else:
+            wynik = ok.execute('grid', xi, yi, backend='vectorized')
+        siatki[klucz_siatki] = wynik
+        return wynik
+
+    def wyczysc(self):
+        with self._lock:
+            self._modele.clear()
+            self._wariogramy.clear()
+            self._wersja_wariogramow = None
@@ -0,0 +1,208 @@
+"""
+Kolejka zadań dla kosztownych renderów i raportów PDF (także zbiorczych).
+
+Zadania wykonuje ograniczona pula procesów, a żądanie HTTP od razu dostaje
+identyfikator zadania. Identyfikator wynika z parametrów (klucz renderu),
+więc identyczne zadania w toku są scalane, a gotowy wynik można odnaleźć na
+dysku także z innego workera gunicorna. Zadania w toku i zakończone bez
+wyniku są widoczne dla innych workerów dzięki plikom znaczników
+<id>.zadanie w katalogu stanu.
+"""
+
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import metrics
+from prerender import _inicjuj_worker
+from render_cache import PREFIKS_TYMCZASOWY
+
+# Zakończone zadania pamiętamy tyle sekund (status i tak wynika z plików)
+CZAS_PAMIETANIA = 3600
+# Znacznik zadania w toku starszy niż to pochodzi z przerwanego workera
+MAX_CZAS_ZADANIA = 900
+ROZSZERZENIE_ZNACZNIKA = 'zadanie'
+
+
+def _z_metrykami(funkcja, *args):
+    """Wynik zadania razem z metrykami zebranymi w procesie roboczym"""
+    wynik = funkcja(*args)
+    return wynik, metrics.stan_i_wyczysc()
+
+
+def _scal_metryki(future):
+    if not future.cancelled() and future.exception() is None:
+        metrics.scal(future.result()[1])
+
+
+def _wykonaj_render(data, zmienna, metoda):
+    import app
+    return app.renderuj_obraz(data, zmienna, metoda)
+
+
+def _wykonaj_raport(data, zmienna, metoda, klucz):
+    import app
+    return app.zapisz_raport_pdf(data, zmienna, metoda, klucz)
+
+
+def _wykonaj_raport_zbiorczy(od, do, zmienne, metody, klucz):
+    import app
+    return app.zapisz_raport_zbiorczy(od, do, zmienne, metody, klucz)
+
+
+class KolejkaPelnaError(Exception):
+    """Zbyt wiele zadań oczekuje na wykonanie"""
+
+
+class KolejkaZadan:
+    """Ograniczona pula procesów z deduplikacją zadań po identyfikatorze"""
+
+    def __init__(self, max_workers, max_oczekujacych, katalog_stanu=None):
+        self.max_workers = max_workers
+        self.max_oczekujacych = max_oczekujacych
+        # Katalog znaczników widocznych dla wszystkich workerów (None - bez nich)
+        self.katalog_stanu = katalog_stanu
+        self._lock = threading.Lock()
+        self._pool = None
+        self._zadania = {}  # id -> (future, czas zgłoszenia)
+
+    def _pula(self):
+        if self._pool is None:
+            # spawn - procesy robocze nie dziedziczą wątków serwera
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                             mp_context=get_context('spawn'),
+                                             initializer=_inicjuj_worker)
+        return self._pool
+
+    def _zapomnij_stare(self):
+        teraz = time.time()
+        for id_zadania, (future, czas) in list(self._zadania.items()):
+            if future.done() and teraz - czas > CZAS_PAMIETANIA:
+                del self._zadania[id_zadania]
+
+    def _sciezka_znacznika(self, id_zadania):
+        return os.path.join(self.katalog_stanu, f"{id_zadania}.{ROZSZERZENIE_ZNACZNIKA}")
+
+    def _zapisz_znacznik(self, id_zadania, tresc):
+        """Zapisz atomowo znacznik stanu: 'oczekuje' albo 'blad\n<komunikat>'"""
+        if self.katalog_stanu is None:
+            return
+        fd, tymczasowy = tempfile.mkstemp(dir=self.katalog_stanu, prefix=PREFIKS_TYMCZASOWY,
+                                          suffix=f".{ROZSZERZENIE_ZNACZNIKA}")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(tresc)
+        os.replace(tymczasowy, self._sciezka_znacznika(id_zadania))
+
+    def _zakoncz_znacznik(self, id_zadania, future):
+        """Zadanie zakończone: znacznik błędu albo usunięcie (wynik jest na dysku)"""
+        if self.katalog_stanu is None:
+            return
+        try:
+            if future.cancelled():
+                self._zapisz_znacznik(id_zadania, "blad\nZadanie anulowane")
+            elif future.exception() is not None:
+                self._zapisz_znacznik(id_zadania, f"blad\n{future.exception()}")
+            elif future.result()[0] is None:
+                self._zapisz_znacznik(id_zadania, "blad\nBrak danych dla wybranych parametrów")
+            else:
+                os.remove(self._sciezka_znacznika(id_zadania))
+        except OSError as e:
+            print(f"Błąd zapisu stanu zadania {id_zadania}: {e}")
+
+    def zglos(self, id_zadania, funkcja, *args, istnieje=None):
+        """
+        Zgłoś zadanie; to samo zadanie w toku (lub udane) nie jest powtarzane.
+        istnieje(wynik) sprawdza, czy wynik udanego zadania jest nadal na
+        dysku - usunięty przez LRU albo sprzątanie jest liczony od nowa.
+        """
+        with self._lock:
+            istniejace = self._zadania.get(id_zadania)
+            if istniejace is not None:
+                future, _ = istniejace
+                if not future.done():
+                    return id_zadania
+                if future.exception() is None:
+                    wynik = future.result()[0]
+                    if wynik is None or istnieje is None or istnieje(wynik):
+                        return id_zadania
+
+            self._zapomnij_stare()
+            oczekujace = sum(1 for future, _ in self._zadania.values() if not future.done())
+            if oczekujace >= self.max_oczekujacych:
+                raise KolejkaPelnaError(f"Kolejka pełna ({oczekujace} zadań w toku)")
+
+            self._zapisz_znacznik(id_zadania, "oczekuje")
+            future = self._pula().submit(_z_metrykami, funkcja, *args)
+            future.add_done_callback(_scal_metryki)
+            future.add_done_callback(lambda f: self._zakoncz_znacznik(id_zadania, f))
+            self._zadania[id_zadania] = (future, time.time())
+            return id_zadania
+
+    def zapomnij(self, id_zadania):
+        """Usuń zakończone zadanie z pamięci procesu (np. gdy jego wynik zniknął)"""
+        with self._lock:
+            istniejace = self._zadania.get(id_zadania)
+            if istniejace is not None and istniejace[0].done():
+                del self._zadania[id_zadania]
+
+    def status(self, id_zadania):
+        """
+        (stan, wynik, błąd) zadania; stan: 'oczekuje', 'w_toku', 'gotowe',
+        'blad' albo None, gdy zadanie jest nieznane w tym procesie.
+        """
+        with self._lock:
+            istniejace = self._zadania.get(id_zadania)
+        if istniejace is None:
+            return None, None, None
+
+        future, _ = istniejace
+        if not future.done():
+            return ('w_toku' if future.running() else 'oczekuje'), None, None
+        blad = future.exception()
+        if blad is not None:
+            return 'blad', None, str(blad)
+        return 'gotowe', future.result()[0], None
+
+    def odswiez_znacznik(self, id_zadania):
+        """Długie zadanie wciąż trwa - odśwież znacznik, by nie uznać go za przerwane"""
+        if self.katalog_stanu is None:
+            return
+        try:
+            os.utime(self._sciezka_znacznika(id_zadania))
+        except FileNotFoundError:
+            pass
+
+    def znacznik(self, id_zadania):
+        """
+        (stan, błąd) zadania zgłoszonego w innym procesie według znacznika:
+        'oczekuje', 'blad' albo (None, None), gdy znacznika nie ma.
+        """
+        if self.katalog_stanu is None:
+            return None, None
+        sciezka = self._sciezka_znacznika(id_zadania)
+        try:
+            with open(sciezka, encoding='utf-8') as f:
+                stan, _, blad = f.read().partition('\n')
+            wiek = time.time() - os.stat(sciezka).st_mtime
+        except FileNotFoundError:
+            return None, None
+        if stan == 'blad':
+            return 'blad', blad
+        if wiek > MAX_CZAS_ZADANIA:
+            return 'blad', 'Zadanie przerwane - zgłoś je ponownie'
+        return 'oczekuje', None
+
+    def wynik(self, id_zadania, timeout=None):
+        """Poczekaj na zadanie zgłoszone w tym procesie i zwróć jego wynik"""
+        with self._lock:
+            future, _ = self._zadania[id_zadania]
+        return future.result(timeout)[0]
+
+    def zamknij(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,399 @@
+"""
+Kostka interpolacji: wszystkie daty zakresu na jednej stałej siatce GZM.
+
+Wagi IDW i Krigingu (z jednym wariogramem dla zakresu) zależą tylko od
+położenia stacji, więc siatki wszystkich dat to jeden iloczyn macierzy
+wartości (daty × stacje) i wag (stacje × punkty siatki). Braki pomiarów w
+IDW pokrywa normalizacja iloczynem wag z maską dostępnych stacji (dokładnie
+jak IDW tylko z dostępnych stacji; w trybie k najbliższych sąsiedzi są
+wybierani spośród wszystkich stacji). W Krigingu wagi zależą od zestawu
+stacji, więc daty są grupowane według zestawu dostępnych stacji - każdy
+zestaw ma własną macierz wag. Wynik jest zapisywany porcjami dat do pliku .npy
+(data × lat × lon, float32) czytanego przez mapowanie pamięci, więc szereg
+czasowy piksela i animacja nie liczą interpolacji ponownie.
+
+Kostka to pliki <klucz>.npy, <klucz>.json i animacje <klucz>-<fps>.<format>.
+przytnij() usuwa całe kostki najdawniej używane (LRU po czasie modyfikacji
+.npy, odświeżanym przez uzyj()), aż katalog zmieści się w limicie.
+
+Przykład:
+    python kostka.py --od 2025-01-01 --do 2025-01-31
+    python kostka.py --od 2025-01-01 --do 2025-12-31 --metoda kriging --gif pm25_2025.gif
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from interpolation import KRIGING_OKNO_PROG, wagi_idw, wagi_kriging
+
+METODY = ('idw', 'kriging')
+FORMATY_ANIMACJI = {'gif': 'image/gif', 'mp4': 'video/mp4'}
+
+# Bufor wokół stacji (stopnie) - jak zasięg map pojedynczych dat
+BUFOR = 0.1
+# Liczba dat liczonych i zapisywanych naraz
+ROZMIAR_PORCJI = 64
+PREFIKS_TYMCZASOWY = '.tmp-'
+# Pliki tymczasowe starsze niż to pochodzą z przerwanych zapisów
+MAX_WIEK_TYMCZASOWYCH = 3600
+
+ROZMIAR_KLATKI = (8, 6)
+DPI_KLATKI = 80
+PALETA = 'RdYlBu_r'
+
+
+def macierz_stacji(df, kolumna):
+    """(daty, nazwy, x, y, wartości daty × stacje z NaN dla braków) z wierszy zakresu"""
+    daty = df['data']
+    if isinstance(daty.dtype, pd.CategoricalDtype):
+        # Widok zakresu ma wszystkie kategorie zbioru - tylko użyte daty
+        uzyte, kody_dat = np.unique(daty.cat.codes.to_numpy(), return_inverse=True)
+        daty = np.asarray(daty.cat.categories.astype(str), dtype=object)[uzyte]
+    else:
+        kody_dat, daty = pd.factorize(daty.astype(str), sort=True)
+    kody_stacji, nazwy = pd.factorize(df['nazwa'])
+    _, pierwsze = np.unique(kody_stacji, return_index=True)
+
+    wartosci = np.full((len(daty), len(nazwy)), np.nan)
+    wartosci[kody_dat.reshape(-1), kody_stacji] = df[kolumna].to_numpy(dtype=float)
+    return (list(daty), [str(n) for n in nazwy], df['lon'].to_numpy(dtype=float)[pierwsze],
+            df['lat'].to_numpy(dtype=float)[pierwsze], wartosci)
+
+
+def _wariogram(x, y, z):
+    """Funkcja wariogramu sferycznego dopasowanego przez pykrige (jak mapy Krigingu)"""
+    from pykrige.ok import OrdinaryKriging
+
+    ok = OrdinaryKriging(x, y, z, variogram_model='spherical', nlags=6, verbose=False, enable_plotting=False)
+    funkcja, parametry = ok.variogram_function, ok.variogram_model_parameters
+    return lambda d: funkcja(parametry, d)
+
+
+def _wariogram_zakresu(x, y, wartosci):
+    """Jeden wariogram dla zakresu - dopasowany do daty z największą liczbą stacji"""
+    if len(x) > KRIGING_OKNO_PROG:
+        raise ValueError(f"Kostka Krigingu obsługuje do {KRIGING_OKNO_PROG} stacji - użyj IDW")
+    t = int(np.argmax((~np.isnan(wartosci)).sum(axis=1)))
+    jest = ~np.isnan(wartosci[t])
+    try:
+        return _wariogram(x[jest], y[jest], wartosci[t, jest])
+    except Exception as e:
+        print(f"Błąd Krigingu: {e}, używam IDW")
+        return None
+
+
+def _idw(kostka, wagi, wartosci):
+    """Wszystkie daty porcjami: (wagi @ wartości) / (wagi @ maska dostępnych stacji)"""
+    for start in range(0, len(wartosci), ROZMIAR_PORCJI):
+        porcja = wartosci[start:start + ROZMIAR_PORCJI]
+        jest = ~np.isnan(porcja)
+        # (punkty × stacje) @ (stacje × daty) - działa też dla wag rzadkich
+        licznik = wagi @ np.where(jest, porcja, 0.0).T
+        mianownik = wagi @ jest.T.astype(float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            siatki = np.where(mianownik > 0, licznik / mianownik, np.nan).T
+        kostka[start:start + len(porcja)] = siatki.reshape(kostka[start:start + len(porcja)].shape)
+
+
+def _kriging(kostka, x, y, xi, yi, wariogram, wartosci):
+    """Daty grupami o tym samym zestawie stacji - jedna macierz wag na zestaw"""
+    wzorce, grupy = np.unique(~np.isnan(wartosci), axis=0, return_inverse=True)
+    grupy = grupy.reshape(-1)
+    for g, wzorzec in enumerate(wzorce):
+        indeksy_dat = np.flatnonzero(grupy == g)
+        idx = np.flatnonzero(wzorzec)
+        if len(idx) == 0:
+            kostka[indeksy_dat] = np.nan
+            continue
+        wagi = wagi_kriging(x[idx], y[idx], xi, yi, wariogram)
+        for start in range(0, len(indeksy_dat), ROZMIAR_PORCJI):
+            porcja = indeksy_dat[start:start + ROZMIAR_PORCJI]
+            siatki = (wagi @ wartosci[np.ix_(porcja, idx)].T).T
+            kostka[porcja] = siatki.reshape(len(porcja), len(yi), len(xi))
+
+
+def zbuduj(sciezka, df, kolumna, metoda, rozmiar_siatki):
+    """
+    Policz kostkę dla wierszy zakresu i zapisz ją do pliku .npy (z opisem
+    w .json obok). Plik pojawia się pod docelową nazwą dopiero w całości.
+    """
+    daty, nazwy, x, y, wartosci = macierz_stacji(df, kolumna)
+    xi = np.linspace(x.min() - BUFOR, x.max() + BUFOR, rozmiar_siatki)
+    yi = np.linspace(y.min() - BUFOR, y.max() + BUFOR, rozmiar_siatki)
+    wariogram = _wariogram_zakresu(x, y, wartosci) if metoda == 'kriging' else None
+    metrics.etap('dane')
+
+    katalog = os.path.dirname(sciezka) or '.'
+    os.makedirs(katalog, exist_ok=True)
+    opis = {
+        'kolumna': kolumna, 'metoda': metoda, 'daty': daty,
+        'xi': [float(xi[0]), float(xi[-1]), len(xi)], 'yi': [float(yi[0]), float(yi[-1]), len(yi)],
+        'stacje': {'nazwy': nazwy, 'x': x.tolist(), 'y': y.tolist()},
+    }
+    zapisz_atomowo(_sciezka_opisu(sciezka), lambda f: f.write(json.dumps(opis).encode('utf-8')))
+
+    fd, tymczasowa = tempfile.mkstemp(prefix=PREFIKS_TYMCZASOWY, suffix='.npy', dir=katalog)
+    os.close(fd)
+    try:
+        kostka = np.lib.format.open_memmap(tymczasowa, mode='w+', dtype=np.float32,
+                                           shape=(len(daty), len(yi), len(xi)))
+        if wariogram is None:
+            _idw(kostka, wagi_idw(x, y, xi, yi), wartosci)
+        else:
+            _kriging(kostka, x, y, xi, yi, wariogram, wartosci)
+        kostka.flush()
+        del kostka
+        os.replace(tymczasowa, sciezka)
+    except BaseException:
+        os.remove(tymczasowa)
+        raise
+    metrics.etap('interpolacja')
+
+
+def _sciezka_opisu(sciezka):
+    return os.path.splitext(sciezka)[0] + '.json'
+
+
+def zapisz_atomowo(sciezka, zapisz):
+    """zapisz(plik) do pliku tymczasowego w tym samym katalogu, potem podmiana"""
+    fd, tymczasowa = tempfile.mkstemp(prefix=PREFIKS_TYMCZASOWY, dir=os.path.dirname(sciezka) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            zapisz(f)
+        os.replace(tymczasowa, sciezka)
+    except BaseException:
+        os.remove(tymczasowa)
+        raise
+
+
+_lock_przycinania = threading.Lock()
+
+
+def _klucz_pliku(nazwa):
+    """Klucz kostki, do której należy plik (kostka, opis albo animacja)"""
+    return nazwa.split('.', 1)[0].split('-', 1)[0]
+
+
+def uzyj(sciezka):
+    """Odśwież pozycję kostki w LRU; False, gdy kostki nie ma"""
+    try:
+        os.utime(sciezka)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def przytnij(katalog, max_bajtow, zachowaj=None):
+    """
+    Usuń najdawniej używane kostki razem z opisem i animacjami, aż katalog
+    zmieści się w max_bajtow; kostka o kluczu zachowaj nie jest usuwana.
+    Zwraca liczbę usuniętych kostek.
+    """
+    teraz = time.time()
+    with _lock_przycinania:
+        grupy = {}  # klucz -> [czas użycia (.npy), najnowszy plik, rozmiar, ścieżki]
+        try:
+            wpisy = list(os.scandir(katalog))
+        except FileNotFoundError:
+            return 0
+        for wpis in wpisy:
+            try:
+                if not wpis.is_file():
+                    continue
+                st = wpis.stat()
+                if wpis.name.startswith(PREFIKS_TYMCZASOWY):
+                    if teraz - st.st_mtime > MAX_WIEK_TYMCZASOWYCH:
+                        os.remove(wpis.path)
+                    continue
+            except FileNotFoundError:
+                continue
+            grupa = grupy.setdefault(_klucz_pliku(wpis.name), [None, 0.0, 0, []])
+            if wpis.name.endswith('.npy'):
+                grupa[0] = st.st_mtime
+            grupa[1] = max(grupa[1], st.st_mtime)
+            grupa[2] += st.st_size
+            grupa[3].append(wpis.path)
+
+        razem = sum(grupa[2] for grupa in grupy.values())
+        usuniete = 0
+        # Opis bez .npy to kostka w budowie albo porzucona - porzucone idą pierwsze
+        for klucz, (uzycie, najnowszy, rozmiar, sciezki) in sorted(
+                grupy.items(), key=lambda para: para[1][0] or 0.0):
+            if razem <= max_bajtow:
+                break
+            if klucz == zachowaj or (uzycie is None and teraz - najnowszy <= MAX_WIEK_TYMCZASOWYCH):
+                continue
+            # Najpierw .npy - bez niej opis i animacje nie są już używane
+            for sciezka in sorted(sciezki, key=lambda s: not s.endswith('.npy')):
+                try:
+                    os.remove(sciezka)
+                except FileNotFoundError:
+                    pass
+            razem -= rozmiar
+            usuniete += 1
+        return usuniete
+
+
+class Kostka:
+    """Zapisana kostka (data × lat × lon) czytana przez mapowanie pamięci"""
+
+    def __init__(self, sciezka):
+        self.sciezka = sciezka
+        with open(_sciezka_opisu(sciezka), encoding='utf-8') as f:
+            self.opis = json.load(f)
+        self.wartosci = np.load(sciezka, mmap_mode='r')
+        self.daty = self.opis['daty']
+        self.xi = np.linspace(*self.opis['xi'])
+        self.yi = np.linspace(*self.opis['yi'])
+        stacje = self.opis['stacje']
+        self.stacje_x, self.stacje_y = np.asarray(stacje['x']), np.asarray(stacje['y'])
+
+    def __len__(self):
+        return len(self.daty)
+
+    @property
+    def extent(self):
+        return (self.xi[0], self.xi[-1], self.yi[0], self.yi[-1])
+
+    def piksel(self, lon, lat):
+        """(wiersz, kolumna) najbliższego punktu siatki albo None poza kostką"""
+        x0, x1, y0, y1 = self.extent
+        if not (x0 <= lon <= x1 and y0 <= lat <= y1):
+            return None
+        return int(np.abs(self.yi - lat).argmin()), int(np.abs(self.xi - lon).argmin())
+
+    def szereg(self, wiersz, kolumna):
+        """Wartości punktu siatki dla kolejnych dat"""
+        return np.asarray(self.wartosci[:, wiersz, kolumna], dtype=float)
+
+
+def _klatki(kostka, tytul, podklad=None):
+    """
+    Kolejne klatki animacji (RGB uint8). Tło z podkładem i skalą kolorów
+    rysowane raz; dla każdej daty tylko obraz siatki, stacje i tytuł.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=ROZMIAR_KLATKI, dpi=DPI_KLATKI, facecolor='white')
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    x0, x1, y0, y1 = kostka.extent
+    ax.set_xlim(x0, x1)
+    ax.set_ylim(y0, y1)
+    if podklad is not None:
+        podklad(ax, alpha=0.4)
+        ax.set_xlim(x0, x1)
+        ax.set_ylim(y0, y1)
+    ax.set_xlabel('Długość geograficzna (°)', fontsize=9)
+    ax.set_ylabel('Szerokość geograficzna (°)', fontsize=9)
+
+    # Wspólna skala dla wszystkich klatek - percentyle z próbki dat
+    probka = np.asarray(kostka.wartosci[::max(1, len(kostka) // 50)])
+    vmin, vmax = (np.nanpercentile(probka, [2, 98]) if np.isfinite(probka).any() else (0.0, 1.0))
+    obraz = ax.imshow(kostka.wartosci[0], extent=kostka.extent, origin='lower', cmap=PALETA,
+                      vmin=vmin, vmax=vmax, alpha=0.7, aspect='auto', zorder=5, animated=True)
+    punkty = ax.scatter(kostka.stacje_x, kostka.stacje_y, c='black', s=12, zorder=10, animated=True)
+    fig.colorbar(obraz, ax=ax, pad=0.02, shrink=0.9).set_label(tytul, fontsize=9)
+    napis = ax.set_title(tytul, fontsize=11, fontweight='bold', animated=True)
+    fig.tight_layout()
+
+    canvas.draw()
+    tlo = canvas.copy_from_bbox(fig.bbox)
+    for t, data in enumerate(kostka.daty):
+        canvas.restore_region(tlo)
+        obraz.set_data(kostka.wartosci[t])
+        napis.set_text(f"{tytul} – {data}")
+        for artysta in (obraz, punkty, napis):
+            fig.draw_artist(artysta)
+        yield np.asarray(canvas.buffer_rgba())[..., :3].copy()
+
+
+def _gif(klatki, fps):
+    from PIL import Image
+
+    pierwsza = Image.fromarray(next(klatki)).quantize(colors=256)
+
+    # Kolejne klatki na palecie pierwszej - bez liczenia palety dla każdej
+    def reszta():
+        for klatka in klatki:
+            yield Image.fromarray(klatka).quantize(palette=pierwsza, dither=Image.Dither.NONE)
+
+    bufor = tempfile.SpooledTemporaryFile(max_size=32 * 1024 * 1024)
+    pierwsza.save(bufor, format='GIF', save_all=True, append_images=reszta(),
+                  duration=int(1000 / fps), loop=0)
+    bufor.seek(0)
+    return bufor.read()
+
+
+def _mp4(klatki, fps):
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise ValueError("Animacja MP4 wymaga programu ffmpeg")
+    pierwsza = next(klatki)
+    # yuv420p wymaga parzystych wymiarów
+    wys, szer = pierwsza.shape[0] // 2 * 2, pierwsza.shape[1] // 2 * 2
+    with tempfile.TemporaryDirectory() as katalog:
+        wyjscie = os.path.join(katalog, 'animacja.mp4')
+        proces = subprocess.Popen(
+            [ffmpeg, '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f"{szer}x{wys}",
+             '-r', str(fps), '-i', '-', '-vcodec', 'libx264', '-pix_fmt', 'yuv420p', '-y', wyjscie],
+            stdin=subprocess.PIPE)
+        try:
+            proces.stdin.write(np.ascontiguousarray(pierwsza[:wys, :szer]).tobytes())
+            for klatka in klatki:
+                proces.stdin.write(np.ascontiguousarray(klatka[:wys, :szer]).tobytes())
+        finally:
+            proces.stdin.close()
+        if proces.wait() != 0:
+            raise RuntimeError("ffmpeg zakończył się błędem")
+        with open(wyjscie, 'rb') as f:
+            return f.read()
+
+
+def animacja(kostka, format_='gif', fps=4, tytul='', podklad=None):
+    """Bajty animacji kostki (GIF albo MP4 przez ffmpeg)"""
+    if format_ not in FORMATY_ANIMACJI:
+        raise ValueError(f"Nieznany format animacji: {format_} (dostępne: {', '.join(FORMATY_ANIMACJI)})")
+    klatki = _klatki(kostka, tytul, podklad)
+    dane = _gif(klatki, fps) if format_ == 'gif' else _mp4(klatki, fps)
+    metrics.etap('animacja')
+    return dane
+
+
+def main():
+    import app
+
+    parser = argparse.ArgumentParser(description="Kostka interpolacji dla zakresu dat")
+    parser.add_argument('--od', required=True, help="pierwsza data (YYYY-MM-DD)")
+    parser.add_argument('--do', required=True, help="ostatnia data (YYYY-MM-DD)")
+    parser.add_argument('--zmienna', choices=list(app.MAPA_ZMIENNYCH), default='pm25')
+    parser.add_argument('--metoda', choices=METODY, default='idw')
+    parser.add_argument('--gif', default=None, help="zapisz też animację GIF do pliku")
+    parser.add_argument('--fps', type=int, default=4, help="klatki na sekundę animacji")
+    args = parser.parse_args()
+
+    kostka = app.kostka_interpolacji(args.zmienna, args.metoda, args.od, args.do)
+    if kostka is None:
+        print("✗ Brak danych w wybranym zakresie dat")
+        return 1
+    print(f"✓ {kostka.sciezka}: {kostka.wartosci.shape[0]} dat × {kostka.wartosci.shape[1]} × {kostka.wartosci.shape[2]}")
+    if args.gif:
+        with open(args.gif, 'wb') as f:
+            f.write(app.animacja_kostki(args.zmienna, args.metoda, args.od, args.do, 'gif', args.fps))
+        print(f"✓ {args.gif}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,228 @@
+"""
+Kolumnowy magazyn pomiarów w plikach Arrow IPC (Feather v2).
+
+Każdy dzień to osobna partycja data=YYYY-MM-DD.arrow zapisana bez
+kompresji, dzięki czemu odczyt idzie przez mapowanie pamięci: wczytanie
+jednej kolumny jednego dnia dotyka tylko jej stron na dysku. Czas i pamięć
+odczytu zależą od rozmiaru partycji, a nie od długości całego archiwum.
+
+Interfejs jest taki jak BazaPomiarow (db.py), więc aplikacja używa
+magazynu przez DATA_BACKEND=arrow.
+
+Konwersja / dopisanie danych:
+    python magazyn.py data/dane.csv
+    python magazyn.py pomiary_2025.parquet --katalog data/magazyn
+"""
+
+import argparse
+import os
+import tempfile
+from datetime import date, timedelta
+
+import pandas as pd
+
+import dataset
+
+STORE_DIR = os.environ.get("STORE_DIR", os.path.join("data", "magazyn"))
+
+KOLUMNY_OPISU = ['nazwa', 'lat', 'lon', 'data']
+KOLUMNY_POMIAROWE = dataset.KOLUMNY_POMIAROWE
+
+PREFIKS_PARTYCJI = 'data='
+ROZSZERZENIE = '.arrow'
+
+
+def _dni(od, do):
+    """Kolejne dni 'YYYY-MM-DD' od..do włącznie"""
+    dzien, koniec = date.fromisoformat(od), date.fromisoformat(do)
+    while dzien <= koniec:
+        yield dzien.isoformat()
+        dzien += timedelta(days=1)
+
+
+class MagazynKolumnowy:
+    """Katalog partycji dziennych czytanych przez mapowanie pamięci"""
+
+    def __init__(self, katalog=STORE_DIR):
+        self.katalog = katalog
+        # (wersja, lista dat) - lista dat wymaga zajrzenia do każdej partycji
+        self._daty = (None, [])
+
+    def sciezka(self, dzien):
+        return os.path.join(self.katalog, f"{PREFIKS_PARTYCJI}{dzien}{ROZSZERZENIE}")
+
+    def dni(self):
+        """Posortowana lista dni, dla których istnieją partycje"""
+        try:
+            nazwy = os.listdir(self.katalog)
+        except FileNotFoundError:
+            return []
+        return sorted(n[len(PREFIKS_PARTYCJI):-len(ROZSZERZENIE)] for n in nazwy
+                      if n.startswith(PREFIKS_PARTYCJI) and n.endswith(ROZSZERZENIE))
+
+    def _czytaj_partycje(self, dzien, kolumny, stacje=None):
+        """Tabela Arrow jednej partycji (tylko wskazane kolumny) albo None"""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        from pyarrow import feather
+
+        try:
+            tabela = feather.read_table(self.sciezka(dzien), columns=kolumny, memory_map=True)
+        except FileNotFoundError:
+            return None
+        if stacje:
+            tabela = tabela.filter(pc.is_in(tabela['nazwa'], value_set=pa.array(list(stacje))))
+        return tabela
+
+    def _tabele(self, data=None, od=None, do=None, zmienne=None, stacje=None):
+        """Tabele Arrow kolejnych partycji pasujących do filtrów"""
+        import pyarrow.compute as pc
+
+        zmienne = zmienne or KOLUMNY_POMIAROWE
+        nieznane = set(zmienne) - set(KOLUMNY_POMIAROWE)
+        if nieznane:
+            raise ValueError(f"Nieznane zmienne: {', '.join(sorted(nieznane))}")
+        kolumny = KOLUMNY_OPISU + list(zmienne)
+
+        if data is not None:
+            dni = [data[:10]]
+        elif od is not None and do is not None:
+            dni = list(_dni(od[:10], do[:10]))
+        else:
+            dni = [d for d in self.dni()
+                   if (od is None or d >= od[:10]) and (do is None or d <= do[:10])]
+
+        for dzien in dni:
+            tabela = self._czytaj_partycje(dzien, kolumny, stacje)
+            if tabela is None:
+                continue
+            # Znaczniki godzinowe - zawężenie w obrębie dnia
+            if data is not None and len(data) > 10:
+                tabela = tabela.filter(pc.equal(tabela['data'], data))
+            elif od is not None and len(od) > 10 and dzien == od[:10]:
+                tabela = tabela.filter(pc.greater_equal(tabela['data'], od))
+            yield tabela
+
+    def _pusta_ramka(self, zmienne=None):
+        kolumny = KOLUMNY_OPISU + list(zmienne or KOLUMNY_POMIAROWE)
+        return dataset.przygotuj_ramke(pd.DataFrame(columns=kolumny))
+
+    def pobierz(self, data=None, od=None, do=None, zmienne=None, stacje=None):
+        """
+        Wiersze pasujące do filtrów jako ramka o typach jak z CSV.
+        Czytane są tylko partycje z zakresu dat i tylko potrzebne kolumny.
+        """
+        import pyarrow as pa
+
+        tabele = list(self._tabele(data, od, do, zmienne, stacje))
+        if not tabele:
+            return self._pusta_ramka(zmienne)
+        return dataset.przygotuj_ramke(pa.concat_tables(tabele).to_pandas())
+
+    def porcje(self, od=None, do=None, zmienne=None, stacje=None, rozmiar=50_000):
+        """Wiersze jak w pobierz(), partycja po partycji (w porcjach po `rozmiar`)"""
+        pusto = True
+        for tabela in self._tabele(None, od, do, zmienne, stacje):
+            for start in range(0, tabela.num_rows, rozmiar):
+                pusto = False
+                yield dataset.przygotuj_ramke(tabela.slice(start, rozmiar).to_pandas())
+        if pusto:
+            yield self._pusta_ramka(zmienne)
+
+    def daty(self):
+        """Posortowana lista dostępnych dat (liczona ponownie po zmianie magazynu)"""
+        import pyarrow.compute as pc
+
+        wersja = self.wersja()
+        if self._daty[0] == wersja:
+            return list(self._daty[1])
+
+        daty = []
+        for dzien in self.dni():
+            tabela = self._czytaj_partycje(dzien, ['data'])
+            if tabela is not None:
+                daty.extend(pc.unique(tabela['data']).to_pylist())
+        daty.sort()
+        self._daty = (wersja, daty)
+        return list(daty)
+
+    def wersja(self):
+        """Identyfikator wersji danych - zapis partycji zmienia czas katalogu"""
+        try:
+            st = os.stat(self.katalog)
+        except FileNotFoundError:
+            return "arrow-0"
+        return f"arrow-{st.st_mtime_ns:x}"
+
+    def _zapisz_partycje(self, dzien, df):
+        """Dopisz wiersze do partycji dnia (atomowa podmiana pliku)"""
+        import pyarrow as pa
+        from pyarrow import feather
+
+        nowe = pa.Table.from_pandas(df, preserve_index=False)
+        stara = self._czytaj_partycje(dzien, None)
+        if stara is not None:
+            nowe = pa.concat_tables([stara, nowe.cast(stara.schema)])
+
+        fd, tymczasowy = tempfile.mkstemp(dir=self.katalog, prefix='.tmp-', suffix=ROZSZERZENIE)
+        os.close(fd)
+        try:
+            # Bez kompresji - partycja musi dać się mapować do pamięci
+            feather.write_feather(nowe, tymczasowy, compression='uncompressed')
+            os.replace(tymczasowy, self.sciezka(dzien))
+        except Exception:
+            os.remove(tymczasowy)
+            raise
+
+    def wgraj_ramke(self, df):
+        """Dopisz ramkę do magazynu, dzieląc ją na partycje dzienne"""
+        os.makedirs(self.katalog, exist_ok=True)
+        df = df[[k for k in KOLUMNY_OPISU + KOLUMNY_POMIAROWE if k in df.columns]].copy()
+        df['nazwa'] = df['nazwa'].astype(str)
+        df['data'] = df['data'].astype(str)
+        for kolumna in ('lat', 'lon'):
+            df[kolumna] = df[kolumna].astype('float64')
+        for kolumna in KOLUMNY_POMIAROWE:
+            if kolumna in df.columns:
+                df[kolumna] = pd.to_numeric(df[kolumna], errors='coerce').astype('float32')
+
+        for dzien, grupa in df.groupby(df['data'].str[:10], sort=True):
+            self._zapisz_partycje(dzien, grupa)
+        return len(df)
+
+    def wgraj_csv(self, sciezka, chunksize=500_000):
+        """Wgraj plik CSV porcjami; zwraca liczbę wierszy"""
+        liczba = 0
+        for porcja in pd.read_csv(sciezka, encoding='utf-8', chunksize=chunksize):
+            liczba += self.wgraj_ramke(porcja)
+        return liczba
+
+    def wgraj_parquet(self, sciezka):
+        """Wgraj plik Parquet grupa wierszy po grupie; zwraca liczbę wierszy"""
+        import pyarrow.parquet as pq
+
+        plik = pq.ParquetFile(sciezka)
+        liczba = 0
+        for i in range(plik.num_row_groups):
+            liczba += self.wgraj_ramke(plik.read_row_group(i).to_pandas())
+        return liczba
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wgraj pomiary (CSV lub Parquet) do magazynu kolumnowego")
+    parser.add_argument('pliki', nargs='+', help="pliki CSV / Parquet z pomiarami")
+    parser.add_argument('--katalog', default=STORE_DIR, help="katalog magazynu")
+    args = parser.parse_args()
+
+    magazyn = MagazynKolumnowy(args.katalog)
+    for plik in args.pliki:
+        if plik.endswith('.parquet'):
+            liczba = magazyn.wgraj_parquet(plik)
+        else:
+            liczba = magazyn.wgraj_csv(plik)
+        print(f"✓ Wgrano {liczba} rekordów z {plik}")
+    print(f"✓ Magazyn: {args.katalog} ({len(magazyn.dni())} partycji dziennych)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+"""
+Lekkie metryki wydajności w formacie tekstowym Prometheusa.
+
+Renderery oznaczają kolejne etapy pracy (metrics.etap('dane'),
+metrics.etap('interpolacja'), ...) - czas etapu to czas od poprzedniego
+znacznika. Etapy są zbierane tylko wewnątrz `with metrics.etapy(operacja)`
+i zapisywane jako histogramy po zakończeniu operacji. Wyłączone metryki
+(METRICS_ENABLED=0) sprowadzają każdy znacznik do sprawdzenia jednej flagi.
+
+Metryki są liczone w procesie; procesy robocze kolejki zadań odsyłają swój
+stan razem z wynikiem (stan_i_wyczysc / scal). Przy wielu workerach
+gunicorna (METRICS_DIR ustawiony) każdy worker co METRICS_FLUSH_INTERVAL
+sekund zapisuje swój stan do <METRICS_DIR>/<pid>.json, a /metrics sumuje
+pliki wszystkich procesów - także zakończonych, więc liczniki nie maleją.
+"""
+
+import atexit
+import bisect
+import contextlib
+import functools
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+WLACZONE = os.environ.get("METRICS_ENABLED", "1") == "1"
+PREFIKS = "silesiaair"
+# Katalog stanów procesów (None - metryki tylko bieżącego procesu)
+KATALOG = os.environ.get("METRICS_DIR") or None
+INTERWAL_ZRZUTU = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))
+
+# Granice kubełków histogramów (sekundy)
+KUBELKI = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+OPISY = {
+    'stage_duration_seconds': "Czas etapu renderowania lub raportu",
+    'operation_duration_seconds': "Czas całej operacji (render, raport PDF)",
+    'request_duration_seconds': "Czas obsługi żądania HTTP",
+    'cache_requests_total': "Zapytania do cache (trafienia i chybienia)",
+}
+
+_lock = threading.Lock()
+# nazwa -> {etykiety (krotka par): [liczniki kubełków..., suma, liczba]} lub liczba
+_histogramy = {}
+_liczniki = {}
+_watek = threading.local()
+# Liczba zmian od startu i przy ostatnim zrzucie do KATALOG
+_zmiany = 0
+_zrzucone = None
+_zrzuty = None
+
+
+def _etykiety(**etykiety):
+    return tuple(sorted(etykiety.items()))
+
+
+def obserwuj(nazwa, wartosc, **etykiety):
+    """Dodaj obserwację (w sekundach) do histogramu"""
+    global _zmiany
+    if not WLACZONE:
+        return
+    klucz = _etykiety(**etykiety)
+    i = bisect.bisect_left(KUBELKI, wartosc)
+    with _lock:
+        _zmiany += 1
+        seria = _histogramy.setdefault(nazwa, {}).get(klucz)
+        if seria is None:
+            seria = _histogramy[nazwa][klucz] = [0] * (len(KUBELKI) + 1) + [0.0, 0]
+        seria[i] += 1
+        seria[-2] += wartosc
+        seria[-1] += 1
+
+
+def zwieksz(nazwa, ile=1, **etykiety):
+    """Zwiększ licznik"""
+    global _zmiany
+    if not WLACZONE:
+        return
+    klucz = _etykiety(**etykiety)
+    with _lock:
+        _zmiany += 1
+        serie = _liczniki.setdefault(nazwa, {})
+        serie[klucz] = serie.get(klucz, 0) + ile
+
+
+def cache(nazwa, trafienie):
+    """Zarejestruj trafienie lub chybienie cache o danej nazwie"""
+    zwieksz('cache_requests_total', cache=nazwa, result='hit' if trafienie else 'miss')
+
+
+class _Etapy:
+    """Czasy kolejnych etapów jednej operacji, zapisywane po jej zakończeniu"""
+
+    def __init__(self, operacja):
+        self.operacja = operacja
+        self.start = self.ostatni = time.perf_counter()
+        self.czasy = {}
+
+    def etap(self, nazwa):
+        teraz = time.perf_counter()
+        self.czasy[nazwa] = self.czasy.get(nazwa, 0.0) + teraz - self.ostatni
+        self.ostatni = teraz
+
+    def zapisz(self):
+        for nazwa, czas in self.czasy.items():
+            obserwuj('stage_duration_seconds', czas, operation=self.operacja, stage=nazwa)
+        obserwuj('operation_duration_seconds', time.perf_counter() - self.start,
+                 operation=self.operacja)
+
+
+@contextlib.contextmanager
+def etapy(operacja):
+    """Zbieraj znaczniki etap() z bieżącego wątku jako etapy operacji"""
+    if not WLACZONE:
+        yield
+        return
+    poprzednie = getattr(_watek, 'etapy', None)
+    _watek.etapy = biezace = _Etapy(operacja)
+    try:
+        yield
+    finally:
+        _watek.etapy = poprzednie
+        biezace.zapisz()
+
+
+def sledz(operacja):
+    """Dekorator: całe wywołanie funkcji jako operacja ze znacznikami etapów"""
+    def dekorator(funkcja):
+        if not WLACZONE:
+            return funkcja
+
+        @functools.wraps(funkcja)
+        def opakowana(*args, **kwargs):
+            with etapy(operacja):
+                return funkcja(*args, **kwargs)
+        return opakowana
+    return dekorator
+
+
+def etap(nazwa):
+    """Zakończ etap o danej nazwie (czas od poprzedniego znacznika)"""
+    if not WLACZONE:
+        return
+    biezace = getattr(_watek, 'etapy', None)
+    if biezace is not None:
+        biezace.etap(nazwa)
+
+
+def stan_i_wyczysc():
+    """Zrzut zebranych metryk (do przesłania z procesu roboczego) i wyzerowanie"""
+    global _histogramy, _liczniki
+    with _lock:
+        stan = (_histogramy, _liczniki)
+        _histogramy, _liczniki = {}, {}
+    return stan
+
+
+def _dodaj(histogramy, liczniki, stan):
+    """Dodaj stan (histogramy, liczniki) do słowników docelowych"""
+    for nazwa, serie in stan[0].items():
+        cel = histogramy.setdefault(nazwa, {})
+        for klucz, seria in serie.items():
+            if klucz in cel:
+                cel[klucz] = [a + b for a, b in zip(cel[klucz], seria)]
+            else:
+                cel[klucz] = list(seria)
+    for nazwa, serie in stan[1].items():
+        cel = liczniki.setdefault(nazwa, {})
+        for klucz, wartosc in serie.items():
+            cel[klucz] = cel.get(klucz, 0) + wartosc
+
+
+def scal(stan):
+    """Dodaj metryki zebrane w innym procesie"""
+    global _zmiany
+    if not WLACZONE or stan is None:
+        return
+    with _lock:
+        _dodaj(_histogramy, _liczniki, stan)
+        _zmiany += 1
+
+
+def _kopia():
+    with _lock:
+        return ({n: {k: list(s) for k, s in serie.items()} for n, serie in _histogramy.items()},
+                {n: dict(serie) for n, serie in _liczniki.items()}, _zmiany)
+
+
+def zrzuc():
+    """Zapisz stan procesu do <KATALOG>/<pid>.json (gdy zmienił się od ostatniego zapisu)"""
+    global _zrzucone
+    if not WLACZONE or KATALOG is None:
+        return
+    histogramy, liczniki, zmiany = _kopia()
+    if zmiany == _zrzucone:
+        return
+    dane = {
+        'histogramy': {n: [[list(k), s] for k, s in serie.items()] for n, serie in histogramy.items()},
+        'liczniki': {n: [[list(k), w] for k, w in serie.items()] for n, serie in liczniki.items()},
+    }
+    # Zapis atomowy - czytający /metrics nie widzą połowy pliku
+    fd, tymczasowy = tempfile.mkstemp(dir=KATALOG, prefix='.tmp-', suffix='.json')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(dane, f)
+    os.replace(tymczasowy, os.path.join(KATALOG, f"{os.getpid()}.json"))
+    _zrzucone = zmiany
+
+
+def _wczytaj(sciezka):
+    with open(sciezka, encoding='utf-8') as f:
+        dane = json.load(f)
+
+    def klucz(pary):
+        return tuple((k, v) for k, v in pary)
+    return ({n: {klucz(k): s for k, s in serie} for n, serie in dane['histogramy'].items()},
+            {n: {klucz(k): w for k, w in serie} for n, serie in dane['liczniki'].items()})
+
+
+def przygotuj_katalog():
+    """Pusty KATALOG na stany procesów - w procesie nadrzędnym przed startem workerów"""
+    if KATALOG is None:
+        return
+    os.makedirs(KATALOG, exist_ok=True)
+    for sciezka in glob.glob(os.path.join(KATALOG, '*.json')):
+        os.remove(sciezka)
+
+
+def po_rozwidleniu():
+    """
+    Proces potomny: wyzeruj stan odziedziczony po rodzicu (ten zapisał go
+    już we własnym pliku) i uruchom okresowe zrzuty.
+    """
+    global _histogramy, _liczniki, _zmiany, _zrzucone, _zrzuty
+    with _lock:
+        _histogramy, _liczniki = {}, {}
+        _zmiany, _zrzucone = 0, None
+    _zrzuty = None
+    uruchom_zrzuty()
+
+
+def uruchom_zrzuty(interwal=None):
+    """Wątek okresowo zapisujący stan procesu do KATALOG"""
+    global _zrzuty
+    if not WLACZONE or KATALOG is None:
+        return None
+    with _lock:
+        if _zrzuty is not None and _zrzuty.is_alive():
+            return _zrzuty
+        interwal = interwal or INTERWAL_ZRZUTU
+
+        def petla():
+            while True:
+                time.sleep(interwal)
+                try:
+                    zrzuc()
+                except OSError as e:
+                    print(f"Błąd zapisu metryk: {e}")
+
+        _zrzuty = threading.Thread(target=petla, name='metrics-flush', daemon=True)
+        _zrzuty.start()
+        atexit.register(zrzuc)
+        return _zrzuty
+
+
+def _wartosc_etykiety(wartosc):
+    return str(wartosc).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_etykiet(klucz, **dodatkowe):
+    pary = list(klucz) + list(dodatkowe.items())
+    if not pary:
+        return ''
+    return '{' + ','.join(f'{k}="{_wartosc_etykiety(v)}"' for k, v in pary) + '}'
+
+
+def _naglowek(linie, nazwa, typ, opis):
+    linie.append(f"# HELP {PREFIKS}_{nazwa} {opis}")
+    linie.append(f"# TYPE {PREFIKS}_{nazwa} {typ}")
+
+
+def generuj_tekst():
+    """
+    Wszystkie metryki w formacie tekstowym Prometheusa (wersja 0.0.4) -
+    przy ustawionym KATALOG zsumowane po wszystkich procesach.
+    """
+    if KATALOG is None:
+        histogramy, liczniki, _ = _kopia()
+    else:
+        zrzuc()
+        histogramy, liczniki = {}, {}
+        for sciezka in glob.glob(os.path.join(KATALOG, '*.json')):
+            try:
+                _dodaj(histogramy, liczniki, _wczytaj(sciezka))
+            except (OSError, ValueError) as e:
+                print(f"Pominięto stan metryk {sciezka}: {e}")
+
+    linie = []
+    for nazwa in sorted(histogramy):
+        _naglowek(linie, nazwa, 'histogram', OPISY.get(nazwa, nazwa))
+        for klucz, seria in sorted(histogramy[nazwa].items()):
+            skumulowane = 0
+            for granica, liczba in zip(KUBELKI + ('+Inf',), seria):
+                skumulowane += liczba
+                linie.append(f"{PREFIKS}_{nazwa}_bucket{_format_etykiet(klucz, le=granica)} {skumulowane}")
+            linie.append(f"{PREFIKS}_{nazwa}_sum{_format_etykiet(klucz)} {seria[-2]:.6f}")
+            linie.append(f"{PREFIKS}_{nazwa}_count{_format_etykiet(klucz)} {seria[-1]}")
+
+    for nazwa in sorted(liczniki):
+        _naglowek(linie, nazwa, 'counter', OPISY.get(nazwa, nazwa))
+        for klucz, wartosc in sorted(liczniki[nazwa].items()):
+            linie.append(f"{PREFIKS}_{nazwa}{_format_etykiet(klucz)} {wartosc}")
+
+    # Udział trafień liczony przy odczycie z liczników cache
+    zapytania = liczniki.get('cache_requests_total', {})
+    if zapytania:
+        razem, trafienia = {}, {}
+        for klucz, wartosc in zapytania.items():
+            etykiety = dict(klucz)
+            razem[etykiety['cache']] = razem.get(etykiety['cache'], 0) + wartosc
+            if etykiety['result'] == 'hit':
+                trafienia[etykiety['cache']] = trafienia.get(etykiety['cache'], 0) + wartosc
+        _naglowek(linie, 'cache_hit_ratio', 'gauge', "Udział trafień w zapytaniach do cache")
+        for nazwa_cache in sorted(razem):
+            udzial = trafienia.get(nazwa_cache, 0) / razem[nazwa_cache]
+            linie.append(f"{PREFIKS}_cache_hit_ratio{_format_etykiet((), cache=nazwa_cache)} {udzial:.6f}")
+
+    return '\n'.join(linie) + '\n'
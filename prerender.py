@@ -0,0 +1,106 @@
+"""
+Prerenderowanie archiwum wizualizacji (data × zmienna × metoda).
+
+Obrazy trafiają do trwałego katalogu static/exports/archiwum pod tym samym
+kluczem, którego używa /generuj, więc /wynik serwuje je bez renderowania.
+Gotowe obrazy są pomijane - przerwane uruchomienie można po prostu wznowić.
+
+Przykład (np. z crona co noc):
+    python prerender.py --workers 8
+    python prerender.py --od 2025-01-01 --do 2025-01-31 --metody idw kriging
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+
+def _inicjuj_worker():
+    """Załaduj aplikację (i ciężkie biblioteki) raz na proces roboczy"""
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    import app  # noqa: F401
+
+
+def _renderuj(zadanie):
+    """Wyrenderuj jedno zadanie (data, zmienna, metoda) do archiwum"""
+    import app
+
+    data, zmienna, metoda = zadanie
+    start = time.perf_counter()
+    try:
+        klucz = app.renderuj_obraz(data, zmienna, metoda, magazyn=app.render_archive)
+        blad = None if klucz is not None else "brak danych"
+    except Exception as e:
+        klucz, blad = None, str(e)
+    return zadanie, klucz, blad, time.perf_counter() - start
+
+
+def zaplanuj_zadania(od=None, do=None, zmienne=None, metody=None):
+    """Lista zadań, których obrazów nie ma jeszcze w archiwum"""
+    import app
+
+    # Porównanie dni - pomiary godzinowe z dnia `do` też są w zakresie
+    daty = [d for d in app.get_available_dates()
+            if (od is None or d[:10] >= od) and (do is None or d[:10] <= do)]
+    zmienne = zmienne or list(app.MAPA_ZMIENNYCH)
+    metody = metody or list(app.RENDERERY)
+
+    zadania = []
+    for data in daty:
+        for zmienna in zmienne:
+            for metoda in metody:
+                klucz = app.klucz_obrazu(data, zmienna, metoda)
+                if app.render_archive.pobierz(klucz) is None:
+                    zadania.append((data, zmienna, metoda))
+    return zadania
+
+
+def prerenderuj(zadania, workers=None):
+    """Wyrenderuj zadania w puli procesów; zwraca (udane, nieudane)"""
+    if not zadania:
+        print("✓ Wszystkie obrazy są już w archiwum")
+        return 0, 0
+
+    workers = workers or os.cpu_count() or 1
+    print(f"Renderowanie {len(zadania)} obrazów w {workers} procesach...")
+
+    udane = nieudane = 0
+    start = time.perf_counter()
+    # spawn - procesy robocze nie dziedziczą wątków ani blokad rodzica
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                             initializer=_inicjuj_worker) as pool:
+        futures = [pool.submit(_renderuj, zadanie) for zadanie in zadania]
+        for i, future in enumerate(as_completed(futures), 1):
+            (data, zmienna, metoda), klucz, blad, czas = future.result()
+            if blad is None:
+                udane += 1
+                status = "✓"
+            else:
+                nieudane += 1
+                status = f"✗ {blad}"
+            print(f"[{i}/{len(zadania)}] {data} {zmienna} {metoda} {status} ({czas:.2f} s)")
+
+    print(f"\n✓ Gotowe: {udane} obrazów, błędy: {nieudane}, czas: {time.perf_counter() - start:.1f} s")
+    return udane, nieudane
+
+
+def main():
+    import app
+
+    parser = argparse.ArgumentParser(description="Prerenderuj archiwum wizualizacji")
+    parser.add_argument('--od', help="pierwsza data (YYYY-MM-DD)")
+    parser.add_argument('--do', help="ostatnia data (YYYY-MM-DD)")
+    parser.add_argument('--zmienne', nargs='+', choices=list(app.MAPA_ZMIENNYCH), help="zmienne (domyślnie wszystkie)")
+    parser.add_argument('--metody', nargs='+', choices=list(app.RENDERERY), help="metody (domyślnie wszystkie)")
+    parser.add_argument('--workers', type=int, default=None, help="liczba procesów (domyślnie liczba rdzeni)")
+    args = parser.parse_args()
+
+    zadania = zaplanuj_zadania(args.od, args.do, args.zmienne, args.metody)
+    _, nieudane = prerenderuj(zadania, args.workers)
+    return 1 if nieudane else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
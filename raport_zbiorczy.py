@@ -0,0 +1,239 @@
+"""
+Zbiorczy raport PDF dla zakresu dat, wielu zmiennych i metod (np. miesięczny
+raport smogowy GZM).
+
+Obrazy stron są renderowane równolegle w puli procesów (CLI) albo kolejno
+w procesie zadania w tle aplikacji (/generuj_raport), a dokument jest
+składany na bieżąco: strona jest układana, gdy tylko jej obraz jest
+gotowy, a kolejne w tym czasie wciąż się renderują. W toku jest najwyżej `okno` zleceń, a w
+pamięci naraz jeden zmniejszony obraz, więc pamięć nie rośnie z liczbą
+stron (poza skompresowanymi stronami samego PDF). Statystyki całego okresu
+pochodzą z jednego przebiegu po wierszach zakresu, a dzienne z tabeli
+statystyk (statystyki.py).
+
+Przykład:
+    python raport_zbiorczy.py --od 2025-01-01 --do 2025-01-31 -o smog_2025-01.pdf
+    python raport_zbiorczy.py --od 2025-01-01 --do 2025-01-07 --zmienne pm25 temp --metody idw kriging
+"""
+
+import argparse
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Flowable, PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table
+
+import metrics
+import raporty
+import statystyki
+
+TYTUL = "silesiaAIR - Raport Zbiorczy"
+
+# Kolumny tabel statystyk: (nagłówek, miara, format)
+KOLUMNY_OKRESU = [
+    ("N", 'n', "{}"), ("Min", 'min', "{:.2f}"), ("Średnia", 'srednia', "{:.2f}"),
+    ("Mediana", 'mediana', "{:.2f}"), ("Maks", 'max', "{:.2f}"), ("Odch. std.", 'std', "{:.2f}"),
+]
+KOLUMNY_DZIENNE = [
+    ("N", 'n', "{}"), ("Min", 'min', "{:.2f}"), ("Średnia", 'srednia', "{:.2f}"),
+    ("Maks", 'max', "{:.2f}"),
+]
+
+
+class ZleceniaStron:
+    """
+    Obrazy stron zlecane z wyprzedzeniem najwyżej `okno` zadań.
+    zlec(zadanie) zleca render i zwraca funkcję czekającą na obraz strony
+    (obraz_strony) albo None, gdy brak danych.
+    """
+
+    def __init__(self, zadania, zlec, okno):
+        self.zadania = zadania
+        self.zlec = zlec
+        self.okno = max(1, okno)
+        self._oczekujace = {}
+        self._nastepne = 0
+
+    def _dozlec(self, do):
+        while self._nastepne < min(do, len(self.zadania)):
+            self._oczekujace[self._nastepne] = self.zlec(self.zadania[self._nastepne])
+            self._nastepne += 1
+
+    def start(self):
+        """Zleć pierwsze renderowania (przed układaniem stron tytułowych)"""
+        self._dozlec(self.okno)
+
+    def obraz(self, i):
+        """Poczekaj na obraz strony i (zlecając kolejne)"""
+        self._dozlec(i + 1 + self.okno)
+        return self._oczekujace.pop(i)()
+
+
+class ObrazStrony(Flowable):
+    """Obraz strony wczytywany dopiero przy układaniu i zwalniany po narysowaniu"""
+
+    def __init__(self, zlecenia, indeks):
+        super().__init__()
+        self.zlecenia = zlecenia
+        self.indeks = indeks
+        self._obraz = None
+        self._komunikat = None
+
+    def _wczytaj(self):
+        try:
+            self._obraz = self.zlecenia.obraz(self.indeks)
+        except Exception as e:
+            self._komunikat = f"Błąd renderowania: {e}"
+            return
+        if self._obraz is None:
+            self._komunikat = "Brak danych dla wybranych parametrów"
+
+    def wrap(self, dostepna_szerokosc, dostepna_wysokosc):
+        if self._obraz is None and self._komunikat is None:
+            self._wczytaj()
+        if self._obraz is None:
+            self.width, self.height = dostepna_szerokosc, 0.3 * inch
+        else:
+            _, szerokosc, wysokosc = self._obraz
+            skala = min(dostepna_szerokosc / szerokosc, dostepna_wysokosc / wysokosc)
+            self.width, self.height = szerokosc * skala, wysokosc * skala
+        return self.width, self.height
+
+    def draw(self):
+        if self._obraz is None:
+            self.canv.drawString(0, 0, self._komunikat)
+            return
+        self.canv.drawImage(ImageReader(io.BytesIO(self._obraz[0])), 0, 0, self.width, self.height)
+        # Obraz jest już w dokumencie - nie trzymamy go do końca budowania
+        self._obraz = (None,) + self._obraz[1:]
+
+
+def _tabela(naglowek, wiersze, szerokosci):
+    tabela = Table([naglowek] + wiersze, colWidths=szerokosci, repeatRows=1)
+    tabela.setStyle(raporty.STYL_STATYSTYK_ZBIORCZYCH)
+    return tabela
+
+
+def _komorki(staty, kolumny):
+    return [format_.format(staty[miara]) for _, miara, format_ in kolumny]
+
+
+@metrics.sledz('raport_zbiorczy')
+def zbuduj_raport(plik, od, do, zmienne, metody, zlec, okno):
+    """
+    Zapisz raport zbiorczy do pliku (ścieżka albo obiekt pliku).
+    Zwraca liczbę stron z wizualizacjami albo None, gdy w zakresie brak danych.
+    """
+    import app
+
+    daty = [d for d in app.get_available_dates() if od <= d[:10] <= do]
+    if not daty:
+        return None
+    kolumny = {zmienna: app.MAPA_ZMIENNYCH[zmienna][1] for zmienna in zmienne}
+
+    # Jeden przebieg po wierszach zakresu - statystyki całego okresu
+    wiersze = app.load_data_range(od, do, list(kolumny.values()))
+    okres = statystyki.podsumuj(wiersze, list(kolumny.values())) if wiersze is not None else {}
+    del wiersze
+    dzienne = app.tabela_statystyk()
+    metrics.etap('statystyki')
+
+    zadania = [(data, zmienna, metoda) for data in daty for zmienna in zmienne for metoda in metody]
+    zlecenia = ZleceniaStron(zadania, zlec, okno)
+    zlecenia.start()
+
+    story = [
+        Paragraph(TYTUL, raporty.STYL_TYTULU),
+        Spacer(1, 0.2*inch),
+    ]
+    metadane = Table([
+        ['Zakres dat:', f"{od} – {do} ({len(daty)} dni)"],
+        ['Zmienne:', ", ".join(z.upper() for z in zmienne)],
+        ['Metody:', ", ".join(m.upper() for m in metody)],
+        ['Data raportu:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
+    ], colWidths=[2*inch, 4*inch])
+    metadane.setStyle(raporty.STYL_METADANYCH)
+    story += [metadane, Spacer(1, 0.3*inch)]
+
+    story.append(Paragraph("Podsumowanie okresu", raporty.STYL_NAGLOWKA))
+    wiersze_okresu = [[zmienna.upper()] + _komorki(okres[kolumna], KOLUMNY_OKRESU)
+                      for zmienna, kolumna in kolumny.items() if kolumna in okres]
+    story += [_tabela(["Zmienna"] + [k[0] for k in KOLUMNY_OKRESU], wiersze_okresu,
+                      [1.2*inch] + [0.8*inch] * len(KOLUMNY_OKRESU)),
+              Spacer(1, 0.3*inch)]
+
+    if dzienne is not None:
+        for zmienna, kolumna in kolumny.items():
+            rekordy = dzienne.zakres(od, do, [kolumna])
+            wiersze_dni = [[rekord['data']] + _komorki(rekord, KOLUMNY_DZIENNE)
+                           for rekord in rekordy.to_dict('records')]
+            story += [Paragraph(f"Statystyki dzienne – {zmienna.upper()}", raporty.STYL_NAGLOWKA),
+                      _tabela(["Data"] + [k[0] for k in KOLUMNY_DZIENNE], wiersze_dni,
+                              [1.6*inch] + [1.0*inch] * len(KOLUMNY_DZIENNE)),
+                      Spacer(1, 0.3*inch)]
+
+    for i, (data, zmienna, metoda) in enumerate(zadania):
+        story += [PageBreak(),
+                  Paragraph(f"{data} – {zmienna.upper()} – {metoda.upper()}", raporty.STYL_NAGLOWKA),
+                  Spacer(1, 0.1*inch),
+                  ObrazStrony(zlecenia, i)]
+
+    doc = SimpleDocTemplate(plik, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch,
+                            title=f"{TYTUL} {od} – {do}")
+    doc.build(story)
+    metrics.etap('pdf')
+    return len(zadania)
+
+
+def obraz_strony(klucz):
+    """(JPEG, szerokość, wysokość) zmniejszonego obrazu o danym kluczu albo None"""
+    import app
+    dane = app.bajty_obrazu(klucz) if klucz is not None else None
+    return raporty.obraz_do_raportu(None, dane) if dane is not None else None
+
+
+def _renderuj(zadanie):
+    """Obraz strony w procesie roboczym - render i zmniejszenie poza procesem składającym PDF"""
+    import app
+    return obraz_strony(app.renderuj_obraz(*zadanie))
+
+
+def main():
+    import app
+    from prerender import _inicjuj_worker
+
+    parser = argparse.ArgumentParser(description="Zbiorczy raport PDF dla zakresu dat")
+    parser.add_argument('--od', required=True, help="pierwsza data (YYYY-MM-DD)")
+    parser.add_argument('--do', required=True, help="ostatnia data (YYYY-MM-DD)")
+    parser.add_argument('--zmienne', nargs='+', choices=list(app.MAPA_ZMIENNYCH), default=['pm25'],
+                        help="zmienne (domyślnie pm25)")
+    parser.add_argument('--metody', nargs='+', choices=list(app.RENDERERY), default=['idw'],
+                        help="metody (domyślnie idw)")
+    parser.add_argument('--workers', type=int, default=None, help="liczba procesów (domyślnie liczba rdzeni)")
+    parser.add_argument('-o', '--wyjscie', default=None, help="plik PDF (domyślnie raport_<od>_<do>.pdf)")
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count() or 1
+    wyjscie = args.wyjscie or f"raport_{args.od}_{args.do}.pdf"
+    start = time.perf_counter()
+    # spawn - procesy robocze nie dziedziczą wątków ani blokad rodzica
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                             initializer=_inicjuj_worker) as pool:
+        strony = zbuduj_raport(wyjscie, args.od, args.do, args.zmienne, args.metody,
+                               lambda zadanie: pool.submit(_renderuj, zadanie).result,
+                               okno=2 * workers)
+    if strony is None:
+        print("✗ Brak danych w wybranym zakresie dat")
+        return 1
+    print(f"✓ {wyjscie}: {strony} wizualizacji, czas: {time.perf_counter() - start:.1f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
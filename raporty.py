@@ -0,0 +1,290 @@
+"""
+Silnik raportów PDF budujący dokumenty w pamięci.
+
+Backend jest wybierany raz przy imporcie: pdfkit tylko wtedy, gdy jest
+zainstalowany razem z programem wkhtmltopdf (PDF_ENGINE=auto, domyślnie),
+w przeciwnym razie reportlab - bez prób uruchomienia pdfkit przy każdym
+raporcie. Style akapitów i tabel powstają raz na proces. Obraz wizualizacji
+jest zmniejszany do rozdzielczości wydruku i zapamiętywany jako JPEG, który
+reportlab osadza bez ponownego kodowania. Wynikiem są bajty PDF - bez
+plików pośrednich HTML/PDF na dysku.
+"""
+
+import html
+import io
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Image, PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+import metrics
+
+TYTUL = "silesiaAIR - Raport Wizualizacji Danych"
+
+# Szerokość obrazu na stronie i rozdzielczość, do której jest zmniejszany
+SZEROKOSC_OBRAZU = 6.5 * inch
+MAKS_WYSOKOSC_OBRAZU = 8.5 * inch
+DPI_OBRAZU = 150
+JAKOSC_OBRAZU = 85
+# Liczba zmniejszonych obrazów zapamiętanych w procesie
+MAX_OBRAZOW = 32
+
+# (nagłówek sekcji, [(etykieta, miara, format)])
+SEKCJE_STATYSTYK = [
+    ("Miary Tendencji Centralnej", [
+        ("Średnia (Mean):", 'srednia', "{:.4f}"),
+        ("Mediana (Median):", 'mediana', "{:.4f}"),
+    ]),
+    ("Miary Rozproszenia", [
+        ("Minimalna wartość (Min):", 'min', "{:.4f}"),
+        ("Maksymalna wartość (Max):", 'max', "{:.4f}"),
+        ("Zakres (Range):", 'zakres', "{:.4f}"),
+        ("Odchylenie Standardowe (Std Dev):", 'std', "{:.4f}"),
+        ("Wariancja (Variance):", 'wariancja', "{:.4f}"),
+        ("Współczynnik Zmienności (CV %):", 'cv', "{:.2f}%"),
+    ]),
+    ("Kwartyle i Percentyle", [
+        ("Q1 (25. percentyl):", 'q1', "{:.4f}"),
+        ("Q3 (75. percentyl):", 'q3', "{:.4f}"),
+        ("IQR (Rozstęp międzykwartylowy):", 'iqr', "{:.4f}"),
+    ]),
+    ("Liczebność Próby", [
+        ("Liczba obserwacji (N):", 'n', "{}"),
+    ]),
+]
+
+OPCJE_PDFKIT = {
+    'encoding': 'UTF-8',
+    'quiet': '',
+    'margin-top': '0.5in',
+    'margin-bottom': '0.5in',
+    'margin-left': '0.5in',
+    'margin-right': '0.5in',
+}
+
+
+def _wybierz_silnik():
+    """'pdfkit' albo 'reportlab' według PDF_ENGINE i dostępności wkhtmltopdf"""
+    wybor = os.environ.get("PDF_ENGINE", "auto")
+    if wybor in ('auto', 'pdfkit'):
+        try:
+            import pdfkit
+            pdfkit.configuration()  # OSError, gdy brak programu wkhtmltopdf
+            return 'pdfkit'
+        except (ImportError, OSError) as e:
+            if wybor == 'pdfkit':
+                print(f"pdfkit niedostępny ({e}), raporty przez reportlab")
+    return 'reportlab'
+
+
+SILNIK = _wybierz_silnik()
+
+# Style reportlab - tworzone raz na proces
+_style = getSampleStyleSheet()
+STYL_TYTULU = ParagraphStyle(
+    'CustomTitle',
+    parent=_style['Heading1'],
+    fontSize=24,
+    textColor=colors.HexColor('#1f2937'),
+    spaceAfter=30,
+    alignment=TA_CENTER,
+    fontName='Helvetica-Bold'
+)
+STYL_NAGLOWKA = ParagraphStyle(
+    'CustomHeading',
+    parent=_style['Heading2'],
+    fontSize=14,
+    textColor=colors.HexColor('#374151'),
+    spaceAfter=12,
+    fontName='Helvetica-Bold'
+)
+
+
+def _styl_tabeli(tlo_etykiet, siatka):
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor(tlo_etykiet)),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#1f2937')),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor(siatka))
+    ])
+
+
+STYL_METADANYCH = _styl_tabeli('#e5e7eb', '#d1d5db')
+STYL_STATYSTYK = _styl_tabeli('#f3f4f6', '#e5e7eb')
+# Tabele z wierszem nagłówka (raport zbiorczy)
+STYL_STATYSTYK_ZBIORCZYCH = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor('#1f2937')),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.HexColor('#f3f4f6'), colors.white]),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb'))
+])
+
+_obrazy = OrderedDict()
+_lock = threading.Lock()
+
+
+def obraz_do_raportu(klucz, dane):
+    """
+    (JPEG, szerokość, wysokość w pikselach) obrazu zmniejszonego do
+    DPI_OBRAZU na szerokości strony; wynik zapamiętany pod kluczem obrazu.
+    """
+    with _lock:
+        wynik = _obrazy.get(klucz) if klucz is not None else None
+        if wynik is not None:
+            _obrazy.move_to_end(klucz)
+    metrics.cache('obrazy_raportu', wynik is not None)
+    if wynik is not None:
+        return wynik
+
+    from PIL import Image as ObrazPIL
+
+    obraz = ObrazPIL.open(io.BytesIO(dane)).convert('RGB')
+    szerokosc = int(SZEROKOSC_OBRAZU / inch * DPI_OBRAZU)
+    if obraz.width > szerokosc:
+        obraz = obraz.resize((szerokosc, round(obraz.height * szerokosc / obraz.width)),
+                             ObrazPIL.LANCZOS)
+    bufor = io.BytesIO()
+    obraz.save(bufor, format='JPEG', quality=JAKOSC_OBRAZU)
+    wynik = (bufor.getvalue(), obraz.width, obraz.height)
+
+    if klucz is None:
+        return wynik
+    with _lock:
+        _obrazy[klucz] = wynik
+        while len(_obrazy) > MAX_OBRAZOW:
+            _obrazy.popitem(last=False)
+    return wynik
+
+
+def _metadane(data_pomiaru, zmienna, metoda):
+    return [
+        ['Data:', data_pomiaru],
+        ['Zmienna:', zmienna.upper()],
+        ['Metoda:', metoda.upper()],
+        ['Data raportu:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')]
+    ]
+
+
+def _pdf_reportlab(metadane, staty, metoda, obraz):
+    bufor = io.BytesIO()
+    doc = SimpleDocTemplate(bufor, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
+
+    metadata_table = Table(metadane, colWidths=[2*inch, 4*inch])
+    metadata_table.setStyle(STYL_METADANYCH)
+    story = [Paragraph(TYTUL, STYL_TYTULU), Spacer(1, 0.2*inch), metadata_table, Spacer(1, 0.3*inch)]
+
+    for naglowek, wiersze in SEKCJE_STATYSTYK:
+        tabela = Table([[etykieta, format_.format(staty[miara])] for etykieta, miara, format_ in wiersze],
+                       colWidths=[2.5*inch, 3.5*inch])
+        tabela.setStyle(STYL_STATYSTYK)
+        story += [Paragraph(naglowek, STYL_NAGLOWKA), tabela, Spacer(1, 0.2*inch)]
+    story += [Paragraph(f"Metoda: {html.escape(metoda)}", STYL_NAGLOWKA), Spacer(1, 0.3*inch)]
+
+    if obraz is not None:
+        jpeg, szerokosc, wysokosc = obraz
+        # Proporcje obrazu zachowane, wysokość ograniczona do strony
+        skala = min(SZEROKOSC_OBRAZU / szerokosc, MAKS_WYSOKOSC_OBRAZU / wysokosc)
+        story += [PageBreak(), Paragraph("Wizualizacja", STYL_NAGLOWKA), Spacer(1, 0.2*inch),
+                  Image(io.BytesIO(jpeg), width=szerokosc * skala, height=wysokosc * skala)]
+
+    doc.build(story)
+    return bufor.getvalue()
+
+
+_KOMORKA = "border: 1px solid #e5e7eb; padding: 10px;"
+
+
+def _html(metadane, staty, obraz):
+    wiersze_metadanych = "".join(
+        f'<div class="metadata-row"><span class="metadata-label">{etykieta}</span>'
+        f'<span>{html.escape(str(wartosc))}</span></div>'
+        for etykieta, wartosc in metadane)
+
+    sekcje = []
+    for naglowek, wiersze in SEKCJE_STATYSTYK:
+        sekcje.append(f'<tr style="background-color: #f0f9ff;"><td colspan="2" style="{_KOMORKA} '
+                      f'font-weight: bold; text-align: center; background-color: #3b82f6; '
+                      f'color: white;">{naglowek}</td></tr>')
+        for i, (etykieta, miara, format_) in enumerate(wiersze):
+            tlo = ' style="background-color: #f3f4f6;"' if i % 2 == 0 else ''
+            sekcje.append(f'<tr{tlo}><td style="{_KOMORKA} font-weight: bold; width: 50%;">{etykieta}</td>'
+                          f'<td style="{_KOMORKA}">{format_.format(staty[miara])}</td></tr>')
+
+    img_html = ""
+    if obraz is not None:
+        import base64
+        src = "data:image/jpeg;base64," + base64.b64encode(obraz[0]).decode('ascii')
+        img_html = f'<img src="{src}" style="width: 100%; max-width: 600px; margin: 20px 0;">'
+
+    return f"""<!DOCTYPE html>
+<html lang="pl">
+<head>
+<meta charset="UTF-8">
+<style>
+    body {{ font-family: Arial, sans-serif; color: #1f2937; line-height: 1.6; margin: 20px; }}
+    h1 {{ color: #1f2937; text-align: center; font-size: 24px; margin-bottom: 30px; }}
+    h2 {{ color: #374151; font-size: 14px; margin-top: 20px; margin-bottom: 12px; }}
+    .metadata {{ background-color: #f3f4f6; border: 1px solid #d1d5db; border-radius: 4px; padding: 15px; margin-bottom: 20px; }}
+    .metadata-row {{ display: flex; margin: 8px 0; }}
+    .metadata-label {{ font-weight: bold; width: 150px; }}
+    table {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}
+</style>
+</head>
+<body>
+    <h1>{TYTUL}</h1>
+    <div class="metadata">{wiersze_metadanych}</div>
+    <h2>Statystyki Danych</h2>
+    <table>{"".join(sekcje)}</table>
+    <h2>Wizualizacja</h2>
+    {img_html}
+    <footer style="margin-top: 40px; padding-top: 20px; border-top: 1px solid #d1d5db; color: #6b7280; font-size: 12px; text-align: center;">
+        &copy; 2025 silesiaAIR. Wizualizacja Danych Geoprzestrzennych dla GZM.
+    </footer>
+</body>
+</html>
+"""
+
+
+def zbuduj(data_pomiaru, zmienna, metoda, staty, klucz=None, dane_obrazu=None):
+    """
+    Bajty raportu PDF: metadane, statystyki (słownik miar z statystyki.py)
+    i opcjonalnie obraz wizualizacji (zakodowane bajty o danym kluczu).
+    """
+    obraz = obraz_do_raportu(klucz, dane_obrazu) if dane_obrazu is not None else None
+    metrics.etap('obraz')
+    metadane = _metadane(data_pomiaru, zmienna, metoda)
+
+    if SILNIK == 'pdfkit':
+        import pdfkit
+        try:
+            pdf = pdfkit.from_string(_html(metadane, staty, obraz), False, options=OPCJE_PDFKIT)
+            metrics.etap('pdfkit')
+            return pdf
+        except Exception as e:
+            metrics.etap('pdfkit')
+            print(f"pdfkit nie zadziałał ({e}), używam reportlab")
+
+    pdf = _pdf_reportlab(metadane, staty, metoda, obraz)
+    metrics.etap('reportlab')
+    return pdf
+
+
+def wyczysc():
+    """Usuń zapamiętane obrazy raportów"""
+    with _lock:
+        _obrazy.clear()
@@ -0,0 +1,160 @@
+"""
+Dyskowy cache wyrenderowanych obrazów adresowany treścią parametrów.
+
+Klucz to skrót SHA-256 z parametrów wizualizacji (data, zmienna, metoda,
+parametry metody) i wersji zbioru danych. Rozmiar katalogu jest ograniczany
+usuwaniem najdawniej używanych plików (LRU po czasie modyfikacji, który
+odświeżamy przy każdym trafieniu).
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Zmiana wyglądu wykresów w kodzie musi unieważnić stare obrazy
+WERSJA_RENDERERA = 2
+
+PREFIKS_TYMCZASOWY = '.tmp-'
+
+# Pliki tymczasowe starsze niż to pochodzą z przerwanych zapisów
+MAX_WIEK_TYMCZASOWYCH = 3600
+
+
+def poprawny_klucz(klucz):
+    """Czy tekst wygląda na klucz wygenerowany przez klucz_renderu"""
+    return len(klucz) == 32 and all(c in '0123456789abcdef' for c in klucz)
+
+
+def klucz_renderu(data, zmienna, metoda, wersja_danych, parametry=None, rozszerzenie='png'):
+    """Skrót jednoznacznie identyfikujący obraz dla danych parametrów"""
+    opis = {
+        'data': data,
+        'zmienna': zmienna,
+        'metoda': metoda,
+        'parametry': parametry or {},
+        'wersja_danych': wersja_danych,
+        'wersja_renderera': WERSJA_RENDERERA,
+        'format': rozszerzenie,
+    }
+    tekst = json.dumps(opis, sort_keys=True, default=str)
+    return hashlib.sha256(tekst.encode('utf-8')).hexdigest()[:32]
+
+
+class RenderCache:
+    """
+    Katalog plików <klucz>.<rozszerzenie> z limitem rozmiaru (None - bez limitu).
+    Limit obejmuje wszystkie artefakty w katalogu, także raporty PDF
+    i znaczniki zadań zapisywane obok obrazów.
+    """
+
+    def __init__(self, katalog, max_bajtow, rozszerzenie='png'):
+        self.katalog = katalog
+        self.max_bajtow = max_bajtow
+        self.rozszerzenie = rozszerzenie
+        self._lock = threading.Lock()
+        os.makedirs(katalog, exist_ok=True)
+
+    def sciezka(self, klucz):
+        return os.path.join(self.katalog, f"{klucz}.{self.rozszerzenie}")
+
+    def pobierz(self, klucz):
+        """Ścieżka do obrazu z cache albo None; trafienie odświeża pozycję LRU"""
+        sciezka = self.sciezka(klucz)
+        try:
+            os.utime(sciezka)
+        except FileNotFoundError:
+            return None
+        return sciezka
+
+    def zapisz(self, klucz, zapisz_do):
+        """
+        Zapisz obraz pod kluczem. zapisz_do(sciezka) tworzy plik - zapis idzie
+        do pliku tymczasowego i jest atomowo przenoszony, więc równoległe
+        żądania nigdy nie widzą połowy obrazu.
+        """
+        fd, tymczasowy = tempfile.mkstemp(dir=self.katalog, prefix=PREFIKS_TYMCZASOWY,
+                                      suffix=f".{self.rozszerzenie}")
+        os.close(fd)
+        try:
+            zapisz_do(tymczasowy)
+            os.replace(tymczasowy, self.sciezka(klucz))
+        except Exception:
+            try:
+                os.remove(tymczasowy)
+            except OSError:
+                pass
+            raise
+        self.przytnij()
+        return self.sciezka(klucz)
+
+    def przytnij(self):
+        """Usuń najdawniej używane artefakty, aż katalog zmieści się w limicie"""
+        if self.max_bajtow is None:
+            return
+        with self._lock:
+            pliki = []
+            razem = 0
+            with os.scandir(self.katalog) as it:
+                for wpis in it:
+                    # Pliki tymczasowe to trwające zapisy - usuwa je sprzataj
+                    if wpis.name.startswith(PREFIKS_TYMCZASOWY):
+                        continue
+                    try:
+                        if not wpis.is_file():
+                            continue
+                        st = wpis.stat()
+                    except FileNotFoundError:
+                        continue
+                    pliki.append((st.st_mtime, st.st_size, wpis.path))
+                    razem += st.st_size
+
+            if razem <= self.max_bajtow:
+                return
+
+            for _, rozmiar, sciezka in sorted(pliki):
+                try:
+                    os.remove(sciezka)
+                except FileNotFoundError:
+                    pass
+                razem -= rozmiar
+                if razem <= self.max_bajtow:
+                    break
+
+    def sprzataj(self, max_wiek):
+        """Usuń artefakty nieużywane dłużej niż max_wiek sekund"""
+        teraz = time.time()
+        usuniete = 0
+        with os.scandir(self.katalog) as it:
+            for wpis in it:
+                try:
+                    if not wpis.is_file():
+                        continue
+                    limit = MAX_WIEK_TYMCZASOWYCH if wpis.name.startswith(PREFIKS_TYMCZASOWY) else max_wiek
+                    if teraz - wpis.stat().st_mtime > limit:
+                        os.remove(wpis.path)
+                        usuniete += 1
+                except FileNotFoundError:
+                    continue
+        self.przytnij()
+        return usuniete
+
+    def uruchom_sprzatanie(self, max_wiek, interwal):
+        """Uruchom w tle wątek okresowo usuwający przeterminowane artefakty"""
+        with self._lock:
+            if getattr(self, '_sprzatacz', None) is not None and self._sprzatacz.is_alive():
+                return self._sprzatacz
+
+            def petla():
+                while True:
+                    try:
+                        self.sprzataj(max_wiek)
+                    except Exception as e:
+                        print(f"Błąd sprzątania cache: {e}")
+                    time.sleep(interwal)
+
+            self._sprzatacz = threading.Thread(target=petla, name='render-cache-janitor', daemon=True)
+            self._sprzatacz.start()
+            return self._sprzatacz
@@ -0,0 +1,102 @@
+"""
+Warstwa stacji pomiarowych współdzielona przez renderery map.
+
+Współrzędne stacji są stałe dla nazwy, więc układ stacji (współrzędne,
+etykiety, GeoDataFrame z geometrią z gpd.points_from_xy) powstaje raz i jest
+zapamiętywany; dla kolejnych dat dołączane są tylko wartości pomiarów.
+Żadna ścieżka nie przechodzi po wierszach ramki w Pythonie (apply/iterrows).
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+
+# Liczba zapamiętanych układów stacji (zwykle wszystkie daty mają ten sam)
+MAX_UKLADOW = 16
+
+# Przesunięcie etykiety względem punktu (stopnie)
+PRZESUNIECIE_ETYKIETY = (0.015, 0.008)
+
+STYL_ETYKIETY = dict(fontsize=9, color='darkblue', fontweight='bold', zorder=20)
+RAMKA_ETYKIETY = dict(boxstyle='round,pad=0.35', facecolor='white', alpha=0.95,
+                      edgecolor='gray', linewidth=1.5)
+
+
+class UkladStacji:
+    """Stałe dane stacji jednej daty: nazwy, współrzędne i geometria"""
+
+    def __init__(self, nazwy, x, y):
+        self.nazwy = nazwy
+        self.x = x  # długość geograficzna
+        self.y = y  # szerokość geograficzna
+        self._gdf = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.nazwy)
+
+    def gdf(self):
+        """GeoDataFrame stacji (nazwa, geometry) - budowany przy pierwszym użyciu"""
+        with self._lock:
+            if self._gdf is None:
+                import geopandas as gpd
+                self._gdf = gpd.GeoDataFrame(
+                    {'nazwa': self.nazwy},
+                    geometry=gpd.points_from_xy(self.x, self.y),
+                    crs="EPSG:4326",
+                )
+            return self._gdf
+
+    def z_wartosciami(self, df, kolumna):
+        """Warstwa stacji z wartościami kolumny z ramki tej samej daty"""
+        return self.gdf().assign(**{kolumna: df[kolumna].to_numpy()})
+
+    def etykiety(self, ax, ramka=None, **styl):
+        """Dodaj etykiety nazw stacji (styl i ramka wspólne dla wszystkich)"""
+        styl = {**STYL_ETYKIETY, **styl, 'bbox': {**RAMKA_ETYKIETY, **(ramka or {})}}
+        dx, dy = PRZESUNIECIE_ETYKIETY
+        return [ax.text(x, y, nazwa, **styl)
+                for x, y, nazwa in zip(self.x + dx, self.y + dy, self.nazwy)]
+
+
+_uklady = OrderedDict()
+_lock = threading.Lock()
+
+
+def uklad_stacji(df):
+    """
+    Układ stacji ramki jednej daty (kolumny nazwa, lat, lon). Ten sam zestaw
+    stacji w tej samej kolejności zwraca zapamiętany obiekt.
+    """
+    x = df['lon'].to_numpy(dtype=float)
+    y = df['lat'].to_numpy(dtype=float)
+    nazwy = tuple(df['nazwa'].astype(str))
+    klucz = (nazwy, x.tobytes(), y.tobytes())
+
+    with _lock:
+        uklad = _uklady.get(klucz)
+        if uklad is not None:
+            _uklady.move_to_end(klucz)
+    metrics.cache('stacje', uklad is not None)
+    if uklad is not None:
+        return uklad
+
+    # Kopie tylko do odczytu - nie przytrzymują współdzielonego zbioru danych
+    x, y = x.copy(), y.copy()
+    x.flags.writeable = y.flags.writeable = False
+    uklad = UkladStacji(list(nazwy), x, y)
+    with _lock:
+        uklad = _uklady.setdefault(klucz, uklad)
+        _uklady.move_to_end(klucz)
+        while len(_uklady) > MAX_UKLADOW:
+            _uklady.popitem(last=False)
+    return uklad
+
+
+def wyczysc():
+    """Usuń zapamiętane układy stacji"""
+    with _lock:
+        _uklady.clear()
@@ -0,0 +1,224 @@
+"""
+Statystyki opisowe pomiarów dla każdej pary (data, zmienna).
+
+Tabela powstaje jednym przebiegiem po całym zbiorze: wartości wszystkich
+kolumn pomiarowych są raz sortowane po (grupa, wartość), gdzie grupa to para
+(zmienna, data). Liczności, sumy i sumy kwadratów odchyleń dają np.bincount,
+a minimum, maksimum, mediana i kwartyle to odczyty z granic grup posortowanej
+tablicy. Wynik - mała ramka data × zmienna - jest zapamiętywany dla wersji
+danych, więc raport PDF, wykresy i /api/stats nie sięgają do surowych wierszy.
+
+Z backendu SQL i magazynu Arrow tabela powstaje z porcji uporządkowanych po
+dniu (policz_porcje): dni zamknięte w porcji są liczone od razu, a wiersze
+ostatniego dnia przechodzą do następnej porcji. W pamięci jest naraz jedna
+porcja i jeden dzień, a wynik jest taki sam jak z całej ramki.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+import dataset
+import metrics
+
+# Kolejność kolumn tabeli; kwartyle interpolowane liniowo jak Series.quantile
+MIARY = ['n', 'min', 'max', 'zakres', 'srednia', 'mediana', 'q1', 'q3', 'iqr',
+         'std', 'wariancja', 'cv']
+
+
+def _kody_dat(daty):
+    """(kod daty dla wiersza, posortowane daty jako tekst)"""
+    if isinstance(daty.dtype, pd.CategoricalDtype):
+        return daty.cat.codes.to_numpy(), np.asarray(daty.cat.categories.astype(str), dtype=object)
+    kody, unikalne = pd.factorize(daty.astype(str), sort=True)
+    return kody, np.asarray(unikalne, dtype=object)
+
+
+def _kwantyl(x, starty, n, q):
+    """Kwantyl q każdej grupy posortowanej tablicy x (grupy niepuste)"""
+    pozycja = q * (n - 1)
+    dol = np.floor(pozycja).astype(np.int64)
+    gora = np.minimum(dol + 1, n - 1)
+    a, b = x[starty + dol], x[starty + gora]
+    return a + (b - a) * (pozycja - dol)
+
+
+def _pusta():
+    return pd.DataFrame(columns=MIARY, index=pd.MultiIndex.from_arrays([[], []], names=['data', 'kolumna']))
+
+
+def policz(df, kolumny=None):
+    """
+    Ramka statystyk z indeksem (data, kolumna) i kolumnami MIARY.
+    Pomijane są braki danych i pary bez żadnej wartości.
+    """
+    kolumny = [k for k in (kolumny or dataset.KOLUMNY_POMIAROWE) if k in df.columns]
+    if not kolumny or 'data' not in df.columns or df.empty:
+        return _pusta()
+    kody, daty = _kody_dat(df['data'])
+    return _policz(df, kolumny, kody, daty)
+
+
+def _dni_wierszy(porcja):
+    """Dzień ('YYYY-MM-DD') każdego wiersza porcji"""
+    daty = porcja['data']
+    if isinstance(daty.dtype, pd.CategoricalDtype):
+        # Dzień liczony dla kategorii, a nie dla każdego wiersza
+        dni = np.asarray(daty.cat.categories.astype(str).str[:10], dtype=object)
+        return dni[daty.cat.codes.to_numpy()]
+    return np.asarray(daty.astype(str).str[:10], dtype=object)
+
+
+def policz_porcje(porcje, kolumny=None):
+    """
+    Ramka jak z policz() dla porcji wierszy uporządkowanych po dniu (np.
+    porcje zapytania ORDER BY data albo partycje dzienne). ValueError, gdy
+    dzień wraca w porcji po dniu późniejszym.
+    """
+    czesci = []
+    zalegle, dzien_zaleglych = None, None
+    zamkniety = None  # ostatni policzony dzień
+    for porcja in porcje:
+        if porcja.empty:
+            continue
+        dni = _dni_wierszy(porcja)
+        if zalegle is not None:
+            if dni.min() > dzien_zaleglych:
+                # Porcja zaczyna nowy dzień (np. partycja dzienna) - bez łączenia
+                czesci.append(policz(zalegle, kolumny))
+                zamkniety = dzien_zaleglych
+            else:
+                porcja = pd.concat([zalegle, porcja], ignore_index=True)
+                dni = np.concatenate([np.full(len(zalegle), dzien_zaleglych, dtype=object), dni])
+            zalegle = None
+        if zamkniety is not None and dni.min() <= zamkniety:
+            raise ValueError("Porcje danych nie są uporządkowane po dniu")
+        ostatni = dni.max()
+        gotowe = dni < ostatni
+        if gotowe.any():
+            czesci.append(policz(porcja[gotowe], kolumny))
+            zamkniety = dni[gotowe].max()
+        zalegle, dzien_zaleglych = porcja[~gotowe], ostatni
+    if zalegle is not None:
+        czesci.append(policz(zalegle, kolumny))
+    if not czesci:
+        return _pusta()
+    return pd.concat(czesci).sort_index()
+
+
+def podsumuj(df, kolumny=None):
+    """Miary każdej kolumny dla całej ramki (np. zakresu dat): kolumna -> słownik"""
+    kolumny = [k for k in (kolumny or dataset.KOLUMNY_POMIAROWE) if k in df.columns]
+    if not kolumny or df.empty:
+        return {}
+    tabela = _policz(df, kolumny, np.zeros(len(df), dtype=np.int64), np.array(['okres'], dtype=object))
+    return {kolumna: dict(zip(MIARY, wiersz))
+            for (_, kolumna), wiersz in zip(tabela.index, tabela[MIARY].itertuples(index=False))}
+
+
+def _policz(df, kolumny, kody, daty):
+    liczba_dat = len(daty)
+    # Grupa = kolumna * liczba_dat + data; wszystkie kolumny w jednej tablicy
+    wartosci = np.concatenate([df[k].to_numpy(dtype=np.float64) for k in kolumny])
+    grupy = np.concatenate([kody.astype(np.int64) + i * liczba_dat for i in range(len(kolumny))])
+    ok = ~np.isnan(wartosci) & (grupy >= 0)
+    wartosci, grupy = wartosci[ok], grupy[ok]
+
+    porzadek = np.lexsort((wartosci, grupy))
+    x, grupy = wartosci[porzadek], grupy[porzadek]
+
+    liczba_grup = len(kolumny) * liczba_dat
+    n = np.bincount(grupy, minlength=liczba_grup)
+    starty = np.concatenate(([0], np.cumsum(n)[:-1]))
+    srednia = np.bincount(grupy, weights=x, minlength=liczba_grup) / np.maximum(n, 1)
+    odchylenia = x - srednia[grupy]
+    m2 = np.bincount(grupy, weights=odchylenia * odchylenia, minlength=liczba_grup)
+
+    niepuste = n > 0
+    n, starty, srednia, m2 = n[niepuste], starty[niepuste], srednia[niepuste], m2[niepuste]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        wariancja = np.where(n > 1, m2 / (n - 1), np.nan)
+        std = np.sqrt(wariancja)
+        cv = np.where(srednia != 0, std / srednia * 100, 0.0)
+    minimum, maksimum = x[starty], x[starty + n - 1]
+    q1 = _kwantyl(x, starty, n, 0.25)
+    q3 = _kwantyl(x, starty, n, 0.75)
+
+    numery = np.flatnonzero(niepuste)
+    indeks = pd.MultiIndex.from_arrays(
+        [daty[numery % liczba_dat], np.asarray(kolumny, dtype=object)[numery // liczba_dat]],
+        names=['data', 'kolumna'])
+    tabela = pd.DataFrame({
+        'n': n, 'min': minimum, 'max': maksimum, 'zakres': maksimum - minimum,
+        'srednia': srednia, 'mediana': _kwantyl(x, starty, n, 0.5), 'q1': q1, 'q3': q3,
+        'iqr': q3 - q1, 'std': std, 'wariancja': wariancja, 'cv': cv,
+    }, index=indeks)
+    return tabela.sort_index()
+
+
+class TabelaStatystyk:
+    """Statystyki wszystkich par (data, kolumna) jednej wersji danych"""
+
+    def __init__(self, ramka):
+        self.ramka = ramka
+        # Szybki odczyt pojedynczej pary bez indeksowania ramki
+        self._wiersze = {klucz: dict(zip(MIARY, wiersz))
+                         for klucz, wiersz in zip(ramka.index, ramka[MIARY].itertuples(index=False))}
+
+    def __len__(self):
+        return len(self.ramka)
+
+    def dla(self, data, kolumna):
+        """Słownik miar dla daty i kolumny albo None, gdy brak wartości"""
+        return self._wiersze.get((str(data), kolumna))
+
+    def zakres(self, od=None, do=None, kolumny=None):
+        """Ramka (data, kolumna, miary...) dla dat od..do włącznie"""
+        ramka = self.ramka.reset_index()
+        maska = np.ones(len(ramka), dtype=bool)
+        if od is not None:
+            maska &= (ramka['data'] >= od).to_numpy()
+        if do is not None:
+            # '\x7f' - obejmij także znaczniki godzinowe z dnia `do`
+            maska &= (ramka['data'] <= do + '\x7f').to_numpy()
+        if kolumny is not None:
+            maska &= ramka['kolumna'].isin(kolumny).to_numpy()
+        return ramka[maska]
+
+
+_lock = threading.Lock()
+# (wersja danych, tabela) - podmieniane jednym przypisaniem
+_stan = (None, None)
+
+
+def tabela(wersja, wczytaj):
+    """
+    Tabela statystyk dla wersji danych; wczytaj() zwraca porcje wierszy
+    uporządkowane po dniu (choćby jedną pełną ramkę) i jest wywoływane tylko
+    po zmianie wersji. None, gdy brak danych.
+    """
+    global _stan
+    if wersja is None:
+        return None
+    stan = _stan
+    trafienie = stan[0] == wersja
+    metrics.cache('statystyki', trafienie)
+    if trafienie:
+        return stan[1]
+
+    with _lock:
+        # Inny wątek mógł już policzyć tabelę
+        if _stan[0] != wersja:
+            porcje = wczytaj()
+            if porcje is None:
+                return None
+            _stan = (wersja, TabelaStatystyk(policz_porcje(porcje)))
+        return _stan[1]
+
+
+def wyczysc():
+    """Wymuś ponowne policzenie przy następnym dostępie"""
+    global _stan
+    with _lock:
+        _stan = (None, None)
@@ -0,0 +1,307 @@
+"""
+Szablony figur map z blittingiem.
+
+Dla metody i układu stacji figura Agg jest rozkładana raz: osie, podkład
+mapowy, siatka i podpisy osi trafiają do zapamiętanego tła, a elementy
+stałe leżące nad danymi (punkty stacji, etykiety) do przezroczystej
+nakładki. Żądanie odtwarza tło, rysuje tylko warstwę danych (obraz siatki,
+kontury, kolory punktów), tytuł i skalę kolorów, nakłada nakładkę i zwraca
+kadr RGB do zakodowania (obrazy.py) - bez tight_layout i pełnego rysowania figury.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+
+MAX_SZABLONOW = int(os.environ.get("FIGURE_TEMPLATES_MAX", "8"))
+
+ROZMIAR_FIGURY = (14, 10)
+DPI = 100
+# Margines kadrowania jak savefig(bbox_inches='tight', pad_inches=0.2)
+MARGINES_KADRU = 0.2
+# Bufor wokół stacji (stopnie) - jak w rendererach pełnych figur
+BUFOR = 0.1
+PALETA = 'RdYlBu_r'
+
+# Wartości zastępcze przy wyznaczaniu kadru - najszersze spodziewane
+# etykiety skali, żeby rzeczywiste nigdy nie zostały przycięte
+SKALA_ZASTEPCZA = (-1000.0, 1000.0)
+TEKST_ZASTEPCZY = "Ąg"
+
+
+class SzablonMapy:
+    """Figura mapy dla układu stacji: tło i nakładka rysowane raz"""
+
+    alpha_podkladu = 0.35
+    kolor_tla = 'white'
+    rozmiar_tytulu = 14
+    opcje_skali = dict(pad=0.02, shrink=0.9)
+    rozmiar_podzialki = 9
+    skala_z_warstwy = True
+
+    def __init__(self, uklad, dodaj_podklad):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.cm import ScalarMappable
+        from matplotlib.figure import Figure
+
+        self.uklad = uklad
+        self.extent = (uklad.x.min() - BUFOR, uklad.x.max() + BUFOR,
+                       uklad.y.min() - BUFOR, uklad.y.max() + BUFOR)
+        self.lock = threading.Lock()
+
+        self.fig = Figure(figsize=ROZMIAR_FIGURY, dpi=DPI, facecolor='white')
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.ax = ax = self.fig.add_subplot()
+        ax.set_facecolor(self.kolor_tla)
+
+        self._ustaw_zakres()
+        # Nieudany podkład (np. brak sieci) - szablonu nie zapamiętujemy
+        self.podklad = dodaj_podklad(ax, alpha=self.alpha_podkladu) is not False
+        self._ustaw_zakres()
+        ax.set_xlabel('Długość geograficzna (°)', fontsize=10)
+        ax.set_ylabel('Szerokość geograficzna (°)', fontsize=10)
+        self._osie(ax)
+
+        self.warstwa = self._warstwa_danych(ax)
+        self.nakladka = self._nakladka(ax)
+        for artysta in self.warstwa + self.nakladka:
+            artysta.set_animated(True)
+
+        # Skala kolorów podąża za zakresem (i przezroczystością) warstwy danych
+        self.mapowanie = self.warstwa[0] if self.skala_z_warstwy else ScalarMappable(cmap=PALETA)
+        self.mapowanie.set_clim(*SKALA_ZASTEPCZA)
+        self.skala = self.fig.colorbar(self.mapowanie, ax=ax, **self.opcje_skali)
+        self.skala.set_label(TEKST_ZASTEPCZY)
+        if self.rozmiar_podzialki:
+            self.skala.ax.tick_params(labelsize=self.rozmiar_podzialki)
+        self.tytul = ax.set_title(TEKST_ZASTEPCZY, fontsize=self.rozmiar_tytulu,
+                                  fontweight='bold', pad=15)
+        self.fig.tight_layout()
+        self._zapamietaj_tlo()
+
+    def _ustaw_zakres(self):
+        self.ax.set_xlim(self.extent[0], self.extent[1])
+        self.ax.set_ylim(self.extent[2], self.extent[3])
+
+    def _osie(self, ax):
+        """Stałe elementy osi rysowane w tle (siatka, etykiety pod danymi)"""
+
+    def _warstwa_danych(self, ax):
+        """Trwałe artysty warstwy danych aktualizowane w _aktualizuj"""
+        return []
+
+    def _nakladka(self, ax):
+        """Stałe artysty rysowane nad warstwą danych"""
+        return []
+
+    def _aktualizuj(self, **dane):
+        """Ustaw dane warstwy; zwraca artysty do narysowania (w kolejności)"""
+        raise NotImplementedError
+
+    def _po_renderze(self):
+        """Usuń artysty tymczasowe utworzone w _aktualizuj"""
+
+    def _zapamietaj_tlo(self):
+        renderer = self.canvas.get_renderer()
+        self.canvas.draw()
+
+        # Kadr jak bbox_inches='tight' - z zastępczym tytułem i skalą
+        szer, wys = int(self.fig.bbox.width), int(self.fig.bbox.height)
+        bbox = self.fig.get_tightbbox(renderer).padded(MARGINES_KADRU)
+        self.kadr = (slice(max(0, wys - int(np.ceil(bbox.y1 * DPI))), min(wys, wys - int(bbox.y0 * DPI))),
+                     slice(max(0, int(bbox.x0 * DPI)), min(szer, int(np.ceil(bbox.x1 * DPI)))))
+
+        # Tło bez elementów zmiennych. Pusty tytuł zachowuje pozycję z
+        # pierwszego rysowania (ukryty zostałby przesunięty poza figurę)
+        # Ukrywamy też artysty animowane - Axes.draw rysuje obrazy (AxesImage)
+        # mimo flagi animated
+        self.tytul.set_text('')
+        zmienne = self.warstwa + self.nakladka + [self.skala.ax]
+        for artysta in zmienne:
+            artysta.set_visible(False)
+        self.canvas.draw()
+        self.tlo = self.canvas.copy_from_bbox(self.fig.bbox)
+        for artysta in zmienne:
+            artysta.set_visible(True)
+
+        # Nakładka na przezroczystym tle - zapamiętane tylko niepuste piksele
+        renderer.clear()
+        for artysta in self.nakladka:
+            self.ax.draw_artist(artysta)
+        rgba = np.asarray(self.canvas.buffer_rgba())[self.kadr]
+        self.piksele_nakladki = np.nonzero(rgba[..., 3])
+        kolory = rgba[self.piksele_nakladki].astype(np.float32)
+        self.alpha_nakladki = kolory[:, 3:] / 255.0
+        self.kolory_nakladki = kolory[:, :3] * self.alpha_nakladki
+        self.canvas.restore_region(self.tlo)
+
+    def renderuj(self, tytul, etykieta, vmin, vmax, **dane):
+        """Obraz RGB (kadr figury) z aktualną warstwą danych"""
+        with self.lock:
+            artysci = self._aktualizuj(vmin=vmin, vmax=vmax, **dane)
+            try:
+                self.mapowanie.set_clim(vmin, vmax)
+                self.skala.set_label(etykieta)
+                self.tytul.set_text(tytul)
+
+                self.canvas.restore_region(self.tlo)
+                for artysta in artysci:
+                    self.ax.draw_artist(artysta)
+                self.ax.draw_artist(self.tytul)
+                self.fig.draw_artist(self.skala.ax)
+                obraz = np.array(np.asarray(self.canvas.buffer_rgba())[self.kadr][..., :3])
+            finally:
+                self._po_renderze()
+
+        # Nakładka (stan prosty, bez premultiplikacji) na nieprzezroczyste tło
+        tlo = obraz[self.piksele_nakladki].astype(np.float32)
+        obraz[self.piksele_nakladki] = (self.kolory_nakladki + tlo * (1.0 - self.alpha_nakladki) + 0.5).astype(np.uint8)
+        return obraz
+
+
+class SzablonPunktow(SzablonMapy):
+    """Mapa punktów: kolory punktów zmienne, etykiety pod punktami w tle"""
+
+    alpha_podkladu = 0.4
+    kolor_tla = '#e8f4f8'
+    rozmiar_tytulu = 15
+    opcje_skali = {}
+    rozmiar_podzialki = None
+    skala_z_warstwy = False
+
+    def _osie(self, ax):
+        # Jak GeoDataFrame.plot dla EPSG:4326 - proporcje osi wg szerokości
+        ax.set_aspect(1 / np.cos(np.deg2rad(np.mean(self.extent[2:]))))
+        ax.grid(True, linestyle='--', alpha=0.3, color='gray')
+        self.uklad.etykiety(ax, fontsize=11, zorder=3, ramka=dict(boxstyle='round,pad=0.4', alpha=0.9))
+
+    def _warstwa_danych(self, ax):
+        self.punkty = ax.scatter(self.uklad.x, self.uklad.y, c=np.zeros(len(self.uklad)), cmap=PALETA,
+                                 s=200, alpha=0.95, edgecolor='white', linewidth=3, zorder=15)
+        return [self.punkty]
+
+    def _aktualizuj(self, z, vmin, vmax):
+        self.punkty.set_array(z)
+        self.punkty.set_clim(vmin, vmax)
+        return [self.punkty]
+
+
+class SzablonSiatki(SzablonMapy):
+    """IDW / RBF: obraz siatki zmienny, punkty i etykiety w nakładce"""
+
+    def _warstwa_danych(self, ax):
+        self.obraz = ax.imshow(np.zeros((2, 2)), extent=self.extent, origin='lower',
+                               cmap=PALETA, alpha=0.6, zorder=5)
+        return [self.obraz]
+
+    def _nakladka(self, ax):
+        punkty = ax.scatter(self.uklad.x, self.uklad.y, c='darkblue', s=120, edgecolors='white',
+                            linewidth=2.5, zorder=15, marker='o')
+        return [punkty] + self.uklad.etykiety(ax)
+
+    def _aktualizuj(self, siatka, vmin, vmax):
+        self.obraz.set_data(siatka)
+        self.obraz.set_clim(vmin, vmax)
+        return [self.obraz]
+
+
+class SzablonKonturow(SzablonMapy):
+    """Kriging: kontury tworzone per żądanie, kolory punktów zmienne"""
+
+    def _osie(self, ax):
+        ax.grid(True, alpha=0.2, linestyle='--')
+
+    def _warstwa_danych(self, ax):
+        self.punkty = ax.scatter(self.uklad.x, self.uklad.y, c=np.zeros(len(self.uklad)), s=180,
+                                 cmap=PALETA, edgecolors='white', linewidth=2.5, zorder=15)
+        self._kontury = []
+        return [self.punkty]
+
+    def _nakladka(self, ax):
+        return self.uklad.etykiety(ax)
+
+    def _aktualizuj(self, xi, yi, siatka, z, vmin, vmax):
+        XI, YI = np.meshgrid(xi, yi)
+        self._kontury = [
+            self.ax.contourf(XI, YI, siatka, levels=15, cmap=PALETA, alpha=0.6, zorder=5),
+            self.ax.contour(XI, YI, siatka, levels=8, colors='gray', alpha=0.4, linewidths=0.7, zorder=6),
+        ]
+        for kontur in self._kontury:
+            kontur.set_animated(True)
+        self.punkty.set_array(z)
+        self.punkty.set_clim(vmin, vmax)
+        return self._kontury + [self.punkty]
+
+    def _po_renderze(self):
+        for kontur in self._kontury:
+            kontur.remove()
+        self._kontury = []
+
+
+class SzablonVoronoi(SzablonMapy):
+    """Voronoi: geometria komórek stała, zmienne tylko ich kolory"""
+
+    def _warstwa_danych(self, ax):
+        from matplotlib.collections import PolyCollection
+
+        from interpolation import komorki_voronoi
+
+        komorki = komorki_voronoi(self.uklad.x, self.uklad.y, self.extent)
+        self.komorki = PolyCollection(komorki, array=np.zeros(len(komorki)), cmap=PALETA, alpha=0.6,
+                                      edgecolors='white', linewidths=1.5, zorder=5)
+        ax.add_collection(self.komorki)
+        return [self.komorki]
+
+    def _nakladka(self, ax):
+        punkty = ax.scatter(self.uklad.x, self.uklad.y, c='darkblue', s=120, edgecolors='white',
+                            linewidth=2.5, zorder=15, marker='o')
+        return [punkty] + self.uklad.etykiety(ax)
+
+    def _aktualizuj(self, z, vmin, vmax):
+        self.komorki.set_array(z)
+        self.komorki.set_clim(vmin, vmax)
+        return [self.komorki]
+
+
+SZABLONY = {
+    'mapa': SzablonPunktow,
+    'idw': SzablonSiatki,
+    'rbf': SzablonSiatki,
+    'kriging': SzablonKonturow,
+    'voronoi': SzablonVoronoi,
+}
+
+_szablony = OrderedDict()
+_lock = threading.Lock()
+
+
+def szablon(metoda, uklad, dodaj_podklad):
+    """Szablon metody dla układu stacji (zapamiętywany, LRU)"""
+    klucz = (metoda, uklad)
+    with _lock:
+        gotowy = _szablony.get(klucz)
+        if gotowy is not None:
+            _szablony.move_to_end(klucz)
+    metrics.cache('szablon', gotowy is not None)
+    if gotowy is not None:
+        return gotowy
+
+    nowy = SZABLONY[metoda](uklad, dodaj_podklad)
+    if not nowy.podklad:
+        return nowy
+    with _lock:
+        nowy = _szablony.setdefault(klucz, nowy)
+        _szablony.move_to_end(klucz)
+        while len(_szablony) > MAX_SZABLONOW:
+            _szablony.popitem(last=False)
+    return nowy
+
+
+def wyczysc():
+    """Usuń zapamiętane szablony (np. po zbudowaniu nowego podkładu)"""
+    with _lock:
+        _szablony.clear()
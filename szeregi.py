@@ -0,0 +1,345 @@
+"""
+Szeregi czasowe pomiarów dla całego archiwum.
+
+Pomiary są raz agregowane do macierzy dzień × stacja: średnia i liczba
+pomiarów każdej kolumny (pomiary godzinowe trafiają do swojego dnia), oraz
+do dziennych sum całej sieci. Oś dni jest ciągła - dni bez pomiarów mają
+liczbę 0 - więc średnie kroczące, przepróbkowanie do tygodni i miesięcy oraz
+liczby dni z przekroczeniem progu to operacje NumPy na jednej kolumnie
+macierzy (stacja) albo na wektorach sieci, niezależnie od liczby wierszy
+źródłowych.
+
+Nowa wersja danych, której lista dat zaczyna się od dotychczasowej (dopisane
+dni albo kolejne pomiary ostatniego dnia), nie przelicza archiwum: agregaty
+od ostatniego znanego dnia są zastępowane wierszami od tego dnia. Zmiany
+starszych dni, które nie zmieniają listy dat (np. poprawione wartości), nie
+są wykrywane - po takiej zmianie trzeba wywołać wyczysc().
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+import dataset
+import metrics
+
+# Wytyczne WHO (2021) dla średniej dobowej, µg/m³
+PROGI_WHO = {'PM25': 15.0}
+
+OKRESY = ('dzien', 'tydzien', 'miesiac')
+
+# Zapas dni przy powiększaniu macierzy - kolejne dni dopisywane bez kopiowania
+ZAPAS_DNI = 92
+# Ile wektorów przekroczeń sieci (kolumna, próg) trzymać
+MAX_PROGOW = 8
+
+
+def _dni(daty):
+    """Dni (datetime64[D]) znaczników 'YYYY-MM-DD' lub 'YYYY-MM-DD HH:MM'"""
+    return np.asarray(pd.Index(daty).astype(str).str[:10], dtype='datetime64[D]')
+
+
+def _dni_wierszy(daty):
+    """Dzień każdego wiersza; kolumna kategoryczna jest przeliczana tylko dla kategorii"""
+    if isinstance(daty.dtype, pd.CategoricalDtype):
+        kody = daty.cat.codes.to_numpy()
+        dni = _dni(daty.cat.categories)[np.maximum(kody, 0)]
+        dni[kody < 0] = np.datetime64('NaT')
+        return dni
+    return _dni(daty)
+
+
+def _okresy(dni, okres):
+    """(początki okresów, etykiety) dla kolejnych dni datetime64[D]"""
+    if okres == 'dzien':
+        klucze = dni
+    elif okres == 'tydzien':
+        # 1970-01-01 był czwartkiem - klucz to poniedziałek tygodnia
+        klucze = dni - (dni.astype(np.int64) + 3) % 7
+    elif okres == 'miesiac':
+        klucze = dni.astype('datetime64[M]')
+    else:
+        raise ValueError(f"Nieznany okres: {okres} (dostępne: {', '.join(OKRESY)})")
+    if len(klucze) == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=str)
+    starty = np.flatnonzero(np.concatenate(([True], klucze[1:] != klucze[:-1])))
+    return starty, np.datetime_as_string(klucze[starty])
+
+
+class ArchiwumSzeregow:
+    """
+    Dzienne agregaty (dzień × stacja) wszystkich kolumn pomiarowych.
+    Odczyty w trakcie aktualizacji mogą zobaczyć już uzupełniony ostatni dzień.
+    """
+
+    def __init__(self, kolumny=None):
+        self.kolumny = list(kolumny or dataset.KOLUMNY_POMIAROWE)
+        self.poczatek = None
+        self.liczba_dni = 0
+        self.stacje = []
+        self._numery_stacji = {}
+        # Daty danych ujętych w agregatach (do rozpoznania dopisania)
+        self.daty_zrodla = []
+        self._srednia = {}
+        self._liczba = {}
+        self._suma_sieci = {}
+        self._liczba_sieci = {}
+        # (kolumna, próg) -> liczba stacji ze średnią dobową powyżej progu
+        self._przekroczenia = {}
+        self._lock = threading.Lock()
+        self._pojemnosc = 0
+        self._zaalokuj(0, 0)
+
+    def _zaalokuj(self, pojemnosc, szerokosc):
+        """Powiększ macierze, zachowując dotychczasowe agregaty"""
+        for kolumna in self.kolumny:
+            srednia = np.full((pojemnosc, szerokosc), np.nan, dtype=np.float32)
+            # uint16 - do 65535 pomiarów stacji na dobę
+            liczba = np.zeros((pojemnosc, szerokosc), dtype=np.uint16)
+            suma_sieci = np.zeros(pojemnosc)
+            liczba_sieci = np.zeros(pojemnosc, dtype=np.int64)
+            if kolumna in self._srednia:
+                stare = self._srednia[kolumna]
+                srednia[:stare.shape[0], :stare.shape[1]] = stare
+                liczba[:stare.shape[0], :stare.shape[1]] = self._liczba[kolumna]
+                suma_sieci[:self._pojemnosc] = self._suma_sieci[kolumna]
+                liczba_sieci[:self._pojemnosc] = self._liczba_sieci[kolumna]
+            self._srednia[kolumna], self._liczba[kolumna] = srednia, liczba
+            self._suma_sieci[kolumna], self._liczba_sieci[kolumna] = suma_sieci, liczba_sieci
+        for klucz, wektor in self._przekroczenia.items():
+            nowy = np.zeros(pojemnosc, dtype=np.int32)
+            nowy[:len(wektor)] = wektor
+            self._przekroczenia[klucz] = nowy
+        self._pojemnosc = pojemnosc
+
+    def _szerokosc(self):
+        return self._srednia[self.kolumny[0]].shape[1]
+
+    def _numer_dnia(self, data):
+        """Numer dnia daty 'YYYY-MM-DD[ HH:MM]' na osi archiwum"""
+        return int((np.datetime64(data[:10], 'D') - self.poczatek).astype(np.int64))
+
+    def _numeruj_stacje(self, nazwy):
+        """Numer stacji każdego wiersza (nowe stacje dostają kolejne numery)"""
+        kody, unikalne = pd.factorize(nazwy)
+        numery = np.empty(len(unikalne) + 1, dtype=np.int64)
+        for i, nazwa in enumerate(unikalne):
+            numer = self._numery_stacji.get(nazwa)
+            if numer is None:
+                numer = self._numery_stacji[nazwa] = len(self.stacje)
+                self.stacje.append(nazwa)
+            numery[i] = numer
+        numery[-1] = -1
+        return numery[kody]
+
+    def aktualizuj(self, porcje, daty, od=None):
+        """
+        Zastąp agregaty od dnia `od` (None - całe archiwum) wierszami z porcji
+        (ramki z kolumnami nazwa, data i pomiarowymi). daty - lista dat danych.
+        """
+        with self._lock:
+            if od is None or self.poczatek is None:
+                d0 = 0
+                self.poczatek = _dni(daty[:1])[0] if len(daty) else None
+            else:
+                d0 = min(self.liczba_dni, self._numer_dnia(od))
+            for kolumna in self.kolumny:
+                self._srednia[kolumna][d0:] = np.nan
+                self._liczba[kolumna][d0:] = 0
+                self._suma_sieci[kolumna][d0:] = 0
+                self._liczba_sieci[kolumna][d0:] = 0
+            self.liczba_dni = d0
+            if len(daty) and self.poczatek is not None:
+                # Cała oś dni od razu - bez powiększania macierzy porcja po porcji
+                potrzebne = self._numer_dnia(daty[-1]) + 1
+                if potrzebne > self._pojemnosc:
+                    self._zaalokuj(potrzebne + ZAPAS_DNI, self._szerokosc())
+
+            if self.poczatek is not None:
+                for porcja in porcje:
+                    self._dodaj(porcja)
+            for (kolumna, prog), wektor in self._przekroczenia.items():
+                wektor[d0:self.liczba_dni] = self._policz_przekroczenia(kolumna, prog, d0, self.liczba_dni)
+            self.daty_zrodla = list(daty)
+
+    def _dodaj(self, porcja):
+        """Dolicz wiersze porcji do średnich i liczb (komórki mogą już mieć pomiary)"""
+        if porcja.empty:
+            return
+        dni = (_dni_wierszy(porcja['data']) - self.poczatek).astype(np.int64)
+        stacje = self._numeruj_stacje(porcja['nazwa'])
+        # Brak daty (NaT) daje ujemny numer dnia
+        ok = (dni >= 0) & (stacje >= 0)
+        dni, stacje = dni[ok], stacje[ok]
+        if len(dni) == 0:
+            return
+        d0, d1 = int(dni.min()), int(dni.max()) + 1
+        szerokosc = len(self.stacje)
+        if d1 > self._pojemnosc or szerokosc > self._szerokosc():
+            pojemnosc = self._pojemnosc if d1 <= self._pojemnosc else d1 + ZAPAS_DNI
+            self._zaalokuj(pojemnosc, szerokosc)
+
+        komorki = (dni - d0) * szerokosc + stacje
+        rozmiar = (d1 - d0) * szerokosc
+        for kolumna in self.kolumny:
+            if kolumna not in porcja.columns:
+                continue
+            wartosci = porcja[kolumna].to_numpy(dtype=np.float64)[ok]
+            jest = ~np.isnan(wartosci)
+            suma = np.bincount(komorki[jest], weights=wartosci[jest], minlength=rozmiar).reshape(d1 - d0, szerokosc)
+            liczba = np.bincount(komorki[jest], minlength=rozmiar).reshape(d1 - d0, szerokosc)
+
+            srednia_stara = self._srednia[kolumna][d0:d1, :szerokosc]
+            liczba_stara = self._liczba[kolumna][d0:d1, :szerokosc]
+            liczba_nowa = liczba_stara + liczba
+            with np.errstate(invalid='ignore', divide='ignore'):
+                srednia = (np.where(liczba_stara > 0, srednia_stara * liczba_stara, 0.0) + suma) / liczba_nowa
+            srednia_stara[:] = srednia
+            liczba_stara[:] = liczba_nowa
+            self._suma_sieci[kolumna][d0:d1] += suma.sum(axis=1)
+            self._liczba_sieci[kolumna][d0:d1] += liczba.sum(axis=1)
+        self.liczba_dni = max(self.liczba_dni, d1)
+
+    def przyrost(self, daty):
+        """Czy daty to dotychczasowe daty z nowymi na końcu (dopisanie)"""
+        n = len(self.daty_zrodla)
+        return n > 0 and len(daty) >= n and list(daty[:n]) == self.daty_zrodla
+
+    # --- Zapytania ---
+
+    def numer_stacji(self, nazwa):
+        """Numer stacji w macierzach albo None"""
+        return self._numery_stacji.get(nazwa)
+
+    def _zakres(self, od=None, do=None):
+        """(d0, d1) - dni od..do włącznie przycięte do archiwum"""
+        if self.poczatek is None:
+            return 0, 0
+        d0 = 0 if od is None else max(0, self._numer_dnia(od))
+        d1 = self.liczba_dni if do is None else min(self.liczba_dni, self._numer_dnia(do) + 1)
+        return d0, max(d0, d1)
+
+    def _dzienne(self, kolumna, stacja, d0, d1):
+        """(suma, liczba) dni d0..d1 dla stacji (numer) albo sieci (None)"""
+        if stacja is None:
+            return self._suma_sieci[kolumna][d0:d1], self._liczba_sieci[kolumna][d0:d1]
+        liczba = self._liczba[kolumna][d0:d1, stacja].astype(np.int64)
+        suma = np.where(liczba > 0, self._srednia[kolumna][d0:d1, stacja].astype(np.float64) * liczba, 0.0)
+        return suma, liczba
+
+    def _policz_przekroczenia(self, kolumna, prog, d0, d1):
+        return np.count_nonzero(self._srednia[kolumna][d0:d1] > prog, axis=1)
+
+    def _przekroczenia_sieci(self, kolumna, prog, d0, d1):
+        """Liczba stacji powyżej progu w dniach d0..d1 - wektor liczony raz na próg"""
+        klucz = (kolumna, float(prog))
+        wektor = self._przekroczenia.get(klucz)
+        if wektor is None:
+            with self._lock:
+                wektor = self._przekroczenia.get(klucz)
+                if wektor is None:
+                    wektor = np.zeros(self._pojemnosc, dtype=np.int32)
+                    wektor[:self.liczba_dni] = self._policz_przekroczenia(kolumna, prog, 0, self.liczba_dni)
+                    if len(self._przekroczenia) >= MAX_PROGOW:
+                        self._przekroczenia.pop(next(iter(self._przekroczenia)))
+                    self._przekroczenia[klucz] = wektor
+        return wektor[d0:d1]
+
+    def szereg(self, kolumna, stacja=None, od=None, do=None, okres='dzien', prog=None):
+        """
+        Ramka okresów (okres, srednia, n[, przekroczenia]) dla stacji (nazwa)
+        albo całej sieci (None). Średnia obejmuje wszystkie pomiary okresu;
+        przekroczenia to dni ze średnią dobową powyżej progu (dla sieci -
+        stacjo-dni).
+        """
+        d0, d1 = self._zakres(od, do)
+        numer = None if stacja is None else self._numery_stacji[stacja]
+        suma, liczba = self._dzienne(kolumna, numer, d0, d1)
+        dni = self.poczatek + np.arange(d0, d1) if d1 > d0 else np.array([], dtype='datetime64[D]')
+        starty, etykiety = _okresy(dni, okres)
+        if len(starty) == 0:
+            return pd.DataFrame(columns=['okres', 'srednia', 'n'] + ([] if prog is None else ['przekroczenia']))
+
+        n = np.add.reduceat(liczba, starty)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            srednia = np.where(n > 0, np.add.reduceat(suma, starty) / n, np.nan)
+        ramka = pd.DataFrame({'okres': etykiety, 'srednia': srednia, 'n': n})
+        if prog is not None:
+            if numer is None:
+                dni_powyzej = self._przekroczenia_sieci(kolumna, prog, d0, d1)
+            else:
+                dni_powyzej = self._srednia[kolumna][d0:d1, numer] > prog
+            ramka['przekroczenia'] = np.add.reduceat(dni_powyzej.astype(np.int64), starty)
+        return ramka
+
+    def srednia_kroczaca(self, kolumna, okno, stacja=None, od=None, do=None):
+        """Średnia pomiarów z `okno` dni kończących się każdym dniem od..do (NaN bez pomiarów)"""
+        d0, d1 = self._zakres(od, do)
+        p = max(0, d0 - okno + 1)
+        numer = None if stacja is None else self._numery_stacji[stacja]
+        suma, liczba = self._dzienne(kolumna, numer, p, d1)
+        sumy = np.concatenate(([0.0], np.cumsum(suma)))
+        liczby = np.concatenate(([0], np.cumsum(liczba)))
+        koniec = np.arange(d0 - p, d1 - p) + 1
+        poczatek = np.maximum(koniec - okno, 0)
+        n = liczby[koniec] - liczby[poczatek]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(n > 0, (sumy[koniec] - sumy[poczatek]) / n, np.nan)
+
+    def przekroczenia_stacji(self, kolumna, prog, od=None, do=None):
+        """Ramka (stacja, dni_przekroczen, dni_z_pomiarami) malejąco po dniach przekroczeń"""
+        d0, d1 = self._zakres(od, do)
+        srednia = self._srednia[kolumna][d0:d1, :len(self.stacje)]
+        ramka = pd.DataFrame({
+            'stacja': self.stacje[:srednia.shape[1]],
+            'dni_przekroczen': np.count_nonzero(srednia > prog, axis=0),
+            'dni_z_pomiarami': np.count_nonzero(self._liczba[kolumna][d0:d1, :srednia.shape[1]], axis=0),
+        })
+        return ramka.sort_values(['dni_przekroczen', 'stacja'], ascending=[False, True], ignore_index=True)
+
+
+_lock = threading.Lock()
+# (wersja danych, archiwum) - podmieniane jednym przypisaniem
+_stan = (None, None)
+
+
+def archiwum(wersja, daty, porcje):
+    """
+    Archiwum szeregów dla wersji danych. daty - lista dat tej wersji,
+    porcje(od) - kolejne ramki wierszy od daty od (None - wszystkie).
+    Po dopisaniu danych agregowane są tylko wiersze od ostatniego znanego
+    dnia. None, gdy brak danych.
+    """
+    global _stan
+    if wersja is None:
+        return None
+    stan = _stan
+    trafienie = stan[0] == wersja
+    metrics.cache('szeregi', trafienie)
+    if trafienie:
+        return stan[1]
+
+    with _lock:
+        # Inny wątek mógł już zaktualizować archiwum
+        if _stan[0] != wersja:
+            poprzednie = _stan[1]
+            if poprzednie is not None and poprzednie.przyrost(daty):
+                od = poprzednie.daty_zrodla[-1][:10]
+                poprzednie.aktualizuj(porcje(od), daty, od)
+                metrics.cache('szeregi_przyrost', True)
+                _stan = (wersja, poprzednie)
+            else:
+                if poprzednie is not None:
+                    metrics.cache('szeregi_przyrost', False)
+                nowe = ArchiwumSzeregow()
+                nowe.aktualizuj(porcje(None), daty)
+                _stan = (wersja, nowe)
+        return _stan[1]
+
+
+def wyczysc():
+    """Wymuś pełne przeliczenie przy następnym dostępie"""
+    global _stan
+    with _lock:
+        _stan = (None, None)
@@ -116,6 +116,239 @@ def check_data():
         print(f"❌ Błąd podczas czytania CSV: {e}")
         return False
 
+def check_db():
+    """Sprawdzenie backendu bazy danych na tymczasowej bazie SQLite"""
+    print("🔍 Sprawdzanie backendu bazy danych (SQLite)...\n")
+    
+    try:
+        import tempfile
+        import pandas as pd
+        from db import BazaPomiarow
+        
+        df = pd.read_csv('data/dane.csv')
+        dzien = sorted(df['data'].unique())[1]
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            baza = BazaPomiarow(f"sqlite:///{os.path.join(tmp, 'test.db')}")
+            liczba = baza.wgraj_csv('data/dane.csv')
+            
+            wyniki = {
+                'wgranie wszystkich wierszy': liczba == len(df),
+                'lista dat': baza.daty() == sorted(df['data'].unique()),
+                'filtr daty': len(baza.pobierz(data=dzien)) == (df['data'] == dzien).sum(),
+                'filtr zmiennej': list(baza.pobierz(data=dzien, zmienne=['PM25']).columns)
+                                  == ['nazwa', 'lat', 'lon', 'data', 'PM25'],
+                'filtr stacji': set(baza.pobierz(stacje=['Katowice'])['nazwa']) == {'Katowice'},
+                'zakres dat': len(baza.pobierz(od=dzien, do=dzien)) == (df['data'] == dzien).sum(),
+            }
+            baza.engine.dispose()
+        
+        for nazwa, ok in wyniki.items():
+            print(f"{'✅' if ok else '❌'} {nazwa}")
+        print()
+        return all(wyniki.values())
+    except Exception as e:
+        print(f"❌ Błąd backendu bazy danych: {e}")
+        print()
+        return False
+
+def check_magazyn():
+    """Sprawdzenie magazynu kolumnowego (partycje Arrow) w katalogu tymczasowym"""
+    print("🔍 Sprawdzanie magazynu kolumnowego (Arrow)...\n")
+    
+    try:
+        import tempfile
+        import pandas as pd
+        from magazyn import MagazynKolumnowy
+        
+        df = pd.read_csv('data/dane.csv')
+        dzien = sorted(df['data'].unique())[1]
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            magazyn = MagazynKolumnowy(tmp)
+            liczba = magazyn.wgraj_csv('data/dane.csv')
+            
+            wyniki = {
+                'wgranie wszystkich wierszy': liczba == len(df),
+                'partycja na dzień': len(magazyn.dni()) == df['data'].str[:10].nunique(),
+                'lista dat': magazyn.daty() == sorted(df['data'].unique()),
+                'filtr daty': len(magazyn.pobierz(data=dzien)) == (df['data'] == dzien).sum(),
+                'filtr zmiennej': list(magazyn.pobierz(data=dzien, zmienne=['PM25']).columns)
+                                  == ['nazwa', 'lat', 'lon', 'data', 'PM25'],
+                'filtr stacji': set(magazyn.pobierz(stacje=['Katowice'])['nazwa']) == {'Katowice'},
+                'zakres dat': len(magazyn.pobierz(od=dzien, do=dzien)) == (df['data'] == dzien).sum(),
+            }
+        
+        for nazwa, ok in wyniki.items():
+            print(f"{'✅' if ok else '❌'} {nazwa}")
+        print()
+        return all(wyniki.values())
+    except Exception as e:
+        print(f"❌ Błąd magazynu kolumnowego: {e}")
+        print()
+        return False
+
+def check_statystyki():
+    """Sprawdzenie tabeli statystyk względem pandas dla jednej daty"""
+    print("🔍 Sprawdzanie statystyk opisowych...\n")
+    
+    try:
+        import numpy as np
+        import pandas as pd
+        import dataset
+        import statystyki
+        
+        df = dataset.przygotuj_ramke(pd.read_csv('data/dane.csv'))
+        tabela = statystyki.TabelaStatystyk(statystyki.policz(df))
+        dzien = str(df['data'].iloc[0])
+        wartosci = df.loc[df['data'] == dzien, 'PM25'].astype(float)
+        staty = tabela.dla(dzien, 'PM25')
+        
+        wyniki = {
+            'para dla każdej daty i zmiennej': len(tabela) == df['data'].nunique() * len(dataset.KOLUMNY_POMIAROWE),
+            'liczność': staty['n'] == wartosci.count(),
+            'średnia i odchylenie': np.isclose(staty['srednia'], wartosci.mean()) and np.isclose(staty['std'], wartosci.std()),
+            'mediana i kwartyle': all(np.isclose(staty[m], wartosci.quantile(q))
+                                      for m, q in (('q1', 0.25), ('mediana', 0.5), ('q3', 0.75))),
+            'zakres dat': set(tabela.zakres(dzien, dzien)['data']) == {dzien},
+            'podsumowanie okresu': np.isclose(statystyki.podsumuj(df, ['PM25'])['PM25']['mediana'],
+                                              df['PM25'].astype(float).median()),
+            # Porcje przecinające dni - jak porcje z bazy SQL
+            'porcje danych': statystyki.policz_porcje(
+                df.iloc[i:i + 7] for i in range(0, len(df), 7)).equals(tabela.ramka),
+        }
+        
+        for nazwa, ok in wyniki.items():
+            print(f"{'✅' if ok else '❌'} {nazwa}")
+        print()
+        return all(wyniki.values())
+    except Exception as e:
+        print(f"❌ Błąd statystyk: {e}")
+        print()
+        return False
+
+def check_szeregi():
+    """Sprawdzenie szeregów czasowych względem pandas i dopisywania dni"""
+    print("🔍 Sprawdzanie szeregów czasowych...\n")
+    
+    try:
+        import numpy as np
+        import pandas as pd
+        import dataset
+        import szeregi
+        
+        df = dataset.przygotuj_ramke(pd.read_csv('data/dane.csv'))
+        daty = sorted(df['data'].astype(str).unique())
+        pelne = szeregi.ArchiwumSzeregow()
+        pelne.aktualizuj([df], daty)
+        
+        stacja = str(df['nazwa'].iloc[0])
+        wiersze = df[df['nazwa'] == stacja]
+        wartosci = wiersze.set_index(pd.to_datetime(wiersze['data'].astype(str)))['PM25'].astype(float)
+        tygodnie = pelne.szereg('PM25', stacja, okres='tydzien', prog=15)
+        
+        # Archiwum bez ostatnich dni (i z niepełnym ostatnim dniem), potem dopisanie
+        polowa = daty[len(daty) // 2]
+        przyrost = szeregi.ArchiwumSzeregow()
+        przyrost.aktualizuj([df[df['data'].astype(str) <= polowa].iloc[:-2]], daty[:len(daty) // 2 + 1])
+        przyrost.aktualizuj([df[df['data'].astype(str) >= polowa]], daty, polowa)
+        
+        wyniki = {
+            'średnie tygodniowe': np.allclose(tygodnie['srednia'], wartosci.resample('W-MON', label='left', closed='left').mean()),
+            'dni z przekroczeniem': tygodnie['przekroczenia'].sum() == (wartosci > 15).sum(),
+            'średnia krocząca': np.allclose(pelne.srednia_kroczaca('PM25', 7, stacja), wartosci.rolling('7D').mean()),
+            'dopisanie dni': przyrost.szereg('PM25').equals(pelne.szereg('PM25')),
+        }
+        
+        for nazwa, ok in wyniki.items():
+            print(f"{'✅' if ok else '❌'} {nazwa}")
+        print()
+        return all(wyniki.values())
+    except Exception as e:
+        print(f"❌ Błąd szeregów czasowych: {e}")
+        print()
+        return False
+
+def check_kostka():
+    """Sprawdzenie kostki interpolacji względem IDW pojedynczych dat"""
+    print("🔍 Sprawdzanie kostki interpolacji...\n")
+    
+    try:
+        import tempfile
+        import numpy as np
+        import pandas as pd
+        import dataset
+        import kostka
+        from interpolation import idw_grid
+        
+        df = dataset.przygotuj_ramke(pd.read_csv('data/dane.csv'))
+        daty = sorted(df['data'].astype(str).unique())[:5]
+        df = df[df['data'].astype(str).isin(daty)].copy()
+        # Brak pomiaru jednej stacji w drugiej dacie
+        brak = df.index[df['data'].astype(str) == daty[1]][0]
+        df.loc[brak, 'PM25'] = np.nan
+        
+        with tempfile.TemporaryDirectory() as katalog:
+            sciezka = f"{katalog}/kostka.npy"
+            kostka.zbuduj(sciezka, df, 'PM25', 'idw', 40)
+            k = kostka.Kostka(sciezka)
+            
+            def zgodna(t):
+                dzien = df[(df['data'].astype(str) == daty[t]) & df['PM25'].notna()]
+                siatka = idw_grid(dzien['lon'], dzien['lat'], dzien['PM25'].to_numpy(dtype=float), k.xi, k.yi)
+                return np.allclose(k.wartosci[t], siatka, atol=1e-4)
+            
+            wyniki = {
+                'kształt data × lat × lon': k.wartosci.shape == (len(daty), 40, 40),
+                'zgodność z IDW daty': zgodna(0),
+                'brakujące pomiary': zgodna(1),
+                'szereg piksela': len(k.szereg(*k.piksel(float(df['lon'].iloc[0]), float(df['lat'].iloc[0])))) == len(daty),
+            }
+            del k
+            
+            # Druga kostka z animacją; limit mieści jedną - starsza znika w całości
+            os.utime(sciezka, (0, 0))
+            kostka.zbuduj(f"{katalog}/nowa.npy", df, 'PM25', 'idw', 40)
+            kostka.zapisz_atomowo(f"{katalog}/nowa-4.gif", lambda f: f.write(b'GIF'))
+            kostka.przytnij(katalog, os.path.getsize(sciezka) * 1.5, zachowaj='nowa')
+            wyniki['przycinanie katalogu'] = sorted(os.listdir(katalog)) == ['nowa-4.gif', 'nowa.json', 'nowa.npy']
+        
+        for nazwa, ok in wyniki.items():
+            print(f"{'✅' if ok else '❌'} {nazwa}")
+        print()
+        return all(wyniki.values())
+    except Exception as e:
+        print(f"❌ Błąd kostki interpolacji: {e}")
+        print()
+        return False
+
+def check_start():
+    """Sprawdzenie, że import aplikacji nie ładuje ciężkich bibliotek"""
+    print("🔍 Sprawdzanie lekkiego startu aplikacji...\n")
+    
+    import subprocess
+    ciezkie = ['geopandas', 'matplotlib.pyplot', 'seaborn', 'shapely', 'contextily', 'pykrige', 'scipy']
+    skrypt = (
+        "import sys, app; "
+        f"print(','.join(m for m in {ciezkie!r} if m in sys.modules))"
+    )
+    try:
+        wynik = subprocess.run([sys.executable, '-c', skrypt], capture_output=True, text=True, check=True)
+        # Ostatnia linia wyjścia - wcześniejsze mogą pochodzić z aplikacji
+        linie = wynik.stdout.splitlines() or ['']
+        zaladowane = [m for m in linie[-1].split(',') if m]
+    except Exception as e:
+        print(f"❌ Błąd importu aplikacji: {e}")
+        print()
+        return False
+    
+    if zaladowane:
+        print(f"❌ Import app ładuje: {', '.join(zaladowane)}")
+    else:
+        print("✅ Ciężkie biblioteki ładowane dopiero przy użyciu")
+    print()
+    return not zaladowane
+
 def main():
     """Główna funkcja testowa"""
     print("=" * 50)
@@ -128,9 +361,15 @@ def main():
     structure_ok = check_structure()
     check_imports()
     data_ok = check_data()
+    db_ok = check_db()
+    magazyn_ok = check_magazyn()
+    statystyki_ok = check_statystyki()
+    szeregi_ok = check_szeregi()
+    kostka_ok = check_kostka()
+    start_ok = check_start()
     
     print("=" * 50)
-    if structure_ok and data_ok:
+    if structure_ok and data_ok and db_ok and magazyn_ok and statystyki_ok and szeregi_ok and kostka_ok and start_ok:
         print("✅ WSZYSTKO OK! Możesz uruchomić: python app.py")
     else:
         print("⚠️  Są problemy - rozwiąż je zgodnie z komunikatami wyżej")